@@ -0,0 +1,275 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from javascriptasync import JSContext
+
+import gui
+
+from .JSLookup import JavascriptLookup
+
+"""
+A pool of warm node.js bridges.
+
+The bot's main JSContext runs one call at a time, so article conversion in
+research runs was serialized.  Each JSWorker here is its own JSContext, with
+its own node process and its modules already required.
+
+Workers are recycled after max_uses calls, once their node process goes over
+max_rss_mb, or after a call times out or is cancelled, since that call may
+still be running in node.
+"""
+
+
+class JSWorker:
+    """One node process, with the pool's modules preloaded."""
+
+    def __init__(self, wid: int, modules: Dict[str, str]):
+        self.wid = wid
+        self.module_files = modules
+        self.ctx: Optional[JSContext] = None
+        self.modules: Dict[str, Any] = {}
+        self.uses = 0
+        self.started = 0.0
+
+    async def start(self):
+        self.ctx = JSContext()
+        await self.ctx.init_js_a()
+        for alias, filename in self.module_files.items():
+            self.modules[alias] = await JavascriptLookup.get_full_pathas(
+                filename, alias, self.ctx
+            )
+        self.started = time.monotonic()
+
+    async def rss_mb(self) -> float:
+        rss = await self.ctx.eval_js_a("return process.memoryUsage().rss", timeout=5)
+        return rss / (1024 * 1024)
+
+    def stop(self):
+        self.modules = {}
+        if self.ctx is not None:
+            try:
+                self.ctx.kill_js()
+            except Exception as e:
+                gui.dprint(f"JS worker {self.wid} did not stop cleanly: {e}")
+            self.ctx = None
+
+
+class JSWorkerPool:
+    """Hands out warm JSWorkers, one call at a time per worker.
+
+    Args:
+        size: How many node processes to keep running.
+        modules: alias -> filename in ./js to require in every worker.
+        timeout: Default seconds a call may take.
+        max_uses: Recycle a worker after this many calls.
+        max_rss_mb: Recycle a worker once its node process is this large.
+        wait_timeout: Most seconds run() waits for a free worker.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        modules: Optional[Dict[str, str]] = None,
+        timeout: float = 60.0,
+        max_uses: int = 200,
+        max_rss_mb: float = 512.0,
+        wait_timeout: float = 120.0,
+    ):
+        self.size = size
+        self.modules = modules or {"WEBJS": "readwebpage.js"}
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.wait_timeout = wait_timeout
+        self.idle: Optional[asyncio.Queue] = None
+        self.workers: List[JSWorker] = []
+        self.start_lock: Optional[asyncio.Lock] = None
+        self.next_id = 0
+        self.starting = 0
+        self.retrying = False
+        self.waiting = 0
+        self.busy = 0
+        self.calls = 0
+        self.timeouts = 0
+        self.recycled = 0
+        self.waits: Deque[float] = deque(maxlen=200)
+        self.closed = False
+        self.background = set()
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+
+    async def _new_worker(self) -> JSWorker:
+        worker = JSWorker(self.next_id, self.modules)
+        self.next_id += 1
+        self.starting += 1
+        try:
+            await worker.start()
+        except Exception:
+            worker.stop()
+            raise
+        finally:
+            self.starting -= 1
+        self.workers.append(worker)
+        return worker
+
+    def _queue(self, worker: JSWorker):
+        """Put a worker back in the idle queue, or stop it if the pool was
+        closed while it was starting or being checked."""
+        if self.closed:
+            worker.stop()
+            if worker in self.workers:
+                self.workers.remove(worker)
+            return
+        self.idle.put_nowait(worker)
+
+    def _short(self) -> bool:
+        """If the pool has fewer workers, running or starting, than it should."""
+        return len(self.workers) + self.starting < self.size
+
+    async def start(self):
+        """Start every worker.  Safe to call more than once."""
+        if self.start_lock is None:
+            self.start_lock = asyncio.Lock()
+        async with self.start_lock:
+            if self.idle is not None:
+                return
+            idle = asyncio.Queue()
+            workers = await asyncio.gather(
+                *(self._new_worker() for _ in range(self.size))
+            )
+            if self.closed:
+                for worker in workers:
+                    worker.stop()
+                return
+            for worker in workers:
+                idle.put_nowait(worker)
+            self.idle = idle
+            gui.gprint(f"Started {self.size} JS workers.")
+
+    async def _recycle(self, worker: JSWorker, reason: str):
+        gui.dprint(f"Recycling JS worker {worker.wid} ({reason}).")
+        worker.stop()
+        if worker in self.workers:
+            self.workers.remove(worker)
+        self.recycled += 1
+        if self.closed or not self._short():
+            return
+        try:
+            replacement = await self._new_worker()
+        except Exception as e:
+            gui.dprint(f"Could not start a replacement JS worker: {e}")
+            # Don't shrink the pool for good, keep trying in the background.
+            if not self.retrying:
+                self._spawn(self._retry_replacement())
+            return
+        self._queue(replacement)
+
+    async def _retry_replacement(self):
+        """Start workers, backing off between failures, until the pool is
+        back to size.  Only one of these runs at a time."""
+        self.retrying = True
+        delay = 5.0
+        try:
+            while True:
+                await asyncio.sleep(delay)
+                if self.closed or not self._short():
+                    return
+                try:
+                    self._queue(await self._new_worker())
+                except Exception as e:
+                    gui.dprint(f"Still could not start a JS worker: {e}")
+                    delay = min(delay * 2, 60.0)
+        finally:
+            self.retrying = False
+
+    async def _release(self, worker: JSWorker):
+        if self.closed:
+            worker.stop()
+            return
+        if worker.uses >= self.max_uses:
+            await self._recycle(worker, f"{worker.uses} uses")
+            return
+        try:
+            rss = await worker.rss_mb()
+        except Exception as e:
+            await self._recycle(worker, f"memory check failed, {e}")
+            return
+        if rss >= self.max_rss_mb:
+            await self._recycle(worker, f"{rss:.0f}MB")
+            return
+        self._queue(worker)
+
+    async def run(
+        self, fn: Callable[[JSWorker], Awaitable[Any]], timeout: float = None
+    ) -> Any:
+        """Run fn(worker) on the next idle worker and return its result.
+        Raises asyncio.TimeoutError if it takes longer than timeout, or if no
+        worker is free within wait_timeout."""
+        if self.closed:
+            raise RuntimeError("The JS worker pool is closed.")
+        if self.idle is None:
+            await self.start()
+        if not self.closed and self.idle.empty() and self._short():
+            # Workers were lost and not replaced yet, try starting one here.
+            try:
+                self._queue(await self._new_worker())
+            except Exception as e:
+                gui.dprint(f"Could not start a JS worker on demand: {e}")
+        if self.closed:
+            raise RuntimeError("The JS worker pool is closed.")
+        self.waiting += 1
+        queued_at = time.monotonic()
+        try:
+            worker: JSWorker = await asyncio.wait_for(
+                self.idle.get(), self.wait_timeout
+            )
+        finally:
+            self.waiting -= 1
+        self.waits.append(time.monotonic() - queued_at)
+        self.busy += 1
+        self.calls += 1
+        worker.uses += 1
+        try:
+            result = await asyncio.wait_for(fn(worker), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.busy -= 1
+            self._spawn(self._recycle(worker, "timed out"))
+            raise
+        except asyncio.CancelledError:
+            # The call may still be running in node.
+            self.busy -= 1
+            self._spawn(self._recycle(worker, "cancelled"))
+            raise
+        except BaseException:
+            self.busy -= 1
+            self._spawn(self._release(worker))
+            raise
+        self.busy -= 1
+        self._spawn(self._release(worker))
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self.waits)
+        return {
+            "workers": len(self.workers),
+            "busy": self.busy,
+            "queue_depth": self.waiting,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "recycled": self.recycled,
+            "p50_wait": waits[len(waits) // 2] if waits else 0.0,
+            "max_wait": waits[-1] if waits else 0.0,
+        }
+
+    async def close(self):
+        self.closed = True
+        for worker in list(self.workers):
+            worker.stop()
+        self.workers = []
+        self.idle = None
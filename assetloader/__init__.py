@@ -1,3 +1,4 @@
 from .AssetLookup import AssetLookup
 from .JSLookup import JavascriptLookup
+from .JSWorkerPool import JSWorkerPool, JSWorker
 from .geojson import GeoJSONFeature, GeoJSONGeometry
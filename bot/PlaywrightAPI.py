@@ -1,6 +1,266 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
 from playwright.async_api import async_playwright
 import gui
 
+"""
+Playwright setup, and a pool of sandbox pages for tag javascript.
+
+Tags used to open a new page for every evaluation and close it after.  The
+SandboxPagePool keeps a few pages open instead, each in its own browser
+context so nothing leaks between them.  Between uses a page is navigated
+back to about:blank, which throws away the last tag's globals, and its
+context's cookies are cleared.
+
+Pages are recycled, with a brand new context, after max_uses tags or after
+an evaluation times out, since a timed out script may still be spinning in
+the renderer.  If a replacement can't be opened, the pool keeps retrying in
+the background until it's back to size, and run() also opens a page itself
+when there are too few.
+"""
+
+
+class SandboxPage:
+    """One browser context with one blank page in it."""
+
+    def __init__(self, sid: int, timeout: float):
+        self.sid = sid
+        self.timeout = timeout
+        self.context = None
+        self.page = None
+        self.uses = 0
+        self.broken = False
+
+    async def start(self, browser):
+        self.context = await browser.new_context()
+        self.page = await self.context.new_page()
+
+    async def evaluate(self, script: str, timeout: float = None) -> Any:
+        """Evaluate script on the page.  Raises asyncio.TimeoutError if it
+        takes longer than timeout, after which this page won't be reused."""
+        try:
+            return await asyncio.wait_for(
+                self.page.evaluate(script), timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            self.broken = True
+            raise
+
+    async def reset(self):
+        await self.page.goto("about:blank")
+        await self.context.clear_cookies()
+
+    async def stop(self):
+        if self.context is not None:
+            try:
+                await self.context.close()
+            except Exception as e:
+                gui.dprint(f"Sandbox page {self.sid} did not close cleanly: {e}")
+        self.context = self.page = None
+
+
+class SandboxPagePool:
+    """Hands out warm SandboxPages, one tag at a time per page.
+
+    Args:
+        get_browser: Coroutine function that returns the browser to open
+            pages in.
+        size: How many pages to keep open.
+        timeout: Default seconds one evaluation may take.
+        max_uses: Recycle a page after this many tags.
+        wait_timeout: Most seconds run() waits for a free page.
+    """
+
+    def __init__(
+        self,
+        get_browser: Callable[[], Awaitable[Any]],
+        size: int = 2,
+        timeout: float = 10.0,
+        max_uses: int = 50,
+        wait_timeout: float = 30.0,
+    ):
+        self.get_browser = get_browser
+        self.size = size
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.wait_timeout = wait_timeout
+        self.idle: Optional[asyncio.Queue] = None
+        self.pages: List[SandboxPage] = []
+        self.start_lock: Optional[asyncio.Lock] = None
+        self.next_id = 0
+        self.opening = 0
+        self.retrying = False
+        self.waiting = 0
+        self.busy = 0
+        self.uses = 0
+        self.timeouts = 0
+        self.recycled = 0
+        self.waits: Deque[float] = deque(maxlen=200)
+        self.closed = False
+        self.background = set()
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+
+    async def _new_page(self) -> SandboxPage:
+        page = SandboxPage(self.next_id, self.timeout)
+        self.next_id += 1
+        self.opening += 1
+        try:
+            await page.start(await self.get_browser())
+        except Exception:
+            await page.stop()
+            raise
+        finally:
+            self.opening -= 1
+        self.pages.append(page)
+        return page
+
+    async def _queue(self, page: SandboxPage):
+        """Put a page back in the idle queue, or stop it if the pool was
+        closed while it was opening or resetting."""
+        if self.closed:
+            if page in self.pages:
+                self.pages.remove(page)
+            await page.stop()
+            return
+        self.idle.put_nowait(page)
+
+    def _short(self) -> bool:
+        """If the pool has fewer pages, open or opening, than it should."""
+        return len(self.pages) + self.opening < self.size
+
+    async def start(self):
+        """Open every page.  Safe to call more than once."""
+        if self.start_lock is None:
+            self.start_lock = asyncio.Lock()
+        async with self.start_lock:
+            if self.idle is not None:
+                return
+            idle = asyncio.Queue()
+            pages = await asyncio.gather(*(self._new_page() for _ in range(self.size)))
+            if self.closed:
+                for page in pages:
+                    await page.stop()
+                return
+            for page in pages:
+                idle.put_nowait(page)
+            self.idle = idle
+            gui.gprint(f"Opened {self.size} sandbox pages.")
+
+    async def _recycle(self, page: SandboxPage, reason: str):
+        gui.dprint(f"Recycling sandbox page {page.sid} ({reason}).")
+        await page.stop()
+        if page in self.pages:
+            self.pages.remove(page)
+        self.recycled += 1
+        if self.closed or not self._short():
+            return
+        try:
+            replacement = await self._new_page()
+        except Exception as e:
+            gui.dprint(f"Could not open a replacement sandbox page: {e}")
+            # Don't shrink the pool for good, keep trying in the background.
+            if not self.retrying:
+                self._spawn(self._retry_replacement())
+            return
+        await self._queue(replacement)
+
+    async def _retry_replacement(self):
+        """Open pages, backing off between failures, until the pool is back
+        to size.  Only one of these runs at a time."""
+        self.retrying = True
+        delay = 5.0
+        try:
+            while True:
+                await asyncio.sleep(delay)
+                if self.closed or not self._short():
+                    return
+                try:
+                    await self._queue(await self._new_page())
+                except Exception as e:
+                    gui.dprint(f"Still could not open a sandbox page: {e}")
+                    delay = min(delay * 2, 60.0)
+        finally:
+            self.retrying = False
+
+    async def _release(self, page: SandboxPage):
+        if self.closed:
+            await page.stop()
+            return
+        if page.broken:
+            self.timeouts += 1
+            await self._recycle(page, "timed out")
+            return
+        if page.uses >= self.max_uses:
+            await self._recycle(page, f"{page.uses} uses")
+            return
+        try:
+            await page.reset()
+        except Exception as e:
+            await self._recycle(page, f"reset failed, {e}")
+            return
+        await self._queue(page)
+
+    async def run(self, fn: Callable[[SandboxPage], Awaitable[Any]]) -> Any:
+        """Run fn(page) on the next idle page and return its result.  Use
+        page.evaluate inside fn, which has its own timeout.  Raises
+        asyncio.TimeoutError if no page is free within wait_timeout."""
+        if self.closed:
+            raise RuntimeError("The sandbox page pool is closed.")
+        if self.idle is None:
+            await self.start()
+        if not self.closed and self.idle.empty() and self._short():
+            # Pages were lost and not replaced yet, try opening one here.
+            try:
+                await self._queue(await self._new_page())
+            except Exception as e:
+                gui.dprint(f"Could not open a sandbox page on demand: {e}")
+        if self.closed:
+            raise RuntimeError("The sandbox page pool is closed.")
+        self.waiting += 1
+        queued_at = time.monotonic()
+        try:
+            page: SandboxPage = await asyncio.wait_for(
+                self.idle.get(), self.wait_timeout
+            )
+        finally:
+            self.waiting -= 1
+        self.waits.append(time.monotonic() - queued_at)
+        self.busy += 1
+        self.uses += 1
+        page.uses += 1
+        try:
+            return await fn(page)
+        finally:
+            self.busy -= 1
+            self._spawn(self._release(page))
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self.waits)
+        return {
+            "pages": len(self.pages),
+            "busy": self.busy,
+            "queue_depth": self.waiting,
+            "uses": self.uses,
+            "timeouts": self.timeouts,
+            "recycled": self.recycled,
+            "p50_wait": waits[len(waits) // 2] if waits else 0.0,
+            "max_wait": waits[-1] if waits else 0.0,
+        }
+
+    async def close(self):
+        self.closed = True
+        for page in list(self.pages):
+            await page.stop()
+        self.pages = []
+        self.idle = None
+
 
 class PlaywrightMixin:
     """This mixin is for initalizing a playwright context."""
@@ -8,6 +268,7 @@ class PlaywrightMixin:
     playapi = None
     browser = None
     browser_on = False
+    page_pool: Optional[SandboxPagePool] = None
 
     async def start_player(self):
         """Initalize an instance of Playwright"""
@@ -28,7 +289,25 @@ class PlaywrightMixin:
             self.browser_on = True
         return self.browser
 
+    async def get_page_pool(self) -> SandboxPagePool:
+        """Get the sandbox page pool for tag javascript, opening it if needed."""
+        if self.page_pool is None or self.page_pool.closed:
+            config = getattr(self, "config", None)
+            options = {}
+            if config is not None:
+                options = {
+                    "size": config.getint("pagepool", "size", fallback=2),
+                    "timeout": config.getfloat("pagepool", "timeout", fallback=10.0),
+                    "max_uses": config.getint("pagepool", "max_uses", fallback=50),
+                }
+            self.page_pool = SandboxPagePool(self.get_browser, **options)
+        await self.page_pool.start()
+        return self.page_pool
+
     async def close_browser(self):
+        if self.page_pool is not None:
+            await self.page_pool.close()
+            self.page_pool = None
         if self.browser != None:
             await self.browser.close()
             self.browser_on = False
@@ -1,5 +1,6 @@
 from collections.abc import Mapping
 import discord
+import hashlib
 import json
 import logging
 import traceback
@@ -98,6 +99,46 @@ def dict_diff(dict1: Dict, dict2: Dict) -> Tuple[Dict, int, int, float]:
     return None, 1, 1, 100.0
 
 
+def canonical_hash(obj: Any) -> str:
+    """
+    Return a stable sha256 hex digest of a json serializable object.
+    Keys are sorted so two equivalent trees always hash the same.
+    """
+    dumped = json.dumps(obj, default=str, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(dumped.encode("utf-8")).hexdigest()
+
+
+def subtree_key(flat_key: str) -> str:
+    """Get the subtree a denested key belongs to, ie 'chat_commands->name'."""
+    return "->".join(flat_key.split("->")[:2])
+
+
+def hash_command_tree(command_tree: Dict[str, Any]) -> Tuple[str, Dict[str, str]]:
+    """
+    Hash a denested command tree from build_and_format_app_commands.
+    Returns the hash of the entire tree, along with a dictionary of
+    hashes for each command subtree.
+    """
+    subtrees: Dict[str, Dict[str, Any]] = {}
+    for key, value in command_tree.items():
+        subtrees.setdefault(subtree_key(key), {})[key] = value
+    subhashes = {sub: canonical_hash(vals) for sub, vals in subtrees.items()}
+    return canonical_hash(subhashes), subhashes
+
+
+def subtree_hash_diff(
+    old: Dict[str, str], new: Dict[str, str]
+) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Compare two dictionaries of subtree hashes.
+    Returns the added, removed, and changed subtree keys.
+    """
+    added = sorted(k for k in new if k not in old)
+    removed = sorted(k for k in old if k not in new)
+    changed = sorted(k for k in new if k in old and old[k] != new[k])
+    return added, removed, changed
+
+
 class GuildCogToggle(Guild_Sync_Base):
     __tablename__ = "guild_cog_config"
 
@@ -171,6 +212,8 @@ class AppGuildTreeSync(Guild_Sync_Base):
     __tablename__ = "apptree_guild_sync"
     server_id = Column(Integer, primary_key=True, nullable=False, unique=True)
     lastsyncdata = Column(Text, nullable=True)
+    lastsynchash = Column(Text, nullable=True)
+    subtreehashes = Column(Text, nullable=True)
     lastsyncdate = Column(AwareDateTime, default=datetime.datetime.now())
     donotsync = Column(Boolean, default=False)
     cog_disable = Column(Text, nullable=True)  # New column
@@ -185,6 +228,7 @@ class AppGuildTreeSync(Guild_Sync_Base):
     ):
         self.server_id = server_id
         self.lastsyncdata = json.dumps(command_tree, default=str)
+        self.set_hashes(command_tree)
         self.lastsyncdate = datetime.datetime.now()
         self.cog_disable = json.dumps(cog_disable_list, default=str)
 
@@ -283,14 +327,72 @@ class AppGuildTreeSync(Guild_Sync_Base):
         """
         session: Session = DatabaseSingleton.get_session()
         self.lastsyncdata = json.dumps(command_tree, default=str)
+        self.set_hashes(command_tree)
         self.lastsyncdate = datetime.datetime.now()
         session.commit()
 
+    def set_hashes(self, command_tree: dict):
+        """
+        Set the `lastsynchash` and `subtreehashes` attributes from a command tree.
+        """
+        if not command_tree:
+            self.lastsynchash, self.subtreehashes = None, None
+            return
+        treehash, subhashes = hash_command_tree(command_tree)
+        self.lastsynchash = treehash
+        self.subtreehashes = json.dumps(subhashes)
+
     def compare_with_command_tree(self, command_tree: dict) -> Tuple[bool, str, str]:
         """
         Compares the current `lastsyncdata` with a passed in `command_tree`.
         Returns `True` if they are the same, `False` otherwise along with debug information
         """
+        if self.lastsynchash and self.subtreehashes:
+            return self.compare_hashes_with_command_tree(command_tree)
+        return self.compare_full_with_command_tree(command_tree)
+
+    def compare_hashes_with_command_tree(
+        self, command_tree: dict
+    ) -> Tuple[bool, str, str]:
+        """
+        Compare the stored tree hash with the hash of `command_tree`.
+        Only the subtrees whose hashes differ are loaded and diffed.
+        """
+        newhash, newsubs = hash_command_tree(command_tree)
+        if newhash == self.lastsynchash:
+            return (
+                True,
+                "Tree hash matched.",
+                f"All {len(newsubs)} subtrees are identical!",
+            )
+
+        oldsubs: Dict[str, str] = json.loads(self.subtreehashes)
+        added, removed, changed = subtree_hash_diff(oldsubs, newsubs)
+        details = {}
+        if changed:
+            oldtree = json.loads(self.lastsyncdata)
+            newtree = json.loads(json.dumps(command_tree, default=str))
+            changedset = set(changed)
+            difference, _, _, _ = dict_diff(
+                {k: v for k, v in oldtree.items() if subtree_key(k) in changedset},
+                {k: v for k, v in newtree.items() if subtree_key(k) in changedset},
+            )
+            details = difference or {}
+        debug = (
+            f"Added: {added}, Removed: {removed}, Changed: {changed}, "
+            f"Differences found: {details}"
+        )
+        total = len(set(oldsubs) | set(newsubs))
+        score = f"{len(added) + len(removed) + len(changed)} subtrees out of {total} are different."
+        return False, debug, score
+
+    def compare_full_with_command_tree(
+        self, command_tree: dict
+    ) -> Tuple[bool, str, str]:
+        """
+        Compares the entire `lastsyncdata` with a passed in `command_tree`.
+        Used when there are no stored hashes.
+        """
 
         oldsync = self.lastsyncdata
         newsync = json.dumps(command_tree, default=str)
@@ -501,6 +603,9 @@ class SpecialAppSync:
             self.logs.info(
                 f"Check Results: {name} (ID {guildid}):\n differences{diffscore} \n{score}"
             )
+            if same and not dbentry.lastsynchash:
+                # Legacy entry, store hashes so the next check is a single compare.
+                dbentry.update(app_tree)
             # Check if it's time to edit
             if (not same) or forced == True:
                 gui.gprint(
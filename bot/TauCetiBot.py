@@ -16,6 +16,7 @@ from discord.app_commands import CommandTree
 from discord.ext import commands, tasks
 from javascriptasync import JSContext
 from javascriptasync.logging import get_filehandler, setup_logging
+from assetloader import JSWorkerPool
 from sqlalchemy.exc import IntegrityError
 
 import gui
@@ -124,6 +125,8 @@ class TCBot(
 
         print("JS CONTEXT setup")
         self.jsenv: JSContext = JSContext()
+        # Warm node processes for article conversion, started in after_startup.
+        self.jspool: Optional[JSWorkerPool] = None
 
         print("done")
         self.config: ConfigParserSub = ConfigParserSub()
@@ -132,6 +135,8 @@ class TCBot(
 
         self.logs = logging.getLogger("TCLogger")
         self.loggersetup()
+        # Fire and forget tasks, kept here so they aren't garbage collected.
+        self.background_tasks = set()
 
         self.extensiondir, self.extension_list = "", []
         self.plugindir, self.plugin_list = "", []
@@ -146,6 +151,17 @@ class TCBot(
     async def database_on(self):
         """turn the database on."""
         self.database = database.DatabaseSingleton("Startup")
+        self.database.set_profile(
+            self.config.get("database", "profile", fallback=database.DEFAULT_PROFILE)
+        )
+        database.query_profiler.configure(
+            enabled=self.config.getboolean(
+                "database", "profile_queries", fallback=False
+            ),
+            slow_query_ms=self.config.getfloat(
+                "database", "slow_query_ms", fallback=100.0
+            ),
+        )
         self.database.load_base(Base=Guild_Task_Base)
         self.database.load_base(Base=Guild_Sync_Base)
         await self.database.startup_all()
@@ -162,6 +178,17 @@ class TCBot(
         if not self.bot_ready:
             # Start up the GuiPanel
             await self.jsenv.init_js_a()
+            self.jspool = JSWorkerPool(
+                size=self.config.getint("jspool", "size", fallback=2),
+                timeout=self.config.getfloat("jspool", "timeout", fallback=60.0),
+                max_uses=self.config.getint("jspool", "max_uses", fallback=200),
+                max_rss_mb=self.config.getfloat("jspool", "max_rss_mb", fallback=512.0),
+            )
+            try:
+                await self.jspool.start()
+            except Exception as e:
+                self.logs.error("Could not start the JS worker pool", exc_info=e)
+                self.jspool = None
             setup_logging(
                 logging.DEBUG, handler=get_filehandler(log_level=logging.DEBUG)
             )
@@ -226,6 +253,10 @@ class TCBot(
     async def close(self):
         print("Signing off.")
         from discord.utils import MISSING
+        from gptmod.memory_writer import memory_writer
+
+        # Write out any queued memories before the database goes away.
+        await memory_writer.close()
         # Close the SQLAlchemy engine
 
         await self.database.close_out()
@@ -234,6 +265,8 @@ class TCBot(
         self.delete_queue_message.cancel()
         self.check_tc_tasks.cancel()
         self.status_ticker.cancel()
+        if self.jspool:
+            await self.jspool.close()
         del self.jsenv
         # close the gui
         log = logging.getLogger("discord")
@@ -325,20 +358,28 @@ class TCBot(
         cid = self.statmess.add_status_message(ctx)
         return self.statmess.get_message_obj(cid)
 
-    async def audit_guilds(self, override_for: int = None):
-        """audit guilds."""
+    async def audit_guilds(
+        self, override_for: int = None, dry_run: bool = False, chunk_size: int = 0
+    ) -> Dict[str, int]:
+        """audit guilds.
+        Collect the ids of every departed guild once, and purge them from each
+        table with one DELETE ... WHERE server_id IN (...) per table.
+        dry_run: only count the rows that would be purged.
+        chunk_size: if set, purge this many guilds per transaction in a background task.
+        Returns a dictionary of table names to purged (or purgeable) row counts."""
         metadata = self.database.get_metadata()
-        matching_tables = []
-        matching_tables_2 = []
+        targets = []
         for table_name in metadata.tables.keys():
             table = metadata.tables[table_name]
             if "server_id" in table.columns.keys():
-                matching_tables.append((table_name, table))
+                targets.append((table, "server_id"))
+        for table_name in metadata.tables.keys():
+            table = metadata.tables[table_name]
             if "server_profile_id" in table.columns.keys():
-                matching_tables_2.append((table_name, table))
+                targets.append((table, "server_profile_id"))
 
         # gui.gprint the tables found with matching column name
-        gui.gprint(", ".join(f[0] for f in matching_tables))
+        gui.gprint(", ".join(f"{t.name}.{c}" for t, c in targets))
 
         guilds_im_in = []
         for guild in self.guilds:
@@ -348,51 +389,45 @@ class TCBot(
         audit_results = database.ServerData.Audit(guilds_im_in)
         to_purge = [auditme.server_id for auditme in audit_results]
         self.logs.info(audit_results)
-        session = self.database.get_session()
-        for server_id_val in to_purge:
+        if not to_purge:
+            return {}
+
+        def purge(session, ids, dry):
+            return database.purge_rows_in(session, targets, ids, dry_run=dry)
+
+        if dry_run or not chunk_size:
+            report = await self.database.run_sync(purge, to_purge, dry_run)
+            # The shared session may still have the purged rows cached.
+            self.database.get_session().expire_all()
+            verb = "would be purged" if dry_run else "purged"
+            for table_name, count in report.items():
+                self.logs.info(
+                    f"{count} entries {verb} from {table_name} for {len(to_purge)} guilds."
+                )
+            return report
+
+        async def purge_chunks():
+            for i in range(0, len(to_purge), chunk_size):
+                chunk = to_purge[i : i + chunk_size]
+                try:
+                    report = await self.database.run_sync(purge, chunk, False)
+                except IntegrityError as e:
+                    self.logs.error(str(e), exc_info=e)
+                    return
+                self.database.get_session().expire_all()
+                self.logs.info(f"Purged chunk {chunk}: {report}")
+                await asyncio.sleep(0.5)
+
+        async def purge_chunks_logged():
             try:
-                for tab in matching_tables:
-                    table_name, table_obj = tab
-                    # loop over the table names and delete the entries
-                    count = (
-                        session.query(table_obj)
-                        .filter_by(server_id=server_id_val)
-                        .count()
-                    )
-                    self.logs.info(
-                        f"Purging in {table_name}, {server_id_val}.  {count} entries will be removed."
-                    )
-
-                    # Delete the records from the table where server_id equals X
-                    session.query(table_obj).filter_by(server_id=server_id_val).delete()
-                    session.commit()
-                    self.logs.info(
-                        f"Purged  {count} entries from {table_name}, {server_id_val}."
-                    )
-                for tab in matching_tables_2:
-                    table_name, table_obj = tab
-                    # loop over the table names and count the number of entries to be deleted.
-                    count = (
-                        session.query(table_obj)
-                        .filter_by(server_profile_id=server_id_val)
-                        .count()
-                    )
-                    self.logs.info(
-                        f"Purging in {table_name}, {server_id_val}.  {count} entries will be removed."
-                    )
-
-                    # Delete the records from the table where server_id equals X
-                    session.query(table_obj).filter_by(
-                        server_profile_id=server_id_val
-                    ).delete()
-                    session.commit()
-                    self.logs.info(
-                        f"Purged  {count} entries from {table_name}, {server_id_val}."
-                    )
-
-            except IntegrityError as e:
-                session.rollback()
-                raise e
+                await purge_chunks()
+            except Exception as e:
+                self.logs.error("Background purge failed %s", e, exc_info=True)
+
+        task = self.loop.create_task(purge_chunks_logged())
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return {}
 
     async def reload_needed(self, changed_files):
         """idea is to only load/unload changed files."""
@@ -398,6 +398,14 @@ class Main(commands.Cog):
             await ctx.send("Data purged.")
         return
 
+    @commands.command(hidden=True)
+    async def audit_report(self, ctx):
+        """debugging only."""
+        report = await ctx.bot.audit_guilds(dry_run=True)
+        lines = [f"{table}: {count}" for table, count in report.items() if count]
+        await ctx.send("\n".join(lines) or "Nothing to purge.")
+        return
+
     @commands.command(hidden=True)
     @commands.guild_only()
     async def do_not_sync(self, ctx):
@@ -12,6 +12,14 @@ default_config = {
     "archive": {"max_lazy_archive_minutes": 10},
     "optional": {"error_channel_id": None, "feedback_channel_id": None},
     "feature": {"playwright": True, "gui": True},
+    "database": {"profile": "balanced", "profile_queries": False, "slow_query_ms": 100},
+    "lance": {
+        "index_min_rows": 20000,
+        "index_type": "IVF_PQ",
+        "index_nprobes": 20,
+        "index_refine_factor": 20,
+    },
+    "jspool": {"size": 2, "timeout": 60, "max_uses": 200, "max_rss_mb": 512},
 }
 
 
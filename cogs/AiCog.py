@@ -27,12 +27,13 @@ from bot import TCBot, TC_Cog_Mixin
 import gptmod
 import gptmod.error
 from gptmod.sentence_mem import SentenceMemory, MemoryFunctions
+from gptmod.memory_writer import memory_writer
 
-from database.database_ai import AuditProfile, ServerAIConfig
+from database.database_ai import AuditProfile, ServerAIConfig, MessageChain
 from utility import split_string_with_code_blocks
 import json
 
-from database import Users_DoNotTrack
+from database import DatabaseSingleton, Users_DoNotTrack
 
 lock = asyncio.Lock()
 JSONMODE = False
@@ -87,13 +88,16 @@ async def precheck_context(ctx: commands.Context) -> bool:
     """Evaluate if a message should be processed."""
     guild, user = ctx.guild, ctx.author
 
-    async with lock:
-        serverrep, userrep = AuditProfile.get_or_new(guild, user)
+    async with lock, DatabaseSingleton.task_session() as session:
+        serverrep, userrep = await AuditProfile.get_or_new_a(
+            guild, user, session=session
+        )
         serverrep.checktime()
         userrep.checktime()
 
         ok, reason = serverrep.check_if_ok()
         if not ok:
+            await session.commit()
             await ctx.channel.send(
                 f"<t:{int(serverrep.last_call.timestamp())}:F>,  <t:{int(serverrep.started_dt.timestamp())}:F>, {serverrep.current}, {serverrep.DailyLimit}"
             )
@@ -101,11 +105,19 @@ async def precheck_context(ctx: commands.Context) -> bool:
             return False
         ok, reason = userrep.check_if_ok()
         if not ok:
+            await session.commit()
             if reason != "disable":
                 await ctx.channel.send(reasons["user"][reason])
             return False
-        serverrep.modify_status()
-        userrep.modify_status()
+        if not await AuditProfile.modify_status_a(userrep, session=session):
+            # A research command from this user got in first.
+            await session.commit()
+            ok, reason = userrep.check_if_ok()
+            if not ok and reason != "disable":
+                await ctx.channel.send(reasons["user"][reason])
+            return False
+        await AuditProfile.modify_status_a(serverrep, limited=False, session=session)
+        await session.commit()
     return True
 
 
@@ -266,12 +278,10 @@ async def ai_message_invoke(
     if not botcheck:
         return
     guild, user = message.guild, message.author
-    # Get the 'profile' of the active guild.
-    profile = ServerAIConfig.get_or_new(guild.id)
     # prune message chains with length greater than X
-    profile.prune_message_chains(limit=5, thread_id=thread_id)
+    await MessageChain.prune_chain(guild.id, limit=5, thread_id=thread_id)
     # retrieve the saved messages
-    chain = profile.list_message_chains(thread_id=thread_id)
+    chain = await MessageChain.list_chain(guild.id, thread_id=thread_id)
     # Convert into a list of messages
     mes = [c.to_dict() for c in chain]
     # create new ChatCreation
@@ -341,7 +351,8 @@ async def ai_message_invoke(
     role, content, messageresp, tools = await process_result(
         ctx, result, mylib, chat, mem, present_mem=mems
     )
-    profile.add_message_to_chain(
+    await MessageChain.add_to_chain(
+        guild.id,
         message.id,
         message.created_at,
         thread_id=thread_id,
@@ -351,7 +362,8 @@ async def ai_message_invoke(
     )
     # Add
     if tools:
-        profile.add_message_to_chain(
+        await MessageChain.add_to_chain(
+            guild.id,
             messageresp.id,
             messageresp.created_at,
             thread_id=thread_id,
@@ -359,7 +371,8 @@ async def ai_message_invoke(
             content="",
             function=tools,
         )
-    profile.add_message_to_chain(
+    await MessageChain.add_to_chain(
+        guild.id,
         messageresp.id,
         messageresp.created_at,
         thread_id=thread_id,
@@ -407,13 +420,12 @@ class AICog(commands.Cog, TC_Cog_Mixin):
     @ai_setup.command(name="clear_history", brief="clear ai chat history.")
     async def chear_history(self, ctx: commands.Context):
         guild = ctx.guild
-        profile = ServerAIConfig.get_or_new(guild.id)
         thread_id = None
         if isinstance(ctx.channel, discord.Thread):
             thread_id = ctx.channel.id
 
         m1 = await MessageTemplates.server_ai_message(ctx, "purging")
-        messages = profile.clear_message_chains(thread_id=thread_id)
+        messages = await MessageChain.clear_chain(guild.id, thread_id=thread_id)
         await m1.delete()
         await MessageTemplates.server_ai_message(ctx, f"{messages} purged")
 
@@ -451,22 +463,23 @@ class AICog(commands.Cog, TC_Cog_Mixin):
         self, ctx, type: Literal["server", "user"], id: int, limit: int
     ):
         '''"Update user or server api limit `[server,user],id,limit`"'''
-        if type == "server":
-            profile = AuditProfile.get_server(id)
-            if profile:
-                profile.DailyLimit = limit
-                self.bot.database.commit()
-                await ctx.send("done")
-            else:
-                await ctx.send("server not found.")
-        elif type == "user":
-            profile = AuditProfile.get_user(id)
-            if profile:
-                profile.DailyLimit = limit
-                self.bot.database.commit()
-                await ctx.send("done")
-            else:
-                await ctx.send("user not found.")
+        async with DatabaseSingleton.task_session() as session:
+            if type == "server":
+                profile = await AuditProfile.get_server_a(id, session=session)
+                if profile:
+                    profile.DailyLimit = limit
+                    await session.commit()
+                    await ctx.send("done")
+                else:
+                    await ctx.send("server not found.")
+            elif type == "user":
+                profile = await AuditProfile.get_user_a(id, session=session)
+                if profile:
+                    profile.DailyLimit = limit
+                    await session.commit()
+                    await ctx.send("done")
+                else:
+                    await ctx.send("user not found.")
 
     @commands.command(brief="Turn on OpenAI mode")
     @commands.is_owner()
@@ -480,13 +493,14 @@ class AICog(commands.Cog, TC_Cog_Mixin):
     @commands.command(brief="Enable for user")
     @commands.is_owner()
     async def enable_for_user(self, ctx, user: int = 0):
-        profile = AuditProfile.get_user(user)
-        if profile:
-            profile.disabled = False
-            self.bot.database.commit()
-            await ctx.send("done")
-        else:
-            await ctx.send("user not found.")
+        async with DatabaseSingleton.task_session() as session:
+            profile = await AuditProfile.get_user_a(user, session=session)
+            if profile:
+                profile.disabled = False
+                await session.commit()
+                await ctx.send("done")
+            else:
+                await ctx.send("user not found.")
 
     @commands.command(brief="Check memory")
     @commands.is_owner()
@@ -576,6 +590,17 @@ class AICog(commands.Cog, TC_Cog_Mixin):
         out = await mem.add_list_to_mem(ctx, message, [memory])
         await ctx.send("Memory added.")
 
+    @commands.command(brief="show the memory writer queue")
+    @commands.is_owner()
+    async def memory_queue(self, ctx):
+        stats = memory_writer.stats()
+        await ctx.send(
+            f"{stats['pending']} pending, {stats['written']} written in "
+            f"{stats['batches']} batches, {stats['failed']} failed.\n"
+            f"Queue lag: last {stats['last_lag']:.2f}s, "
+            f"p50 {stats['p50_lag']:.2f}s, max {stats['max_lag']:.2f}s"
+        )
+
     @commands.command(brief="clear user data")
     @commands.is_owner()
     async def memory_forget_user(self, ctx):
@@ -591,10 +616,13 @@ class AICog(commands.Cog, TC_Cog_Mixin):
         ctx: commands.Context = await self.bot.get_context(interaction)
         guild, user = ctx.guild, ctx.author
 
-        async with lock:
-            serverrep, userrep = AuditProfile.get_or_new(guild, user)
+        async with lock, DatabaseSingleton.task_session() as session:
+            serverrep, userrep = await AuditProfile.get_or_new_a(
+                guild, user, session=session
+            )
             serverrep.checktime()
             userrep.checktime()
+            await session.commit()
 
             await ctx.send(
                 f"SERVER: <t:{int(serverrep.last_call.timestamp())}:F>, RESET ONL <t:{int(serverrep.started_dt.timestamp())}:F>, {serverrep.current}, {serverrep.DailyLimit}"
@@ -633,12 +661,14 @@ class AICog(commands.Cog, TC_Cog_Mixin):
         if interaction.user != self.bot.application.owner:
             await ctx.send("This command is owner only, buddy.")
             return
-        profile = AuditProfile.get_user(userid)
-        if profile:
-            profile.ban()
-            await ctx.send(f"Good riddance!  User <@{userid}> has been banned.")
-        else:
-            await ctx.send("I see no user by that name.")
+        async with DatabaseSingleton.task_session() as session:
+            profile = await AuditProfile.get_user_a(userid, session=session)
+            if profile:
+                profile.ban()
+                await session.commit()
+                await ctx.send(f"Good riddance!  User <@{userid}> has been banned.")
+            else:
+                await ctx.send("I see no user by that name.")
 
     @app_commands.command(
         name="ban_server",
@@ -655,18 +685,21 @@ class AICog(commands.Cog, TC_Cog_Mixin):
         if interaction.user != self.bot.application.owner:
             await ctx.send("This command is owner only, buddy.")
             return
-        profile = AuditProfile.get_server(serverid)
-        if profile:
-            if not profile.banned:
-                profile.ban()
-                await ctx.send(
-                    f"Good riddance!  The server with id {id} has been banned."
-                )
+        async with DatabaseSingleton.task_session() as session:
+            profile = await AuditProfile.get_server_a(serverid, session=session)
+            if profile:
+                if not profile.banned:
+                    profile.ban()
+                    await session.commit()
+                    await ctx.send(
+                        f"Good riddance!  The server with id {id} has been banned."
+                    )
+                else:
+                    profile.unban()
+                    await session.commit()
+                    await ctx.send(f"The server with id {id} has been unbanned.")
             else:
-                profile.unban()
-                await ctx.send(f"The server with id {id} has been unbanned.")
-        else:
-            await ctx.send("I see no server by that name.")
+                await ctx.send("I see no server by that name.")
 
     @ai_setup.command(
         name="add_ai_channel",
@@ -719,9 +752,10 @@ class AICog(commands.Cog, TC_Cog_Mixin):
     @commands.Cog.listener()
     async def on_raw_thread_delete(self, thread: discord.RawThreadDeleteEvent):
         try:
-            profile = ServerAIConfig.get_or_new(thread.guild_id)
             thread_id = thread.thread_id
-            messages = profile.clear_message_chains(thread_id=thread_id)
+            messages = await MessageChain.clear_chain(
+                thread.guild_id, thread_id=thread_id
+            )
             gui.dprint("Purged.")
         except Exception as e:
             await self.bot.send_error(e)
@@ -290,7 +290,7 @@ async def collect_server_history_lazy(ctx: commands.Context, statmess=None, **kw
     channel = ctx.message.channel
     guild = channel.guild
     guildid = guild.id
-    profile = ServerArchiveProfile.get_or_new(guildid)
+    profile = await ServerArchiveProfile.get_or_new_a(guildid)
 
     messages = []
     if statmess == None:
@@ -362,7 +362,7 @@ async def setup_lazy_grab(ctx, **kwargs):
     channel = ctx.message.channel
     guild = channel.guild
     guildid = guild.id
-    profile = ServerArchiveProfile.get_or_new(guildid)
+    profile = await ServerArchiveProfile.get_or_new_a(guildid)
     statusMessToEdit = await channel.send("Counting up channels.")
     statmess = StatusEditMessage(statusMessToEdit, ctx)
     chanlen = len(guild.text_channels)
@@ -387,12 +387,12 @@ async def setup_lazy_grab(ctx, **kwargs):
     for tup, chan in chantups:
         total_channels += 1
         if (
-            profile.has_channel(chan.id) == False
+            not await profile.has_channel_a(chan.id)
             and chan.permissions_for(guild.me).view_channel == True
             and chan.permissions_for(guild.me).read_message_history == True
         ):
             if chan.category:
-                if profile.has_channel(chan.category.id) == True:
+                if await profile.has_channel_a(chan.category.id):
                     continue
             threads = chan.threads
             archived = []
@@ -421,7 +421,7 @@ async def collect_server_history(ctx, **kwargs):
     channel = ctx.message.channel
     guild = channel.guild
     guildid = guild.id
-    profile = ServerArchiveProfile.get_or_new(guildid)
+    profile = await ServerArchiveProfile.get_or_new_a(guildid)
 
     messages = []
     statusMessToEdit = await channel.send(
@@ -1,11 +1,11 @@
 import gui
+import asyncio
 import datetime
 import os
 import random
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 import urllib
 import discord
-import subprocess
 import re
 import logging
 
@@ -14,8 +14,9 @@ import itertools
 import json
 from .MusicUtils import is_url
 from .MusicDatabase import MusicJSONMemoryDB
+from .ProbePool import probe_pool
+from .StreamCache import stream_cache
 from utility import seconds_to_time_string, seconds_to_time_stamp
-import mutagen
 
 logs = logging.getLogger("TCLogger")
 FILE_DEBUG = False
@@ -126,22 +127,28 @@ class AudioContainer:
         self.extract_options = {}
 
     def get_source(self):
+        """Get the stream url, from the stream cache if it's still good.
+        BLOCKING OPERATION on a cache miss."""
         try:
             dlp = self.extract_options.get("nodlp", True)
             if dlp:
-                with yt_dlp.YoutubeDL(self.extract_options) as ydl:
-                    res = ydl.extract_info(f"{self.url}", download=False)
-                    if "entries" in res:  # a playlist or a list of videos
-                        info = res["entries"][0]
-                    else:  # Just a video
-                        info = res
-                self.source = info["url"]
+                self.source = stream_cache.resolve(
+                    self.url, self.extract_options, self.duration
+                )
             else:
                 self.source = self.url
         except Exception as e:
             self.state = "Error"
             self.error_value = e
 
+    def prefetch_source(self):
+        """Resolve the stream url into the stream cache ahead of playback,
+        without changing this song's state.  BLOCKING OPERATION."""
+        if self.state == "Ok" and self.extract_options.get("nodlp", True):
+            stream_cache.resolve(
+                self.url, self.extract_options, self.duration, prefetch=True
+            )
+
     def get_song_from_entry(self, entry):
         """Get a song from a db entry."""
         info = {}
@@ -162,6 +169,11 @@ class AudioContainer:
                     info = res
         else:
             info = entry.infojson
+        self.load_info(info)
+
+    def load_info(self, info: dict):
+        """Get a song from an info dict, like a db entry's infojson or a
+        flat playlist entry.  The stream url is resolved when it's played."""
         info = sanatize_info(info)
 
         self.json_dict = info
@@ -170,7 +182,7 @@ class AudioContainer:
             info.get("duration", 9999999),
             info["webpage_url"],
         )
-        self.thumbnail = info["thumbnail"]
+        self.thumbnail = info.get("thumbnail")
 
         self.extract_options = {
             "format": "bestaudio",
@@ -253,33 +265,24 @@ class AudioContainer:
         self.state = "Ok"
         self.save_to_file()
 
-    def get_song_remote_file(self):
-        """Get a song from a file url."""
-        info = {}
-        options = {"nodlp": True}
-
-        duration_cmd = "ffprobe -i " + self.query + " -show_format -v quiet"
-        output = subprocess.check_output(
-            duration_cmd, shell=True, stderr=subprocess.STDOUT
-        ).decode("utf-8")
-
-        # Find the duration of the audio stream from the ffprobe output
-        duration_match = re.search(r"duration=([\d\.]+)", output)
-        total_length = int(round(float(duration_match.group(1))))
-        gui.gprint("Total Length: " + str(total_length) + " seconds")
-        self.title, self.duration, self.url = "Your Song", total_length, self.query
-        mdata = mutagen.File(self.query)
-        if mdata:
-            self.title = mdata.get("title")
-        self.extract_options = options
+    def set_remote_file(self, probed: dict):
+        """Fill in a file url's metadata from its probe result."""
+        gui.gprint("Total Length: " + str(probed["duration"]) + " seconds")
+        self.title = "Your Song"
+        self.duration = probed["duration"]
+        self.url = self.query
+        if probed["title"]:
+            self.title = probed["title"]
+        self.extract_options = {"nodlp": True}
         # self.source=self.query
         self.state = "Ok"
 
-    def get_song_local_file(self):
+    def get_song_remote_file(self):
         """Get a song from a file url."""
-        info = {}
-        options = {"nodlp": True}
+        self.set_remote_file(probe_pool.probe_blocking(self.query))
 
+    def local_file_path(self) -> str:
+        """Find the file a local: query points to, or a random one if it's missing."""
         directory_name = "saveData/music"
         file_name = self.query.replace("local:", "")
         # Check if the directory already exists
@@ -298,27 +301,40 @@ class AudioContainer:
             gui.gprint("File not found. Using random file:", random_file)
 
         gui.gprint("File found at:", file_path)
-        # Find the duration of the audio stream from the ffprobe output
-        duration_cmd = "ffprobe -i " + file_path + " -show_format -v quiet"
-        output = subprocess.check_output(
-            duration_cmd, shell=True, stderr=subprocess.STDOUT
-        ).decode("utf-8")
-        duration_match = re.search(r"duration=([\d\.]+)", output)
-        total_length = int(round(float(duration_match.group(1))))
-        gui.gprint("Total Length: " + str(total_length) + " seconds")
-        mdata = mutagen.File(file_path)
+        return file_path
+
+    def set_local_file(self, file_path: str, probed: dict):
+        """Fill in a local file's metadata from its probe result."""
+        gui.gprint("Total Length: " + str(probed["duration"]) + " seconds")
         self.title, self.duration, self.url = (
             "Your Song",
-            total_length,
+            probed["duration"],
             "./" + file_path,
         )
-        self.extract_options = options
+        self.extract_options = {"nodlp": True}
         # self.source="./"+file_path
-        if mdata:
-            self.title = mdata.get("title")
+        if probed["title"]:
+            self.title = probed["title"]
         self.type = "file"
         self.state = "Ok"
 
+    def get_song_local_file(self):
+        """Get a song from a file url."""
+        file_path = self.local_file_path()
+        self.set_local_file(file_path, probe_pool.probe_blocking(file_path))
+
+    def file_kind(self) -> Optional[str]:
+        """If get_song would probe this query as a file, "remote" or "local"."""
+        if "youtu" in self.query or "soundcloud" in self.query:
+            return None
+        if "discordapp" in self.query:
+            return "remote"
+        if "local:" in self.query:
+            return "local"
+        if self.is_audio_link(self.query):
+            return "remote"
+        return None
+
     def is_audio_link(self, link):
         regex = r".*\.(mp3|wav|ogg|aac|m4a|flac|wma|alac|ape|opus|webm|amr|pcm|aiff|au|raw|ac3|eac3|dts|flv|mkv|mka|mov|avi|mpg|mpeg)$"
         if re.match(regex, link):
@@ -369,6 +385,24 @@ class AudioContainer:
             logs.error("Error %s", e, exc_info=True)
             self.error_value = e
 
+    async def get_song_async(self, do_search=True, db_search=False, substrings=False):
+        """get_song, without blocking the event loop.
+        Files are probed through the probe pool, everything else runs in a thread."""
+        kind = None if db_search else self.file_kind()
+        if kind is None:
+            await asyncio.to_thread(self.get_song, do_search, db_search, substrings)
+            return
+        try:
+            if kind == "remote":
+                self.set_remote_file(await probe_pool.probe(self.query))
+            else:
+                file_path = await asyncio.to_thread(self.local_file_path)
+                self.set_local_file(file_path, await probe_pool.probe(file_path))
+        except Exception as e:
+            self.state = "Error"
+            logs.error("Error %s", e, exc_info=True)
+            self.error_value = e
+
     def start(self):
         # start playing a music track.
         self.timeat, self.started_at, self.playing = 0, discord.utils.utcnow(), True
@@ -460,8 +494,55 @@ def url_basename(url):
     return path.strip("/").split("/")[-1]
 
 
+FLAT_PLAYLIST_OPTIONS = {
+    "extract_flat": "in_playlist",
+    "skip_download": True,
+    "forcejson": True,
+}
+# Placeholder titles of playlist entries that can't be played.
+UNAVAILABLE_TITLES = ("[Private video]", "[Deleted video]")
+
+
+def extract_flat_playlist(url: str) -> dict:
+    """Get a playlist's entries in one flat extraction, without resolving
+    each video.  BLOCKING OPERATION."""
+    with yt_dlp.YoutubeDL(FLAT_PLAYLIST_OPTIONS) as ydl:
+        return ydl.extract_info(f"{url}", download=False, process=False)
+
+
+def flat_entry_info(entry: dict, ie_result: dict) -> Optional[dict]:
+    """Turn a flat playlist entry into an info dict for AudioContainer.load_info.
+    Returns None for entries that can't be played."""
+    if not entry.get("id") or entry.get("title") in UNAVAILABLE_TITLES:
+        return None
+    extractor = entry.get("ie_key") or ie_result.get("extractor", "???")
+    if "youtube" in extractor.lower():
+        webpage_url = "https://youtu.be/" + entry["id"]
+    else:
+        webpage_url = entry.get("webpage_url") or entry.get("url")
+    if not webpage_url:
+        return None
+    thumbnails = entry.get("thumbnails") or [{}]
+    return {
+        "id": entry["id"],
+        "title": entry.get("title") or entry["id"],
+        "duration": entry.get("duration") or 9999999,
+        "webpage_url": webpage_url,
+        "thumbnail": entry.get("thumbnail") or thumbnails[-1].get("url"),
+        "uploader": entry.get("uploader") or entry.get("channel"),
+        "extractor": extractor.lower(),
+    }
+
+
 async def special_playlist_download(bot, ctx, ie_result):
     # This was included because downloading from a playlist blocked the loop.
+    # Paging through the entries can still hit the network, so it runs in a thread.
+    return await asyncio.to_thread(flatten_playlist, ie_result)
+
+
+def flatten_playlist(ie_result):
+    """Collect every entry of a process=False playlist result into a list.
+    BLOCKING OPERATION."""
     result_type = ie_result.get("_type", "video")
     if result_type in ("playlist", "multi_video"):
         # We process each entry in the playlist
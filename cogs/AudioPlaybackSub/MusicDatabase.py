@@ -1,15 +1,23 @@
 import json
-from typing import List, Tuple
+from typing import Any, Dict, List, Tuple
 from sqlalchemy import (
     Column,
     ForeignKey,
     Integer,
+    MetaData,
     String,
     Double,
     JSON,
+    Table,
     and_,
+    event,
+    literal_column,
     or_,
+    select,
+    union_all,
 )
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import relationship, Session
 from database import DatabaseSingleton
@@ -18,17 +26,83 @@ from .MusicUtils import is_url
 from urllib.parse import parse_qs, urlsplit
 import gui
 
+"""
+Music searches go through an FTS5 trigram index over the title, uploader,
+url, and id of every MusicJSONMemoryDB entry.  Trigram phrases match as case
+insensitive substrings, so it answers the same questions the old ILIKE %part%
+scans did, without reading the infojson blobs of every row.
+
+The index is its own table, kept in sync with triggers and filled on startup
+if it's missing rows.  If this SQLite build has no trigram tokenizer, searches
+fall back to the LIKE scans.
+"""
+
 MusicBase = declarative_base(name="Music System Base")
 
+SEARCH_TABLE = "music_search_fts"
+# The index and its FTS5 shadow tables share this prefix, compare_db skips them.
+MusicBase.metadata.info["unmapped_tables"] = (SEARCH_TABLE,)
+# bm25 weights for title, uploader, url, id.
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0, 1.0)
+
+# Not part of MusicBase's metadata, so create_all never makes it as a normal table.
+search_table = Table(
+    SEARCH_TABLE,
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("title", String),
+    Column("uploader", String),
+    Column("url", String),
+    Column("id", String),
+    # FTS5's hidden column, for MATCH and bm25.
+    Column(SEARCH_TABLE, String),
+)
+
+_UPLOADER = (
+    "CASE WHEN json_valid({0}.infojson) THEN coalesce("
+    "json_extract({0}.infojson, '$.uploader'), json_extract({0}.infojson, '$.channel')"
+    ") END"
+)
+_INDEX_ROW = f"INSERT INTO {SEARCH_TABLE}(rowid, title, uploader, url, id) "
+SEARCH_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+    "USING fts5(title, uploader, url, id, tokenize='trigram')",
+    f"""CREATE TRIGGER IF NOT EXISTS music_search_insert
+    AFTER INSERT ON music_json_memory_db BEGIN
+        {_INDEX_ROW}VALUES (new.rowid, new.title, {_UPLOADER.format("new")}, new.url, new.id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS music_search_delete
+    AFTER DELETE ON music_json_memory_db BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.rowid;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS music_search_update
+    AFTER UPDATE OF url, title, id, infojson ON music_json_memory_db BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.rowid;
+        {_INDEX_ROW}VALUES (new.rowid, new.title, {_UPLOADER.format("new")}, new.url, new.id);
+    END""",
+]
+SEARCH_FILL = (
+    f"{_INDEX_ROW}SELECT m.rowid, m.title, {_UPLOADER.format('m')}, m.url, m.id "
+    "FROM music_json_memory_db AS m"
+)
+
+
+def fts_phrase(part: str) -> str:
+    """Quote part as an FTS5 phrase, so it's matched literally."""
+    return '"' + part.replace('"', '""') + '"'
+
 
 class MusicJSONMemoryDB(MusicBase):
     __tablename__ = "music_json_memory_db"
     url = Column(String, primary_key=True, unique=True, nullable=False)
     title = Column(String, default="titleunknown")
-    id = Column(String, default="NOID")
+    id = Column(String, default="NOID", index=True)
     source = Column(String, default="unknown")
     infojson = Column(JSON, default={})
 
+    # Set once the trigram search index exists.
+    search_index = False
+
     def __init__(self, url: str, title: str, id: str, source: str, infojson: dict):
         self.url = url
         self.title = title
@@ -59,6 +133,44 @@ class MusicJSONMemoryDB(MusicBase):
         session.commit()
         session.close()
 
+    @classmethod
+    def get_by_ids(cls, ids: List[str]) -> Dict[str, "MusicJSONMemoryDB"]:
+        """Get the stored entries for a list of ids in one query, keyed by id."""
+        if not ids:
+            return {}
+        session: Session = DatabaseSingleton.get_new_session()
+        try:
+            found = session.query(cls).filter(cls.id.in_(set(ids))).all()
+            return {entry.id: entry for entry in found}
+        finally:
+            session.close()
+
+    @classmethod
+    def add_many(cls, infos: List[dict]) -> int:
+        """Insert info dicts in one statement, skipping urls that are already stored.
+        Returns how many rows were added."""
+        if not infos:
+            return 0
+        rows = [
+            {
+                "url": info["webpage_url"],
+                "title": info["title"],
+                "id": info["id"],
+                "source": info.get("extractor", "???"),
+                "infojson": info,
+            }
+            for info in infos
+        ]
+        session: Session = DatabaseSingleton.get_new_session()
+        try:
+            result = session.execute(
+                insert(cls).values(rows).on_conflict_do_nothing(index_elements=["url"])
+            )
+            session.commit()
+            return result.rowcount
+        finally:
+            session.close()
+
     def update(self, **kwargs):
         for key, value in kwargs.items():
             setattr(self, key, value)
@@ -66,15 +178,83 @@ class MusicJSONMemoryDB(MusicBase):
     def __repr__(self):
         return f"{self.url}: {self.title}, {self.id}"
 
+    @classmethod
+    def search_source(cls):
+        """
+        The table searches read from, with its rowid and text columns.
+        That's the trigram index when it's available, so the heavy infojson
+        pages are never scanned, only the few rows that are returned.
+        """
+        if cls.search_index:
+            t = search_table
+            return t, t.c.rowid, [t.c.title, t.c.uploader, t.c.url, t.c.id]
+        t = cls.__table__
+        rowid = literal_column(f"{cls.__tablename__}.rowid")
+        return t, rowid, [t.c.id, t.c.title, t.c.url]
+
+    @classmethod
+    def match_conditions(cls, parts: List[str]) -> Tuple[list, bool]:
+        """
+        Conditions for rows that contain every one of parts in some searched column.
+        Parts of 3 or more characters are combined into one trigram MATCH,
+        shorter parts have no trigrams and fall back to a LIKE over the index.
+        Also returns if a MATCH was used, since bm25 ranking needs one.
+        """
+        table, rowid, columns = cls.search_source()
+        long_parts = [p for p in parts if len(p) >= 3] if cls.search_index else []
+        conditions = [
+            or_(*[c.icontains(part, autoescape=True) for c in columns])
+            for part in parts
+            if part not in long_parts
+        ]
+        if long_parts:
+            phrase = " AND ".join(fts_phrase(p) for p in long_parts)
+            conditions.append(table.c[SEARCH_TABLE].match(phrase))
+        return conditions, bool(long_parts)
+
+    @classmethod
+    def ranked_select(cls, parts: List[str], limit: int, prefix: str = None, *cols):
+        """
+        Select cols (the rowid by default) of rows containing all of parts.
+        Titles starting with prefix come first, then the best bm25 scores.
+        """
+        table, rowid, columns = cls.search_source()
+        conditions, matched = cls.match_conditions(parts)
+        order = []
+        if prefix:
+            order.append(table.c.title.istartswith(prefix, autoescape=True).desc())
+        if matched:
+            order.append(func.bm25(table.c[SEARCH_TABLE], *SEARCH_WEIGHTS))
+        return (
+            select(*(cols or [rowid]))
+            .select_from(table)
+            .where(and_(*conditions))
+            .order_by(*order)
+            .limit(limit)
+        )
+
+    @classmethod
+    def get_rowids(cls, session: Session, rowids: List[int]) -> Dict[int, Any]:
+        """Load entries by rowid, returns a rowid:entry dictionary."""
+        if not rowids:
+            return {}
+        rowid = literal_column(f"{cls.__tablename__}.rowid")
+        return dict(session.query(rowid, cls).filter(rowid.in_(rowids)).all())
+
+    @classmethod
+    def ranked_search(
+        cls, session: Session, parts: List[str], limit: int, prefix: str = None
+    ) -> List:
+        rowids = session.execute(cls.ranked_select(parts, limit, prefix)).scalars()
+        rowids = list(rowids)
+        found = cls.get_rowids(session, rowids)
+        return [found[r] for r in rowids if r in found]
+
     @classmethod
     def get_part_conditionals(cls, sub_count: List[Tuple[str, int]]):
         """return conditionals."""
         part_conditions = [
-            or_(
-                cls.id.ilike(f"%{part}%"),
-                cls.title.ilike(f"%{part}%"),
-                cls.url.ilike(f"%{part}%"),
-            )
+            and_(*cls.match_conditions([part])[0])
             for part, count in sub_count
             if count > 0
         ]
@@ -99,35 +279,25 @@ class MusicJSONMemoryDB(MusicBase):
 
         Notes:
         ------
-        - This method performs a case-insensitive substring match on the 'id', 'title', and 'url' columns of the database table.
-        - The count includes all matches where the given part is found within any of the three columns.
+        - This method performs a case-insensitive substring match on the 'title', 'uploader', 'url', and 'id' columns of the search index.
+        - The count includes all matches where the given part is found within any of the columns.
+        - Each part is one indexed count, rather than one pass over the whole table.
 
         """
         if not session:
             session: Session = DatabaseSingleton.get_session()
-
-        # List of conditions for each part
-        part_conditions = [
-            or_(
-                cls.id.ilike(f"%{part}%"),
-                cls.title.ilike(f"%{part}%"),
-                cls.url.ilike(f"%{part}%"),
-            )
-            for part in parts
-            if part and not part.isspace()
-        ]
-        # Construct a list of case statements to count matches for each part
-        case_statements = [
-            func.sum(case((condition, 1), else_=0)).label(f"{part}_count")
-            for part, condition in zip(parts, part_conditions)
-        ]
-
-        part_counts_query = session.query(*case_statements).first()
-
-        # Extract the results as (part, count) tuples
-        part_matches = [
-            (part, count) for part, count in zip(parts, part_counts_query) if count > 0
-        ]
+        table, rowid, columns = cls.search_source()
+
+        part_matches = []
+        for part in parts:
+            if not part or part.isspace():
+                continue
+            conditions, _ = cls.match_conditions([part])
+            count = session.execute(
+                select(func.count()).select_from(table).where(*conditions)
+            ).scalar()
+            if count > 0:
+                part_matches.append((part, count))
 
         return part_matches
 
@@ -145,36 +315,28 @@ class MusicJSONMemoryDB(MusicBase):
         """
         if not session:
             session: Session = DatabaseSingleton.get_session()
+        table, rowid, columns = cls.search_source()
 
-        # List of conditions for each part
-        part_conditions = cls.get_part_conditionals(sub_count)
-
-        # Construct the case statements to count matches for each part individually
-        case_statements = []
-        for pc, condition in zip(sub_count, part_conditions):
-            part, count = pc
-            if count > 0:
-                case_statement = case((condition, 1)).label(f"{part}_count")
-                case_statements.append(case_statement)
-
-        # Calculate the sum of counts for each ID
-        sum_of_counts = sum(
-            func.coalesce(case_statement, 0) for case_statement in case_statements
-        )
-
-        # Query to get the final results and sort by the sum
-        query = (
-            session.query(cls, sum_of_counts.label("total_count"))
-            .group_by(cls)
-            .order_by(sum_of_counts.desc())
+        # One rowid per part each row matches, so counting rowids
+        # gives how many of the parts each row contains.
+        hits = [
+            select(rowid.label("hit")).select_from(table).where(condition)
+            for condition in cls.get_part_conditionals(sub_count)
+        ]
+        if not hits:
+            return []
+        hits = union_all(*hits).subquery()
+        total = func.count().label("total_count")
+        ranked = session.execute(
+            select(hits.c.hit, total)
+            .group_by(hits.c.hit)
+            .order_by(total.desc())
             .limit(10)
-        )
-
-        # Execute the query and fetch all results
-        results = query.all()
+        ).all()
 
+        found = cls.get_rowids(session, [hit for hit, count in ranked])
         maxdistinct_matches = [
-            (result[0], result[1]) for result in results if result[1] > 0
+            (found[hit], count) for hit, count in ranked if hit in found and count > 0
         ]
 
         return maxdistinct_matches
@@ -183,16 +345,18 @@ class MusicJSONMemoryDB(MusicBase):
     def max_search_tup(cls, parts):
         """same as max search, but returns a tuple."""
         session: Session = DatabaseSingleton.get_session()
+        table, rowid, columns = cls.search_source()
+        parts = [part for part in parts if part and not part.isspace()]
+        if not parts:
+            return []
 
-        # List of conditions for each part
+        # Which rows match each part, looked up by rowid.
+        main_rowid = literal_column(f"{cls.__tablename__}.rowid")
         part_conditions = [
-            or_(
-                cls.id.ilike(f"%{part}%"),
-                cls.title.ilike(f"%{part}%"),
-                cls.url.ilike(f"%{part}%"),
+            main_rowid.in_(
+                select(rowid).select_from(table).where(*cls.match_conditions([part])[0])
             )
             for part in parts
-            if part and not part.isspace()
         ]
 
         # Construct a list of case statements to count matches for each part
@@ -204,6 +368,7 @@ class MusicJSONMemoryDB(MusicBase):
         # Query to get the counts of matches for each part and group by the primary key (id)
         query = (
             session.query(cls.url, *case_statements)
+            .filter(or_(*part_conditions))
             .group_by(cls.url)
             .order_by(func.count().desc())
             .limit(10)
@@ -239,27 +404,20 @@ class MusicJSONMemoryDB(MusicBase):
 
         Notes:
         ------
-        - This method performs a case-insensitive substring match on the 'id', 'title', and 'url' fields of the entries.
+        - This method performs a case-insensitive substring match on the 'title', 'uploader', 'url', and 'id' fields of the entries.
         - It searches for entries that contain all of the substrings provided in the 'parts' list.
         - The 'sub_count' list is used to filter the substrings based on their counts.
-        - The matched elements are limited to 15 records.
+        - The matched elements are ranked by bm25, and limited to 15 records.
 
 
         """
         if not session:
             session: Session = DatabaseSingleton.get_session()
-        conditions = and_(
-            *[
-                cls.id.ilike(f"%{part}%")
-                | cls.title.ilike(f"%{part}%")
-                | cls.url.ilike(f"%{part}%")
-                for part, count in sub_count
-                if count > 0
-            ]
-        )
-        conditions = and_(*cls.get_part_conditionals(sub_count))
+        found_parts = [part for part, count in sub_count if count > 0]
+        if not found_parts:
+            return []
 
-        matched_elements = session.query(cls).filter(conditions).limit(15).all()
+        matched_elements = cls.ranked_search(session, found_parts, 15)
         gui.dprint("outcome", matched_elements)
         if not matched_elements:
             return []
@@ -326,19 +484,11 @@ class MusicJSONMemoryDB(MusicBase):
         - do_sub (bool, optional): Whether to perform partial substring matching. Defaults to True.
 
         Returns:
-        - List[MusicJSONMemoryDB]: A list of MusicJSONMemoryDB objects that match the search query.
+        - List[MusicJSONMemoryDB]: A list of MusicJSONMemoryDB objects that match the search query,
+            titles starting with the query first.
         """
         session: Session = DatabaseSingleton.get_new_session()
-        results = (
-            session.query(cls)
-            .filter(
-                (cls.id.ilike(f"%{query}%"))
-                | (cls.title.ilike(f"%{query}%"))
-                | (cls.url.ilike(f"%{query}%"))
-            )
-            .limit(10)
-            .all()
-        )
+        results = cls.ranked_search(session, [query], 10, prefix=query)
         if results:
             session.close()
             return results
@@ -376,6 +526,57 @@ class MusicJSONMemoryDB(MusicBase):
             session.close()
             return []
 
+    @classmethod
+    def autocomplete(cls, current: str, limit: int = 25) -> List[Tuple[str, str]]:
+        """
+        (title, url) pairs for entries containing every word of current,
+        read from the search index alone.
+        """
+        parts = current.split()
+        if not parts:
+            return []
+        table, rowid, columns = cls.search_source()
+        session: Session = DatabaseSingleton.get_new_session()
+        try:
+            stmt = cls.ranked_select(parts, limit, current, table.c.title, table.c.url)
+            return [(title, url) for title, url in session.execute(stmt).all()]
+        finally:
+            session.close()
+
+
+@event.listens_for(MusicBase.metadata, "after_create")
+def create_id_index(target, connection, **kw):
+    """create_all only makes indexes for new tables, this adds the id index to old ones."""
+    if connection.dialect.name != "sqlite":
+        return
+    connection.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_music_json_memory_db_id "
+        "ON music_json_memory_db (id)"
+    )
+
+
+@event.listens_for(MusicBase.metadata, "after_create")
+def create_search_index(target, connection, **kw):
+    """Create the search index and its triggers, and fill it if it's missing rows."""
+    if connection.dialect.name != "sqlite":
+        return
+    try:
+        for statement in SEARCH_DDL:
+            connection.exec_driver_sql(statement)
+        indexed = connection.exec_driver_sql(
+            f"SELECT count(*) FROM {SEARCH_TABLE}"
+        ).scalar()
+        rows = connection.exec_driver_sql(
+            "SELECT count(*) FROM music_json_memory_db"
+        ).scalar()
+        if indexed != rows:
+            gui.gprint(f"Filling music search index, {indexed}/{rows} rows indexed.")
+            connection.exec_driver_sql(f"DELETE FROM {SEARCH_TABLE}")
+            connection.exec_driver_sql(SEARCH_FILL)
+        MusicJSONMemoryDB.search_index = True
+    except OperationalError as e:
+        gui.gprint(f"Music search index unavailable, using LIKE scans: {e}")
+
 
 class UserMusicProfile(MusicBase):
     __tablename__ = "user_music_profiles"
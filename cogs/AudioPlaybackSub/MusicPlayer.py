@@ -1,6 +1,7 @@
 import gui
 import asyncio
 import random
+import time
 
 import discord
 from discord import Embed, Colour
@@ -12,6 +13,8 @@ from assetloader import AssetLookup
 from utility import seconds_to_time_string, seconds_to_time_stamp, urltomessage
 from utility import PageClassContainer
 from .AudioContainer import AudioContainer, speciallistsplitter
+from .PlayerSupervisor import PlayerSupervisor
+from .StreamCache import stream_cache
 from .MusicUtils import connection_check
 from .MusicViews import PlayerButtons
 from .MusicPlayer_Mixins import PlaylistMixin, PlayerMixin
@@ -19,6 +22,12 @@ from .MusicPlayer_Mixins import PlaylistMixin, PlayerMixin
 """this code is for the music player, and it's interactions."""
 
 EDIT_INTERVAL = 45
+# Seconds to stay in a voice channel with nobody else in it.
+ALONE_TIMEOUT = 10
+# How many queued songs to resolve stream urls for ahead of time.
+PREFETCH_COUNT = 2
+# How many queued songs to look up at once.
+SONG_ADD_BATCH = 8
 
 
 def make_playlist_embeds(player, interaction):
@@ -163,7 +172,8 @@ class MusicPlayer(PlaylistMixin, PlayerMixin):
         self.viewplaylistmode = False
 
         self.lastedit = discord.utils.utcnow()
-        self.timeidle = 0
+        self.alone_since: Optional[float] = None
+        self.alone_timeout = ALONE_TIMEOUT
         self.override = False
         self.channel, self.voice = None, None
         self.song_add_queue, self.songcanadd, self.processsize = Queue(), True, 0
@@ -180,15 +190,35 @@ class MusicPlayer(PlaylistMixin, PlayerMixin):
             "options": "-vn -bufsize 5M -nostats -loglevel 0",
         }
         self.FFMPEG_FILEOPTIONS = {"options": "-vn -loglevel 0"}
+        # When the last track finished on its own, for the gap metric.
+        self.ended_at: Optional[float] = None
+        self.prefetching = set()
+        self.supervisor = PlayerSupervisor(self)
+
+    def notify(self):
+        """Let the supervisor know something changed.  Safe from any thread."""
+        self.supervisor.notify()
+
+    def enqueue(self, song: AudioContainer):
+        """Put a song in the add queue, it's looked up and added to the playlist later."""
+        self.song_add_queue.put(song)
+        self.processsize += 1
+        self.notify()
+
+    def seconds_until_edit(self) -> float:
+        elapsed = (discord.utils.utcnow() - self.lastedit).total_seconds()
+        return max(0.0, EDIT_INTERVAL - elapsed)
 
     async def edit_current_player(self):
+        """Refresh the now playing message, at most once every EDIT_INTERVAL."""
         if self.lastm is not None:
-            duration = discord.utils.utcnow() - self.lastedit
-            if duration.total_seconds() > EDIT_INTERVAL:
+            if self.seconds_until_edit() <= 0:
                 oldembed = self.get_music_embed("", "")
-
-                await self.lastm.edit(embed=oldembed)
                 self.lastedit = discord.utils.utcnow()
+                try:
+                    await self.lastm.edit(embed=oldembed)
+                except discord.NotFound:
+                    self.lastm = None
 
     async def playlist_view(self, interaction: discord.Interaction):
         # ctx: commands.Context = await self.bot.get_context(interaction.message)
@@ -235,13 +265,26 @@ class MusicPlayer(PlaylistMixin, PlayerMixin):
         if self.song_add_queue.empty() == False:
             gui.gprint("Adding song.")
             if self.songcanadd:
-                self.songcanadd, got = False, False
+                self.songcanadd = False
+                batch = []
+                while not self.song_add_queue.empty() and len(batch) < SONG_ADD_BATCH:
+                    batch.append(self.song_add_queue.get())
+                self.processsize -= len(batch)
                 try:
-                    song = self.song_add_queue.get()
-                    got = True
-                    await asyncio.gather(asyncio.to_thread(self.musicplayeradd, song))
+                    # Look the batch up in parallel, but queue it in order.
+                    await asyncio.gather(
+                        *(
+                            song.get_song_async(
+                                do_search=True, db_search=False, substrings=False
+                            )
+                            for song in batch
+                        )
+                    )
+                    for song in batch:
+                        self.queue_loaded(song)
+                    if self.current is not None:
+                        self.prefetch_next()
 
-                    self.processsize -= 1
                     if self.song_add_queue.empty():
                         gui.gprint("COMPLETED.")
                         if self.channel:
@@ -253,15 +296,12 @@ class MusicPlayer(PlaylistMixin, PlayerMixin):
                             # mess=await self.channel.send(embed=embed)
                             self.bot.schedule_for_deletion(mess, 20)
                 except:
-                    if not got:
-                        self.processsize -= 1
-
                     gui.gprint("PROCESSING ERROR")
                     if self.song_add_queue.empty():
                         self.processsize = 0
                 self.songcanadd = True
-        if self.internal_message_log:
-            front = self.internal_message_log.pop()
+        while self.internal_message_log:
+            front = self.internal_message_log.pop(0)
             myname = AssetLookup.get_asset("name")
             myicon = AssetLookup.get_asset("embed_icon")
             embed = discord.Embed(description=front, color=discord.Color.brand_red())
@@ -270,29 +310,30 @@ class MusicPlayer(PlaylistMixin, PlayerMixin):
                 mess = await self.channel.send(embed=embed)
 
     async def autodisconnect(self):
+        """Leave once nobody else has been in the voice channel for alone_timeout seconds.
+        Returns True if it left."""
         voice = discord.utils.get(self.bot.voice_clients, guild=self.guild)
         if voice == None:
+            self.alone_since = None
             return False
-        if voice.is_connected():
-            if voice.channel != None:
-                if len(voice.channel.members) <= 1:
-                    self.timeidle += 1
-                    gui.gprint(self.timeidle)
-                    if self.timeidle >= 20:
-                        if self.channel != None:
-                            await self.send_message_internal(
-                                self.channel,
-                                "disconnected",
-                                f"I'm leaving {voice.channel.name} now because I'm the only one in it.",
-                            )
-
-                        await voice.disconnect()
-                        self.bot.remove_act("MusicPlay")
-                        return True
-                else:
-                    self.timeidle = 0
-        else:
-            pass
+        if voice.is_connected() and voice.channel != None:
+            if len(voice.channel.members) <= 1:
+                if self.alone_since is None:
+                    self.alone_since = time.monotonic()
+                if time.monotonic() - self.alone_since >= self.alone_timeout:
+                    self.alone_since = None
+                    if self.channel != None:
+                        await self.send_message_internal(
+                            self.channel,
+                            "disconnected",
+                            f"I'm leaving {voice.channel.name} now because I'm the only one in it.",
+                        )
+
+                    await voice.disconnect()
+                    self.bot.remove_act("MusicPlay")
+                    return True
+                return False
+        self.alone_since = None
         return False
 
     def reset(self):
@@ -379,7 +420,7 @@ class MusicPlayer(PlaylistMixin, PlayerMixin):
         if self.songs:
             self.current = self.songs.pop(0)
             if self.current.state != "Ok":
-                self.current.get_song()
+                await asyncio.to_thread(self.current.get_song)
                 if self.current.state == "Error":
                     gui.gprint("error")
                     # if song.state=="Error":
@@ -397,7 +438,8 @@ class MusicPlayer(PlaylistMixin, PlayerMixin):
             if voice is not None:
                 if voice.is_playing():
                     voice.pause()
-            song.get_source()  # Get youtube streaming link
+            # Get youtube streaming link, prefetched if all went well.
+            await asyncio.to_thread(song.get_source)
             if song.state == "Error":
                 # Something went wrong don't play it
                 gui.gprint("error")
@@ -417,24 +459,44 @@ class MusicPlayer(PlaylistMixin, PlayerMixin):
                 aud = discord.FFmpegPCMAudio(song.source, **self.FFMPEG_FILEOPTIONS)
             await asyncio.sleep(0.1)
             song.start()
-            voice.play(
-                aud,
-                after=lambda e: (
-                    self.bot.schedule_for_post(
-                        ctx.channel, "Error in playback: " + str(e)
-                    )
-                    if e
-                    else asyncio.run_coroutine_threadsafe(
-                        self.player_actions("auto_next"), self.bot.loop
-                    )
-                ),
-            )
+            voice.play(aud, after=lambda e: self.after_playback(ctx, e))
             voice.is_playing()
+            if self.ended_at is not None:
+                stream_cache.record_gap(time.monotonic() - self.ended_at)
+                self.ended_at = None
+            self.prefetch_next()
             self.bot.add_act(
                 "MusicPlay", f"{song.title}", discord.ActivityType.listening
             )
             await self.send_message(ctx, "play", f"**{song.title}** is now playing.  ")
 
+    def after_playback(self, ctx, e):
+        """Called from the voice thread once the current track is over."""
+        if e:
+            self.bot.schedule_for_post(ctx.channel, "Error in playback: " + str(e))
+            return
+        self.ended_at = time.monotonic()
+        asyncio.run_coroutine_threadsafe(
+            self.player_actions("auto_next"), self.bot.loop
+        )
+
+    def prefetch_next(self):
+        """Resolve the stream urls of the next few queued songs in the background,
+        so the next track change doesn't wait on yt_dlp."""
+        for song in self.songs[:PREFETCH_COUNT]:
+            if song.state != "Ok" or song in self.prefetching:
+                continue
+            self.prefetching.add(song)
+            task = asyncio.create_task(self.prefetch_song(song))
+            task.add_done_callback(lambda t, song=song: self.prefetching.discard(song))
+
+    async def prefetch_song(self, song: AudioContainer):
+        try:
+            await asyncio.to_thread(song.prefetch_source)
+        except Exception as e:
+            # play_song will try again and report it.
+            gui.dprint(f"Could not prefetch {song.title}: {e}")
+
     async def play_song_override(
         self, ctxmode: Union[discord.TextChannel, commands.Context], override
     ):
@@ -468,6 +530,10 @@ class MusicPlayer(PlaylistMixin, PlayerMixin):
     def musicplayeradd(self, song: AudioContainer):
         """Get song, and add to queue.  BLOCKING OPERATION."""
         song.get_song(do_search=True, db_search=False, substrings=False)
+        self.queue_loaded(song)
+
+    def queue_loaded(self, song: AudioContainer):
+        """Add a song that's done loading to the queue, or log why it couldn't be."""
         if song.state == "Error":
             self.internal_message_log.append(
                 f"I could not add {song.title} : `{str(song.error_value)}`"
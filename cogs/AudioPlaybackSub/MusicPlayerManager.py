@@ -14,6 +14,15 @@ class MusicPlayers:
         if key not in self.players:
             newplayer = MusicPlayer(bot, guild)
             self.players[key] = newplayer
+            newplayer.supervisor.start(
+                on_exit=lambda: self.drop_player(guild, newplayer)
+            )
+
+    def drop_player(self, guild: discord.Guild, player: MusicPlayer):
+        """Remove player, if it's still the guild's player."""
+        key = str(guild.id)
+        if self.players.get(key) is player:
+            self.players.pop(key)
 
     def getplayer(self, guild: discord.Guild) -> MusicPlayer:
         """get a music player object."""
@@ -43,6 +52,7 @@ class MusicPlayers:
         key = str(guild.id)
         if key in self.players:
             ret = self.players.pop(key)
+            ret.supervisor.stop()
             return ret
         return None
 
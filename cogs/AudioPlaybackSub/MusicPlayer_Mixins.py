@@ -1,11 +1,15 @@
 from typing import (
+    List,
     Literal,
     Tuple,
     Union,
 )
-from .AudioContainer import AudioContainer
+from .AudioContainer import AudioContainer, flat_entry_info
+from .MusicDatabase import MusicJSONMemoryDB
+import asyncio
 import random
 import discord
+import gui
 
 from discord.ext import commands
 
@@ -223,6 +227,7 @@ class PlayerMixin:
         if self.override != True:
             if action in self.action_dict:
                 await self.action_dict[action](ctx, editinter)
+                self.notify()
 
 
 class PlaylistMixin:
@@ -260,7 +265,7 @@ class PlaylistMixin:
         """
         url, author = param
         song = AudioContainer(url, author.name)
-        song.get_song(do_search)
+        await song.get_song_async(do_search)
 
         if song.state == "Error" and not ignore_error:
             if self.channel is not None:
@@ -278,6 +283,55 @@ class PlaylistMixin:
             res = await self.playlist_action_add(song)
             return res
 
+    async def playlist_action_add_playlist(
+        self, param: Tuple[dict, discord.abc.User]
+    ) -> List[AudioContainer]:
+        """
+        Add every entry of a flattened playlist to the playlist.
+
+        Entries already in the music cache are loaded from it, the rest come
+        straight from the flat entries and are stored in one insert.
+        Nothing is resolved per song here, stream urls are resolved and
+        prefetched once the songs come up to play.  If nothing is playing,
+        playback starts as soon as the first song is in.
+
+        Args:
+            param (Tuple[dict, User]): The playlist from special_playlist_download, and who asked for it.
+
+        Returns:
+            List[AudioContainer]: The added songs.
+        """
+        ie_result, author = param
+        infos = [flat_entry_info(e, ie_result) for e in ie_result.get("entries", [])]
+        infos = [info for info in infos if info is not None]
+        if not infos:
+            return []
+        known = await asyncio.to_thread(
+            MusicJSONMemoryDB.get_by_ids, [info["id"] for info in infos]
+        )
+        songs, new_infos = [], []
+        for info in infos:
+            song = AudioContainer(info["webpage_url"], author.name)
+            entry = known.get(info["id"])
+            if entry is not None and entry.infojson:
+                song.get_song_from_entry(entry)
+            else:
+                song.load_info(info)
+                new_infos.append(info)
+            songs.append(song)
+
+        await self.playlist_action_add(songs[0])
+        if self.current is None and self.voice is not None:
+            await self.player_actions("play")
+        self.songs.extend(songs[1:])
+        if self.autoshuffle:
+            random.shuffle(self.songs)
+        self.prefetch_next()
+
+        added = await asyncio.to_thread(MusicJSONMemoryDB.add_many, new_infos)
+        gui.dprint(f"Added {len(songs)} songs, {added} new to the music cache.")
+        return songs
+
     async def playlist_action_removespot(
         self, param: int
     ) -> Union[AudioContainer, str]:
@@ -353,6 +407,7 @@ class PlaylistMixin:
         self.playlist_action_dict = {
             "add": self.playlist_action_add,
             "add_url": self.playlist_action_add_url,
+            "add_playlist": self.playlist_action_add_playlist,
             "removespot": self.playlist_action_removespot,
             "jumpto": self.playlist_action_jumpto,
             "shuffle": self.playlist_action_shuffle,
@@ -362,7 +417,9 @@ class PlaylistMixin:
 
     async def playlist_actions(
         self,
-        action: Literal["add", "add_url", "removespot", "jumpto", "shuffle", "clear"],
+        action: Literal[
+            "add", "add_url", "add_playlist", "removespot", "jumpto", "shuffle", "clear"
+        ],
         param=None,
         **kwargs,
     ):
@@ -370,6 +427,7 @@ class PlaylistMixin:
         Dispatch a playlist action based on the passed in string action.
         'add'       : Add a AudioContainer to the playlist
         'add_url'   : Create an AudioContainer from a passed in url
+        'add_playlist': Add every entry of a flattened playlist
         'removespot': Remove
         'jumpto'    : Play the next song
         'shuffle'   : play the previous song
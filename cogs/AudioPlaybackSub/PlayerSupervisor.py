@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+import gui
+
+"""
+The task that looks after one MusicPlayer.
+
+MusicCog used to poll every player twice a second, whether anything was
+happening or not.  Each player now has a supervisor that sleeps until it's
+notified of something, which happens on:
+
+* songs being put in the player's add queue.
+* player actions, including the track end callback.
+* voice state changes in the player's voice channel.
+
+Besides that it only wakes up on its own for two deadlines: the next
+now playing refresh, while a song is playing, and the auto disconnect
+timeout, while the bot is alone in the voice channel.  An idle player's
+supervisor doesn't wake up at all.
+"""
+
+logs = logging.getLogger("TCLogger")
+
+
+class PlayerSupervisor:
+    """Wakes a MusicPlayer up only when something happened to it."""
+
+    def __init__(self, player):
+        self.player = player
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.on_exit: Optional[Callable[[], None]] = None
+        self.suspended = False
+        self.wakeups = 0
+
+    def start(self, on_exit: Callable[[], None] = None):
+        """Start supervising.  on_exit is called once the player disconnects."""
+        if self.task is None or self.task.done():
+            self.on_exit = on_exit
+            self.suspended = False
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
+
+    def suspend(self):
+        """Stop supervising without calling on_exit, so the player and its
+        voice client are kept.  For cog reloads, resume() picks it back up."""
+        self.suspended = True
+        self.stop()
+
+    def resume(self):
+        if self.suspended:
+            self.suspended = False
+            self.task = asyncio.create_task(self.run())
+
+    def notify(self):
+        """Wake the supervisor up.  Safe to call from any thread."""
+        loop = self.player.bot.loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.wake.set()
+        else:
+            loop.call_soon_threadsafe(self.wake.set)
+
+    def next_deadline(self) -> Optional[float]:
+        """When the supervisor has to wake up on its own, in monotonic time."""
+        player = self.player
+        deadlines = []
+        if player.alone_since is not None:
+            deadlines.append(player.alone_since + player.alone_timeout)
+        if (
+            player.lastm is not None
+            and player.current is not None
+            and player.player_condition == "play"
+        ):
+            deadlines.append(time.monotonic() + player.seconds_until_edit())
+        return min(deadlines) if deadlines else None
+
+    async def step(self) -> bool:
+        """Handle whatever woke the supervisor up.  Returns True to stop."""
+        player = self.player
+        await player.songadd()
+        if not player.song_add_queue.empty():
+            # Only one batch is added at a time, come right back for the rest.
+            self.wake.set()
+        await player.edit_current_player()
+        return await player.autodisconnect()
+
+    async def run(self):
+        try:
+            while True:
+                deadline = self.next_deadline()
+                timeout = None
+                if deadline is not None:
+                    timeout = max(0.0, deadline - time.monotonic())
+                try:
+                    await asyncio.wait_for(self.wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self.wake.clear()
+                self.wakeups += 1
+                try:
+                    if await self.step():
+                        break
+                except Exception as e:
+                    logs.error("Music player supervisor error %s", e, exc_info=True)
+                    gui.dprint(f"Music player supervisor error: {e}")
+                    # Don't spin if a deadline keeps failing.
+                    await asyncio.sleep(1)
+        finally:
+            # A suspended or replaced task leaves the player alone.
+            current = self.task is asyncio.current_task()
+            if self.on_exit is not None and current and not self.suspended:
+                self.on_exit()
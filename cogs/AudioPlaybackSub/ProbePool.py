@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+"""
+Bounded, cached ffprobe calls for audio files and file urls.
+
+ffprobe used to run through a shell, once per song and on whatever thread
+added it, so a big playlist of attachments meant one ffprobe per track with
+no limit.  Probes now go through probe_pool, which:
+
+* runs at most `concurrency` ffprobe processes at once, without a shell,
+  counting probes from the event loop and from worker threads together.
+* kills any probe that takes longer than `timeout` seconds.
+* caches results by path, size, and mtime for local files and by url for
+  everything else, so the same file is never probed twice.
+* shares one probe between everyone asking about the same file at once.
+"""
+
+
+class ProbeError(Exception):
+    """ffprobe failed, timed out, or couldn't find a duration."""
+
+
+def probe_command(target: str) -> list:
+    return ["ffprobe", "-v", "quiet", "-show_format", "-of", "json", "-i", target]
+
+
+def parse_probe(output: bytes, target: str) -> Dict[str, Any]:
+    """Get the duration and title out of ffprobe's json output."""
+    try:
+        fmt = json.loads(output or b"{}").get("format", {})
+    except ValueError:
+        fmt = {}
+    if "duration" not in fmt:
+        raise ProbeError(f"ffprobe could not find the duration of {target}")
+    tags = {k.lower(): v for k, v in fmt.get("tags", {}).items()}
+    return {
+        "duration": int(round(float(fmt["duration"]))),
+        "title": tags.get("title"),
+    }
+
+
+class ProbePool:
+    """Runs ffprobe with a concurrency limit, timeouts, and a result cache.
+
+    Args:
+        concurrency: Most ffprobe processes to run at once.
+        timeout: Seconds before a probe is killed.
+        max_entries: How many results to keep.
+    """
+
+    def __init__(self, concurrency: int = 4, timeout: float = 20.0, max_entries=2048):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.cache: OrderedDict[Tuple, Dict[str, Any]] = OrderedDict()
+        self.pending: Dict[Tuple, asyncio.Future] = {}
+        # One limit for probe() and probe_blocking() together.
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.probes = 0
+        self.timeouts = 0
+        self.failed = 0
+
+    @staticmethod
+    def cache_key(target: str) -> Tuple:
+        if os.path.exists(target):
+            st = os.stat(target)
+            return ("file", os.path.abspath(target), st.st_size, st.st_mtime_ns)
+        return ("url", target)
+
+    def _cached(self, key) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            result = self.cache.get(key)
+            if result is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+            return result
+
+    def _store(self, key, result: Dict[str, Any]):
+        with self.lock:
+            self.cache[key] = result
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+    async def _acquire_slot(self):
+        """Take a probe slot without blocking the event loop."""
+        while not self.slots.acquire(blocking=False):
+            await asyncio.sleep(0.05)
+
+    async def _run(self, target: str) -> Dict[str, Any]:
+        await self._acquire_slot()
+        try:
+            self.probes += 1
+            proc = await asyncio.create_subprocess_exec(
+                *probe_command(target),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            try:
+                output, _ = await asyncio.wait_for(proc.communicate(), self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                proc.kill()
+                await proc.wait()
+                raise ProbeError(f"ffprobe timed out on {target}")
+        finally:
+            self.slots.release()
+        return parse_probe(output, target)
+
+    async def probe(self, target: str) -> Dict[str, Any]:
+        """Get {"duration", "title"} for a file path or url."""
+        key = await asyncio.to_thread(self.cache_key, target)
+        result = self._cached(key)
+        if result is not None:
+            return result
+        if key in self.pending:
+            return await asyncio.shield(self.pending[key])
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        try:
+            result = await self._run(target)
+            self._store(key, result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.failed += 1
+            future.set_exception(e)
+            # Nobody may be waiting on it.
+            future.exception()
+            raise
+        finally:
+            self.pending.pop(key, None)
+
+    def probe_blocking(self, target: str) -> Dict[str, Any]:
+        """probe, for code running in a worker thread.  BLOCKING OPERATION."""
+        key = self.cache_key(target)
+        result = self._cached(key)
+        if result is not None:
+            return result
+        with self.slots:
+            self.probes += 1
+            try:
+                output = subprocess.run(
+                    probe_command(target),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    timeout=self.timeout,
+                ).stdout
+            except subprocess.TimeoutExpired:
+                self.timeouts += 1
+                self.failed += 1
+                raise ProbeError(f"ffprobe timed out on {target}")
+        try:
+            result = parse_probe(output, target)
+        except ProbeError:
+            self.failed += 1
+            raise
+        self._store(key, result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.cache),
+            "hits": self.hits,
+            "probes": self.probes,
+            "running": len(self.pending),
+            "timeouts": self.timeouts,
+            "failed": self.failed,
+        }
+
+
+probe_pool = ProbePool()
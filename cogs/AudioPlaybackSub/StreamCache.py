@@ -0,0 +1,177 @@
+import datetime
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import yt_dlp  # type: ignore
+
+import gui
+
+"""
+Cache of resolved stream urls.
+
+Resolving a page url like a youtube link into something ffmpeg can stream
+takes a multi second yt_dlp extract_info call.  The stream urls it gives back
+are signed and stay valid for hours, so they're cached here by page url until
+shortly before they expire.
+
+Each url is only resolved once at a time: a play that needs a url that's
+still being prefetched waits on that prefetch instead of starting its own.
+
+This also keeps the track-to-track gap times of every player.
+"""
+
+# When a signed url doesn't say when it expires.
+DEFAULT_TTL = 600.0
+# A cached url has to stay valid for the whole track, plus this much.
+SAFETY_MARGIN = 60.0
+# Tracks longer than this, or with unknown durations, use this instead.
+MAX_PLAY_WINDOW = 3 * 60 * 60.0
+
+_PATH_EXPIRE = re.compile(r"/expire/(\d+)")
+
+
+def stream_expiry(source: str, resolved_at: float) -> float:
+    """Get when the signed stream url source expires, as a unix timestamp."""
+    parts = urlsplit(source)
+    query = parse_qs(parts.query)
+    for key in ("expire", "Expires", "expires"):
+        if key in query:
+            try:
+                return float(query[key][0])
+            except ValueError:
+                pass
+    if "X-Amz-Date" in query and "X-Amz-Expires" in query:
+        try:
+            signed = datetime.datetime.strptime(
+                query["X-Amz-Date"][0], "%Y%m%dT%H%M%SZ"
+            ).replace(tzinfo=datetime.timezone.utc)
+            return signed.timestamp() + float(query["X-Amz-Expires"][0])
+        except ValueError:
+            pass
+    # youtube's manifest urls put the signature in the path.
+    match = _PATH_EXPIRE.search(parts.path)
+    if match:
+        return float(match.group(1))
+    return resolved_at + DEFAULT_TTL
+
+
+def extract_stream(url: str, options: Dict[str, Any]) -> str:
+    """Resolve url into a stream url with yt_dlp.  BLOCKING OPERATION."""
+    with yt_dlp.YoutubeDL(options) as ydl:
+        res = ydl.extract_info(f"{url}", download=False)
+        if "entries" in res:  # a playlist or a list of videos
+            info = res["entries"][0]
+        else:  # Just a video
+            info = res
+    return info["url"]
+
+
+class StreamCache:
+    """Resolved stream urls keyed by page url and format, until they expire.
+
+    Args:
+        max_entries: How many urls to keep.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[Tuple[str, Any], Tuple[str, float]] = OrderedDict()
+        self.pending: Dict[Tuple[str, Any], Future] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.joined = 0
+        self.expired = 0
+        self.prefetched = 0
+        self.failed = 0
+        self.gaps: Deque[float] = deque(maxlen=500)
+
+    def _fresh(self, key, now: float, duration: float) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        source, expires = entry
+        window = min(duration or MAX_PLAY_WINDOW, MAX_PLAY_WINDOW)
+        if expires - now < window + SAFETY_MARGIN:
+            self.entries.pop(key)
+            self.expired += 1
+            return None
+        self.entries.move_to_end(key)
+        return source
+
+    def resolve(
+        self,
+        url: str,
+        options: Dict[str, Any],
+        duration: float = 0,
+        prefetch: bool = False,
+    ) -> str:
+        """Get a stream url for url that's good for duration more seconds.
+        BLOCKING OPERATION on a miss."""
+        key = (url, options.get("format"))
+        now = time.time()
+        with self.lock:
+            source = self._fresh(key, now, duration)
+            if source is not None:
+                if not prefetch:
+                    self.hits += 1
+                return source
+            pending = self.pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = Future()
+                self.pending[key] = pending
+                if prefetch:
+                    self.prefetched += 1
+                else:
+                    self.misses += 1
+            elif not prefetch:
+                self.joined += 1
+        if not owner:
+            return pending.result()
+        try:
+            source = extract_stream(url, options)
+            expires = stream_expiry(source, now)
+            with self.lock:
+                self.entries[key] = (source, expires)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            pending.set_result(source)
+            return source
+        except Exception as e:
+            self.failed += 1
+            pending.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+
+    def record_gap(self, seconds: float):
+        """Record the silence between one track ending and the next starting."""
+        self.gaps.append(seconds)
+        gui.dprint(f"Track gap: {seconds:.2f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        gaps = sorted(self.gaps)
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "joined": self.joined,
+            "prefetched": self.prefetched,
+            "expired": self.expired,
+            "failed": self.failed,
+            "gaps": len(gaps),
+            "p50_gap": gaps[len(gaps) // 2] if gaps else 0.0,
+            "p95_gap": gaps[min(len(gaps) - 1, int(len(gaps) * 0.95))] if gaps else 0.0,
+            "max_gap": gaps[-1] if gaps else 0.0,
+        }
+
+
+stream_cache = StreamCache()
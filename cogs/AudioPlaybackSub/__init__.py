@@ -1,5 +1,6 @@
 from .AudioContainer import (
     AudioContainer,
+    extract_flat_playlist,
     special_playlist_download,
     speciallistsplitter,
 )
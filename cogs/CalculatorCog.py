@@ -15,7 +15,14 @@ from discord import app_commands
 
 from utility.globalfunctions import prioritized_string_split
 
-from .StepCalculator import evaluate_expression, OutContainer, dprint, get_linenumber
+from .StepCalculator import (
+    evaluate_expression,
+    OutContainer,
+    dprint,
+    get_linenumber,
+    CalcError,
+    CalcWorkerPool,
+)
 
 
 class CalculatorCog(commands.Cog, TC_Cog_Mixin):
@@ -29,6 +36,10 @@ class CalculatorCog(commands.Cog, TC_Cog_Mixin):
         self.verbshow = False
         self.debugmode = False
         self.bot = bot
+        self.workers = CalcWorkerPool()
+
+    def cog_unload(self):
+        self.workers.close()
 
     @commands.command(aliases=["setverb"])
     async def changeverb(self, ctx, newverb: int = 0):
@@ -203,7 +214,11 @@ example: (2d20reroll>10) will reroll any dice that has a value greater than 10."
         )
         value = ""
         try:
-            value = evaluate_expression(rollv, tuple(newA), outputFunc=out)
+            lines, value = await self.workers.evaluate(rollv, tuple(newA), verb)
+            for line_verb, line in lines:
+                out.outFunc(line, verb=line_verb)
+        except CalcError as ex:
+            value = ex
         except Exception as ex:
             await self.bot.send_error(ex, "Calculation Error")
             value = ex
@@ -222,6 +237,19 @@ example: (2d20reroll>10) will reroll any dice that has a value greater than 10."
                 embedv.add_field(name="To be continued...", value="tbc")
             await ctx.send(embed=embedv, ephemeral=True)
 
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def calc_stats(self, ctx):
+        """Show the calculator worker pool stats.  Owner only."""
+        p = self.workers.stats()
+        await ctx.send(
+            f"{p['workers']} calculator workers, {p['busy']} busy, queue depth "
+            f"{p['queue_depth']}, {p['uses']} uses, {p['errors']} errors, "
+            f"{p['cpu_limited']} over cpu time, {p['killed']} killed, "
+            f"{p['recycled']} recycled.\n"
+            f"Wait: p50 {p['p50_wait']:.2f}s, max {p['max_wait']:.2f}s"
+        )
+
 
 def operateTest(expr, verb=6):
     out = OutContainer(verb)
@@ -4,7 +4,7 @@ import asyncio
 import discord
 import logging
 from discord import app_commands
-from discord.ext import commands, tasks
+from discord.ext import commands
 import re
 from queue import Queue
 from typing import (
@@ -18,6 +18,8 @@ import yt_dlp  # type: ignore
 from utility import seconds_to_time_string
 
 from .AudioPlaybackSub import *
+from .AudioPlaybackSub.ProbePool import probe_pool
+from .AudioPlaybackSub.StreamCache import stream_cache
 
 logger = logging.getLogger("discord")
 
@@ -34,6 +36,9 @@ class MusicCog(commands.Cog, TC_Cog_Mixin):
         self.lock = asyncio.Lock()
 
         self.get_ctx = None
+        # Players outlive a reload of this cog, pick their supervisors back up.
+        for player in MusicManager.all_players():
+            player.supervisor.resume()
 
         self.helpdesc = """
         A list of music commands, created using the parzibot music commands as a template, but are slowly getting re-written into something far more advanced.
@@ -61,26 +66,24 @@ class MusicCog(commands.Cog, TC_Cog_Mixin):
             " • **/mp playlistclear** - Clear all songs from Playlist\n"
             " • **/mp shuffle** - shuffle the playlist once shuffling"
         """
-        self.song_add_processer.start()
 
     def cog_unload(self):
-        self.song_add_processer.cancel()
+        for player in MusicManager.all_players():
+            player.supervisor.suspend()
 
-    @tasks.loop(seconds=0.5)
-    async def song_add_processer(self):
-        """Fire every 1/20th of a second, download the data for a song in the queue,
-        and add to the playlist.  Also check if it's time to disconnect and remove a musicplayer.
-        """
-        toremove = []
-        for i in MusicManager.all_players():
-            await i.countusers()
-            await i.songadd()
-            await i.edit_current_player()
-            removeif = await i.autodisconnect()
-            if removeif:
-                toremove.append(i.guild)
-        for i in toremove:
-            MusicManager.remove_player(i)
+    @commands.Cog.listener()
+    async def on_voice_state_update(
+        self,
+        member: discord.Member,
+        before: discord.VoiceState,
+        after: discord.VoiceState,
+    ):
+        """Wake the guild's music player when someone joins or leaves its channel."""
+        if before.channel == after.channel:
+            return
+        player = MusicManager.get(member.guild)
+        if player is not None:
+            player.notify()
 
     mp = app_commands.Group(
         name="mp", description="Music Player Commands", guild_only=True
@@ -93,6 +96,22 @@ class MusicCog(commands.Cog, TC_Cog_Mixin):
             "Hello from top level command!", ephemeral=True
         )
 
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def music_streams(self, ctx):
+        """Show the stream url cache, file probe, and track gap stats.  Owner only."""
+        s = stream_cache.stats()
+        p = probe_pool.stats()
+        await ctx.send(
+            f"{s['entries']} cached streams, {s['hits']} hits, {s['misses']} misses, "
+            f"{s['joined']} waited on a prefetch, {s['prefetched']} prefetched, "
+            f"{s['expired']} expired, {s['failed']} failed.\n"
+            f"{s['gaps']} track gaps, p50 {s['p50_gap']:.2f}s, "
+            f"p95 {s['p95_gap']:.2f}s, max {s['max_gap']:.2f}s.\n"
+            f"{p['entries']} cached probes, {p['hits']} hits, {p['probes']} ffprobe runs, "
+            f"{p['running']} running, {p['timeouts']} timeouts, {p['failed']} failed."
+        )
+
     @commands.command(name="musichelpcommand")
     async def musichelpme(self, ctx):
         """Just a placeholder command."""
@@ -233,6 +252,20 @@ class MusicCog(commands.Cog, TC_Cog_Mixin):
 
             await voice.disconnect()
 
+    async def song_autocomplete(self, interaction: discord.Interaction, current: str):
+        """
+        Autocomplete for songs already in the music cache.
+        """
+        if not current or current.startswith("http"):
+            return []
+        found = await asyncio.to_thread(MusicJSONMemoryDB.autocomplete, current)
+        # Choice values can't be longer than 100 characters.
+        return [
+            app_commands.Choice(name=title[:100], value=url)
+            for title, url in found
+            if len(url) <= 100
+        ]
+
     @mp.command(
         name="play",
         description="Play song to Voice Channel.  If you have a valid url, you can add it here.",
@@ -240,6 +273,7 @@ class MusicCog(commands.Cog, TC_Cog_Mixin):
     @app_commands.describe(
         url=" URL to audio (YouTube,Soundcloud).  If it is not a url, then Nikki will use it as a search term."
     )
+    @app_commands.autocomplete(url=song_autocomplete)
     async def play(self, interaction: discord.Interaction, url: str = ""):
         ctx: commands.Context = await self.bot.get_context(interaction)
         guild: discord.Guild = interaction.guild
@@ -523,33 +557,27 @@ class MusicCog(commands.Cog, TC_Cog_Mixin):
             interaction, ctx
         ):  # if it's true, then it shouldn't run.
             return
-        ydlops = {
-            "extract_flat": "in_playlist",
-            "skip_download": True,
-            "forcejson": True,
-        }
-        with yt_dlp.YoutubeDL(ydlops) as ydl:
-            try:
-                ie = ydl.extract_info(f"{url}", download=False, process=False)
-                result_type = ie.get("_type", "video")
-                if result_type in ("playlist", "multi_video"):
-                    await self.playlistcopy(ctx, url, ie)
-                    return
-            except yt_dlp.DownloadError as e:
-                gui.gprint(e)
-            opres = await MusicManager.get(guild).playlist_actions(
-                "add_url", (url, ctx.author)
-            )
-            if opres == None:
-                await MessageTemplatesMusic.music_msg(
-                    ctx,
-                    "something went wrong...",
-                    f"I couldn't find the **{url}** video... are you sure it's a valid url?",
-                )
+        try:
+            ie = await asyncio.to_thread(extract_flat_playlist, url)
+            result_type = ie.get("_type", "video")
+            if result_type in ("playlist", "multi_video"):
+                await self.playlistcopy(ctx, url, ie)
                 return
+        except yt_dlp.DownloadError as e:
+            gui.gprint(e)
+        opres = await MusicManager.get(guild).playlist_actions(
+            "add_url", (url, ctx.author)
+        )
+        if opres == None:
             await MessageTemplatesMusic.music_msg(
-                ctx, "Playlist", f"**I added {opres.title}** to my playlist."
+                ctx,
+                "something went wrong...",
+                f"I couldn't find the **{url}** video... are you sure it's a valid url?",
             )
+            return
+        await MessageTemplatesMusic.music_msg(
+            ctx, "Playlist", f"**I added {opres.title}** to my playlist."
+        )
 
     @mp.command(
         name="add_server_playlist",
@@ -628,8 +656,7 @@ class MusicCog(commands.Cog, TC_Cog_Mixin):
                 for i, item in enumerate(urls):
                     url = item
                     song = AudioContainer(url, thisMessage.author.name)
-                    MusicManager.get(ctx.guild).song_add_queue.put(song)
-                    MusicManager.get(ctx.guild).processsize += 1
+                    MusicManager.get(ctx.guild).enqueue(song)
                     total += 1
         stat.delete()
         await MusicManager.get(ctx.guild).send_message(
@@ -715,42 +742,36 @@ class MusicCog(commands.Cog, TC_Cog_Mixin):
             use_author=False,
         )
 
-        total = 0
-        ydlops = {
-            "extract_flat": "in_playlist",
-            "skip_download": True,
-            "forcejson": True,
-        }
         self.get_ctx = ctx.channel
-        with yt_dlp.YoutubeDL(ydlops) as ydl:
-            internetres = initial
-            if internetres == None:
-                internetres = ydl.extract_info(f"{url}", download=False, process=False)
-            res = await special_playlist_download(self.bot, ctx, internetres)
-            stat = self.bot.add_status_message(ctx)
-            await stat.updatew("Converting Tracks.")
-            if "entries" in res:
-                video = res["entries"]
-                l = len(video)
-                if l >= 256:
-                    await MessageTemplatesMusic.music_msg(
-                        ctx,
-                        "something went wrong...",
-                        f"...I am not adding {l} songs from this playlist...",
-                    )
-                    return
-                for i, item in enumerate(video):
-                    url = "https://youtu.be/" + item["id"]
-                    song = AudioContainer(url, ctx.author.name)
-                    MusicManager.get(ctx.guild).song_add_queue.put(song)
-                    MusicManager.get(ctx.guild).processsize += 1
-                    total += 1
-                stat.delete()
+        internetres = initial
+        if internetres == None:
+            internetres = await asyncio.to_thread(extract_flat_playlist, url)
+        res = await special_playlist_download(self.bot, ctx, internetres)
+        stat = self.bot.add_status_message(ctx)
+        await stat.updatew("Converting Tracks.")
+        if not res or "entries" not in res:
+            stat.delete()
+            await MessageTemplatesMusic.music_msg(
+                ctx, "something went wrong...", "...I couldn't read this playlist..."
+            )
+            return
+        l = len(res["entries"])
+        if l >= 256:
+            stat.delete()
+            await MessageTemplatesMusic.music_msg(
+                ctx,
+                "something went wrong...",
+                f"...I am not adding {l} songs from this playlist...",
+            )
+            return
+        songs = await MusicManager.get(ctx.guild).playlist_actions(
+            "add_playlist", (res, ctx.author)
+        )
+        stat.delete()
         await MusicManager.get(ctx.guild).send_message(
             ctx,
             "Playlist",
-            f"I added all {total} tracks to my processing queue! \
-             They'll be added to the playlist once I finish downloading the data.",
+            f"I added all {len(songs)} tracks to my playlist!",
         )
 
         # self.songs.append(song)
@@ -288,7 +288,7 @@ class PollingCog(commands.Cog, TC_Cog_Mixin):
             await MessageTemplates.poll_message(ctx, statusmessage)
             return
 
-        prof = ServerArchiveProfile.get(server_id=guild.id)
+        prof = await ServerArchiveProfile.get_a(server_id=guild.id)
         if prof:
             if autochannel.id == prof.history_channel_id:
                 result = "this should not be the same channel as the archive channel.  Specify a different channel such as a bot spam channel."
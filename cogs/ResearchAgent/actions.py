@@ -8,8 +8,6 @@ from typing import List, Optional, Tuple
 import discord
 import numpy as np
 from nltk.tokenize import sent_tokenize
-from openai import AsyncClient
-from sklearn.metrics.pairwise import cosine_similarity
 
 from bot import StatusEditMessage
 
@@ -27,8 +25,37 @@ def advanced_sentence_splitter(text):
     return sentences
 
 
+def normalized_matrix(vectors) -> np.ndarray:
+    """Stack vectors into a float32 matrix with unit length rows.
+    Zero vectors are left as zeros, so they score 0 like sklearn's cosine_similarity."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def doc_matrix(docs: List[DocumentScoreVector]) -> np.ndarray:
+    """The normalized embedding matrix of a list of (doc, score, embedding) tuples."""
+    return normalized_matrix([emb for _, _, emb in docs])
+
+
+def top_k(scores: np.ndarray, k: Optional[int] = None) -> List[Tuple[int, float]]:
+    """Get the k highest scores in a 1D array as (index, score), highest first."""
+    if k is None or k >= len(scores):
+        order = np.argsort(-scores, kind="stable")
+    else:
+        part = np.argpartition(-scores, k)[:k]
+        order = part[np.argsort(-scores[part], kind="stable")]
+    return [(int(i), float(scores[i])) for i in order]
+
+
 def get_closest(
-    sentemb: List[float], docs: List[DocumentScoreVector]
+    sentemb: List[float],
+    docs: List[DocumentScoreVector],
+    k: Optional[int] = None,
+    matrix: Optional[np.ndarray] = None,
 ) -> List[Tuple[int, float]]:
     """
     Find the documents closest to a given sentence embedding within a list of documents.
@@ -36,36 +63,17 @@ def get_closest(
     Args:
         sentemb: The embedding of the sentence as a list of floats.
         docs: A list of tuples, each containing a document, unspecified data, and the document's embedding.
+        k: Only return the k closest documents.  Defaults to all of them.
+        matrix: A precomputed doc_matrix(docs), to skip stacking the embeddings again.
 
     Returns:
         a sorted list of tuples: the first value contains the id of each close source
         and the second value contains their corresponding similarity scores.
     """
-    sentemb_array = np.array(sentemb)
-    sentemb_array = sentemb_array.reshape(1, -1)
-    top_docs = []  # Initialize with empty list to collect top similar documents
-    similarity_scores = []  # Initialize with empty list to collect similarity scores
-
-    for docid, doc in enumerate(docs):
-        doc, _, emb = doc
-
-        # Assuming emb and sentemb are lists containing embeddings
-        emb_array = np.array(emb)
-
-        # Reshaping to 2D arrays for cosine similarity comparison
-        emb_array = emb_array.reshape(1, -1)
-
-        # Compute cosine similarity
-        similarity_score = cosine_similarity(emb_array, sentemb_array)
-
-        # Collect all similarity scores and corresponding documents
-        similarity_scores.append(similarity_score[0][0])
-        top_docs.append((docid, similarity_score[0][0]))
-
-    top_docs = sorted(top_docs, key=lambda x: x[1], reverse=True)
-
-    # Extracting documents and their scores into separate lists
-    return top_docs
+    if matrix is None:
+        matrix = doc_matrix(docs)
+    scores = matrix @ normalized_matrix(sentemb)[0]
+    return top_k(scores, k)
 
 
 def chunk_sentences(sentences: List[str], chunk_size: int = 10) -> List[List[str]]:
@@ -82,8 +90,9 @@ async def sentence_sim_op(
     """Evaluate how well each sentence in an answer matches with sources.
 
     This method calculates and returns the similarity scores between the sentences in an answer
-    and a list of document embeddings provided. It performs this calculation for each sentence,
-    chunking the sentences for efficiency, and returns a comprehensive list of matches,
+    and a list of document embeddings provided. All sentences are embedded through the
+    cached embedder and scored against every document with one matrix product,
+    and it returns a comprehensive list of matches,
     along with averaged and maximum similarity scores for each source document.
 
     Args:
@@ -96,49 +105,38 @@ async def sentence_sim_op(
         scores per document,
         and the overall mean similarity score across all documents.
     """
-    client = AsyncClient()
-
     sentences = advanced_sentence_splitter(answer)
-    sentence_length = len(sentences)
-    chunks = chunk_sentences(sentences, 25)
     all_distances = []
-    sent_id = 0
     result = []
     doc_map = defaultdict(list)
-    for chunk in chunks:
-        resp = await try_until_ok(
-            client.embeddings.create,
-            model="text-embedding-3-small",
-            input=chunk,
-            encoding_format="float",
-            timeout=25,
+
+    # The shared embedder batches the request and skips cached sentences.
+    embedder = LanceTools.get_embedding("text-embedding-3-small")
+    sentence_embs = await try_until_ok(embedder.aembed_documents, sentences)
+
+    def score_all():
+        if not docs:
+            return np.zeros((len(sentences), 0), dtype=np.float32)
+        return normalized_matrix(sentence_embs) @ doc_matrix(docs).T
+
+    scores = await asyncio.to_thread(score_all) if sentences else []
+    for sent_id, (sent, row) in enumerate(zip(sentences, scores)):
+        keep = np.flatnonzero(row > 0.05)
+        all_distances.extend(row[keep].tolist())
+        for i in keep:
+            doc_map[int(i)].append((int(i), float(row[i])))
+        # get first 4 entries (the closest matches, and return the ids, mean, and max)
+        sorted_docs = [(int(keep[i]), score) for i, score in top_k(row[keep], 4)]
+
+        val = [doc[1] for doc in sorted_docs] or [0.0]
+        out = (
+            sent_id,
+            sent,
+            [doc[0] for doc in sorted_docs],
+            round(float(np.mean(val)) * 100, 1),
+            round(float(max(val)) * 100, 1),
         )
-        for sent, c in zip(chunk, resp.data):
-            top_docs: List[Tuple[int, float]] = await asyncio.to_thread(
-                get_closest, c.embedding, docs
-            )
-
-            filtered_docs = [doc for doc in top_docs if doc[1] > 0.05]
-
-            # Add to map.
-
-            sorted_docs = sorted(filtered_docs, key=lambda x: x[1], reverse=True)
-            all_distances.extend([distance for _, distance in sorted_docs])
-            for i, score in filtered_docs:
-                doc_map[i].append((i, score))
-            # get first 4 entries (the closest matches, and return the ids, mean, and max)
-            sorted_docs = sorted_docs[:4]
-
-            val = [doc[1] for doc in sorted_docs]
-            out = (
-                sent_id,
-                sent,
-                [doc[0] for doc in sorted_docs],
-                round(float(np.mean(val)) * 100, 1),
-                round(float(max(val)) * 100, 1),
-            )
-            result.append(out)
-            sent_id += 1
+        result.append(out)
 
     # Get averages and max for each source separately
     averages_and_maxes = [
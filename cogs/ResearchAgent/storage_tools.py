@@ -7,7 +7,6 @@ from typing import List, Tuple
 import lancedb
 from htmldate import find_date
 from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
 from tqdm.asyncio import tqdm_asyncio
 
 import gui
@@ -61,20 +60,13 @@ async def add_summary(
     usethesedocs = [docs]
     if client == None:
         client = LanceTools.get_lance_client()
-        vectorstore = LanceTools.configure_lance_client(
-            embed=OpenAIEmbeddings(model="text-embedding-3-small"),
-            collection=collection,
-            client=client,
-        )
-        await vectorstore.aadd_documents(usethesedocs)
-    else:
-        vectorstore = LanceTools.configure_lance_client(
-            embed=OpenAIEmbeddings(model="text-embedding-3-small"),
-            collection=collection,
-            client=client,
-        )
-        await vectorstore.aadd_documents(usethesedocs)
-        # vectorstore.persist()
+    vectorstore = LanceTools.configure_lance_client(
+        embed=LanceTools.get_embedding(),
+        collection=collection,
+        client=client,
+    )
+    await vectorstore.aadd_documents(usethesedocs)
+    # vectorstore.persist()
 
 
 async def store_many_splits(
@@ -105,7 +97,7 @@ async def store_many_splits(
     client = LanceTools.get_lance_client()
     vs = LanceTools.configure_lance_client(
         client=client,
-        embed=OpenAIEmbeddings(model="text-embedding-3-small"),
+        embed=LanceTools.get_embedding(),
         collection=collection,
     )
 
@@ -139,9 +131,9 @@ def has_url(
     persist = "saveData"
     if client != None:
         try:
-            table = client.open_table(
-                collection,
-            )
+            table = LanceTools.get_cached_table(client, collection)
+            if table is None:
+                raise ValueError(f"Table {collection} does not exist.")
             res = table.search().where(f'source="{url}"').to_list()
             if res:
                 return True, res
@@ -163,7 +155,7 @@ async def debug_get(
     persist = "saveData"
     vs = LanceTools.configure_lance_client(
         client=client,
-        embed=OpenAIEmbeddings(model="text-embedding-3-small"),
+        embed=LanceTools.get_embedding(),
         collection=collection,
     )
     if titleres == "None":
@@ -180,9 +172,9 @@ def remove_url(
     persist = "saveData"
     if client != None:
         try:
-            table = client.open_table(
-                collection,
-            )
+            table = LanceTools.get_cached_table(client, collection)
+            if table is None:
+                raise ValueError(f"Table {collection} does not exist.")
             res = table.delete(f'source="{url}"')
             return True
         except ValueError as e:
@@ -204,7 +196,7 @@ async def search_sim(
 ) -> List[DocumentScoreVector]:
     vs = LanceTools.configure_lance_client(
         client=client,
-        embed=OpenAIEmbeddings(model="text-embedding-3-small"),
+        embed=LanceTools.get_embedding(),
         collection=collection,
     )
     filterwith = ""
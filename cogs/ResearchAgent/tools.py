@@ -2,6 +2,7 @@ import asyncio
 import copy
 import datetime
 import re
+import threading
 from typing import Any, AsyncGenerator, List, Tuple, Union, Optional
 
 import openai
@@ -122,12 +123,25 @@ def google_search(bot, query: str, result_limit: int) -> dict:
     return query_results
 
 
-async def async_markdown_convert(url, timeout=30):
-    import markitdown
+_markitdown_local = threading.local()
+# How many markitdown conversions may run in threads at once.
+_markdown_semaphore = asyncio.Semaphore(4)
+
+
+def _markdown_convert(url):
+    """Convert url with this thread's MarkItDown, making one if needed."""
+    if not hasattr(_markitdown_local, "converter"):
+        import markitdown
+
+        _markitdown_local.converter = markitdown.MarkItDown()
+    return _markitdown_local.converter.convert(url)
 
-    markdown = markitdown.MarkItDown()
-    result = await asyncio.wait_for(asyncio.to_thread(markdown.convert, url), timeout)
-    return result
+
+async def async_markdown_convert(url, timeout=30):
+    async with _markdown_semaphore:
+        return await asyncio.wait_for(
+            asyncio.to_thread(_markdown_convert, url), timeout
+        )
 
 
 async def read_and_split_pdf(
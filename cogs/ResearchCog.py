@@ -6,7 +6,7 @@ print("Discord import")
 import discord
 import gptfunctionutil.functionlib as gptum
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 print("Discord import")
 from gptfunctionutil import (
@@ -19,9 +19,11 @@ from javascriptasync import JSContext
 
 import gptmod
 import gui
+from gptmod.lancetools import LanceTools
 import assetloader
 from assetloader import AssetLookup
 from bot import StatusEditMessage, TC_Cog_Mixin, TCBot, super_context_menu
+from database import DatabaseSingleton
 from database.database_ai import AuditProfile
 from utility import prioritized_string_split
 from utility.embed_paginator import pages_of_embeds
@@ -41,18 +43,28 @@ INVALID_SERVER_ERROR = (
 
 
 async def check_ai_rate(ctx):
-    serverrep, userrep = AuditProfile.get_or_new(ctx.guild, ctx.author)
-    serverrep.checktime()
-    userrep.checktime()
-    ok, reason = userrep.check_if_ok()
+    async with DatabaseSingleton.task_session() as session:
+        serverrep, userrep = await AuditProfile.get_or_new_a(
+            ctx.guild, ctx.author, session=session
+        )
+        serverrep.checktime()
+        userrep.checktime()
+        ok, reason = userrep.check_if_ok()
+        if ok:
+            if await AuditProfile.modify_status_a(userrep, session=session):
+                await AuditProfile.modify_status_a(
+                    serverrep, limited=False, session=session
+                )
+            else:
+                # Another call from this user got in first.
+                ok, reason = False, userrep.check_if_ok()[1]
+        await session.commit()
     if not ok:
         denyied = "Something went wrong, please try again later."
         if reason in ["messagelimit", "ban"]:
             denyied = "You have exceeded the daily rate limit."
         await ctx.send(content=denyied, ephemeral=True)
         return False
-    serverrep.modify_status()
-    userrep.modify_status()
     return True
 
 
@@ -173,6 +185,73 @@ class ResearchCog(commands.Cog, TC_Cog_Mixin):
         Given text from a non-English language, provide an accurate English translation.  If any part of the non-English text can be translated in more than one possible way, provide all possible translations for that part in parenthesis.
         """
         self.init_context_menus()
+        from gptmod.lance_index import index_manager
+
+        index_manager.configure(
+            min_rows=self.bot.config.getint("lance", "index_min_rows", fallback=20000),
+            index_type=self.bot.config.get("lance", "index_type", fallback="IVF_PQ"),
+            nprobes=self.bot.config.getint("lance", "index_nprobes", fallback=20),
+            refine_factor=self.bot.config.getint(
+                "lance", "index_refine_factor", fallback=20
+            ),
+        )
+        self.maintain_lance_indexes.start()
+
+    def cog_unload(self):
+        self.maintain_lance_indexes.cancel()
+
+    @tasks.loop(hours=6)
+    async def maintain_lance_indexes(self):
+        """Compact the lance tables and keep their vector indexes up to date."""
+        try:
+            results = await asyncio.to_thread(LanceTools.maintain_indexes)
+            for result in results:
+                gui.dprint(result)
+        except Exception as e:
+            await self.bot.send_error(e, "lance maintenance")
+
+    @commands.command(name="lance_indexes", hidden=True)
+    @commands.is_owner()
+    async def lance_indexes(self, ctx: commands.Context, maintain: bool = False):
+        """Show row, fragment, and vector index counts for each lance table."""
+        from gptmod.lance_index import index_manager
+
+        if maintain:
+            await asyncio.to_thread(LanceTools.maintain_indexes)
+        client = LanceTools.get_lance_client()
+        lines = []
+        for name in await asyncio.to_thread(client.table_names):
+            table = LanceTools.get_cached_table(client, name)
+            if table is None:
+                continue
+            r = await asyncio.to_thread(index_manager.report, table)
+            index = r["index"]
+            desc = (
+                f"{index['type']}, {index['indexed']} indexed, {index['unindexed']} unindexed"
+                if index
+                else "brute force"
+            )
+            lines.append(
+                f"{name}: {r['rows']} rows, {r['fragments']} fragments "
+                f"({r['small_fragments']} small), {desc}"
+            )
+        await ctx.send("\n".join(lines) or "No lance tables.")
+
+    @commands.command(name="js_pool", hidden=True)
+    @commands.is_owner()
+    async def js_pool(self, ctx: commands.Context):
+        """Show the JS worker pool's workers, queue depth, and recycling."""
+        if not self.bot.jspool:
+            await ctx.send("The JS worker pool is not running.")
+            return
+        stats = self.bot.jspool.stats()
+        await ctx.send(
+            f"{stats['workers']} workers, {stats['busy']} busy, "
+            f"queue depth {stats['queue_depth']}.\n"
+            f"{stats['calls']} calls, {stats['timeouts']} timeouts, "
+            f"{stats['recycled']} recycled.\n"
+            f"Wait: p50 {stats['p50_wait']:.2f}s, max {stats['max_wait']:.2f}s"
+        )
 
     @super_context_menu(name="Translate")
     async def translate(
@@ -19,6 +19,7 @@ import gui
 import assetloader
 from assetloader import AssetLookup
 from bot import StatusEditMessage, TC_Cog_Mixin, TCBot, super_context_menu
+from database import DatabaseSingleton
 from database.database_ai import AuditProfile
 from utility import prioritized_string_split
 from utility.embed_paginator import pages_of_embeds
@@ -34,18 +35,28 @@ INVALID_SERVER_ERROR = (
 
 
 async def check_ai_rate(ctx):
-    serverrep, userrep = AuditProfile.get_or_new(ctx.guild, ctx.author)
-    serverrep.checktime()
-    userrep.checktime()
-    ok, reason = userrep.check_if_ok()
+    async with DatabaseSingleton.task_session() as session:
+        serverrep, userrep = await AuditProfile.get_or_new_a(
+            ctx.guild, ctx.author, session=session
+        )
+        serverrep.checktime()
+        userrep.checktime()
+        ok, reason = userrep.check_if_ok()
+        if ok:
+            if await AuditProfile.modify_status_a(userrep, session=session):
+                await AuditProfile.modify_status_a(
+                    serverrep, limited=False, session=session
+                )
+            else:
+                # Another call from this user got in first.
+                ok, reason = False, userrep.check_if_ok()[1]
+        await session.commit()
     if not ok:
         denyied = "Something went wrong, please try again later."
         if reason in ["messagelimit", "ban"]:
             denyied = "You have exceeded the daily rate limit."
         await ctx.send(content=denyied, ephemeral=True)
         return False
-    serverrep.modify_status()
-    userrep.modify_status()
     return True
 
 
@@ -216,14 +216,13 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
         if not (serverOwner(ctx) or serverAdmin(ctx)):
             return False
 
-        profile = ServerArchiveProfile.get_or_new(guildid)
+        profile = await ServerArchiveProfile.get_or_new_a(guildid)
         chanment = ctx.message.mentions
         if len(chanment) >= 1:
             for user in chanment:
                 gui.gprint(user.name)
-                profile.add_user_to_list(user.id)
+                await profile.add_user_a(user.id)
         self.guild_db_cache[str(ctx.guild.id)] = profile
-        self.bot.database.commit()
 
     @commands.hybrid_group(fallback="view")
     @app_commands.default_permissions(manage_messages=True, manage_channels=True)
@@ -267,8 +266,7 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
             await ctx.send("You do not have permission to use this command.")
             return False
 
-        profile = ServerArchiveProfile.get_or_new(guildid)
-        gui.gprint(profile)
+        profile = await ServerArchiveProfile.get_or_new_a(guildid)
         passok, statusmessage = check_channel(chanment)
         if not passok:
             await MessageTemplates.server_archive_message(ctx, statusmessage)
@@ -283,9 +281,8 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
                     ctx, "The Server Archive Channel has been set."
                 )
         newchan_id = chanment.id
-        profile.add_or_update(guildid, history_channel_id=newchan_id)
+        await profile.update_a(history_channel_id=newchan_id)
         self.guild_db_cache[str(ctx.guild.id)] = profile
-        bot.database.commit()
 
         await MessageTemplates.server_archive_message(
             ctx, "The Server Archive Channel has been set."
@@ -316,7 +313,7 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
             await MessageTemplates.server_archive_message(ctx, statusmessage)
             return
 
-        prof = ServerArchiveProfile.get(server_id=guild.id)
+        prof = await ServerArchiveProfile.get_a(server_id=guild.id)
         if not prof:
             await MessageTemplates.server_archive_message(
                 ctx, "...you've gotta set up the archive first..."
@@ -477,7 +474,7 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
             await MessageTemplates.server_archive_message(ctx, result)
             return
 
-        profile = ServerArchiveProfile.get_or_new(guildid)
+        profile = await ServerArchiveProfile.get_or_new_a(guildid)
 
         # Check if history channel already exists.
         if profile.history_channel_id:
@@ -509,9 +506,8 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
             name=channel_name, category=category, overwrites=overwrites
         )
 
-        profile.add_or_update(guildid, history_channel_id=new_channel.id)
+        await profile.update_a(history_channel_id=new_channel.id)
         self.guild_db_cache[str(ctx.guild.id)] = profile
-        bot.database.commit()
 
         await MessageTemplates.server_archive_message(
             ctx, "Created and set a new Archive channel for this server."
@@ -551,26 +547,25 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
             )
             return False
 
-        profile = ServerArchiveProfile.get_or_new(guildid)
+        profile = await ServerArchiveProfile.get_or_new_a(guildid)
 
         if mode == "add":
-            if profile.has_channel(cat.id):
+            if await profile.has_channel_a(cat.id):
                 await MessageTemplates.server_archive_message(
                     ctx, f"You are already ignoring category `{cat.name}`."
                 )
                 return
-            profile.add_channel(cat.id)
+            await profile.add_channel_a(cat.id)
             message = f"Added category `{cat.name}` to my ignore list.  All messages in its {len(cat.channels)} channels will be ignored while archiving."
         elif mode == "remove":
-            if not profile.has_channel(cat.id):
+            if not await profile.has_channel_a(cat.id):
                 await MessageTemplates.server_archive_message(
                     ctx, f"I'm not ignoring category `{cat.name}`."
                 )
                 return
-            profile.remove_channel(cat.id)
+            await profile.remove_channel_a(cat.id)
             message = f"Removed category `{cat.name}` from my ignore list.  All messages in its {len(cat.channels)} channels will no longer be ignored while archiving."
 
-        self.bot.database.commit()
         self.guild_db_cache[str(ctx.guild.id)] = profile
         await MessageTemplates.server_archive_message(ctx, message)
 
@@ -609,26 +604,24 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
                 ctx, "You do not have permission to use this command."
             )
             return False
-        profile = ServerArchiveProfile.get_or_new(guildid)
+        profile = await ServerArchiveProfile.get_or_new_a(guildid)
         if mode == "add":
-            if profile.has_channel(channel.id):
+            if await profile.has_channel_a(channel.id):
                 await MessageTemplates.server_archive_message(
                     ctx, f"You are already ignoring channel `{channel.name}`."
                 )
                 return
-            profile.add_channel(channel.id)
+            await profile.add_channel_a(channel.id)
 
-            self.bot.database.commit()
             self.guild_db_cache[str(ctx.guild.id)] = profile
             await MessageTemplates.server_archive_message(
                 ctx,
                 f"Added channel `{channel.name}` to my ignore list.",
             )
         if mode == "remove":
-            if profile.has_channel(channel.id):
-                profile.remove_channel(channel.id)
+            if await profile.has_channel_a(channel.id):
+                await profile.remove_channel_a(channel.id)
 
-                self.bot.database.commit()
                 self.guild_db_cache[str(ctx.guild.id)] = profile
                 await MessageTemplates.server_archive_message(
                     ctx,
@@ -685,21 +678,20 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
         guild = channel.guild
         guildid = guild.id
 
-        profile = ServerArchiveProfile.get_or_new(guildid)
+        profile = await ServerArchiveProfile.get_or_new_a(guildid)
         chanment = thismessage.channel_mentions
         if len(chanment) >= 1:
             for chan in chanment:
                 if mode == "add":
-                    profile.add_channel(chan.id)
+                    await profile.add_channel_a(chan.id)
                 elif mode == "remove":
-                    profile.remove_channel(chan.id)
+                    await profile.remove_channel_a(chan.id)
         else:
             await MessageTemplates.server_archive_message(
                 ctx, "You mentioned no channels."
             )
             return
 
-        self.bot.database.commit()
         self.guild_db_cache[str(ctx.guild.id)] = profile
         await MessageTemplates.server_archive_message(
             ctx,
@@ -723,16 +715,15 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
                 ctx, "You do not have permission to use this command."
             )
             return False
-        profile = ServerArchiveProfile.get_or_new(guildid)
-        channels = profile.list_channels()
+        profile = await ServerArchiveProfile.get_or_new_a(guildid)
+        channels = await profile.list_channels_a()
         removed = []
         for channel in channels:
             if guild.get_channel(channel) == None:
-                profile.remove_channel(channel)
+                await profile.remove_channel_a(channel)
                 removed.append(channel)
 
         self.guild_db_cache[str(ctx.guild.id)] = profile
-        self.bot.database.commit()
         await MessageTemplates.server_archive_message(
             ctx, f"Removed {len(removed)} deleted channels from my ignore list."
         )
@@ -761,7 +752,7 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
                     ctx, "Only the server owner may use this command."
                 )
                 return False
-            profile = ServerArchiveProfile.get_or_new(ctx.guild.id)
+            profile = await ServerArchiveProfile.get_or_new_a(ctx.guild.id)
             oldscope = profile.archive_scope
             if not oldscope:
                 oldscope = "ws"
@@ -785,7 +776,7 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
                     return
                 await mes.delete()
 
-            profile.update(archive_scope=scope)
+            await profile.update_a(archive_scope=scope)
             self.guild_db_cache[str(ctx.guild.id)] = profile
             await MessageTemplates.server_archive_message(
                 ctx, "Ok then, I've changed the archive scope.", ephemeral=True
@@ -818,7 +809,7 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
                 )
                 return False
 
-            profile = ServerArchiveProfile.get_or_new(ctx.guild.id)
+            profile = await ServerArchiveProfile.get_or_new_a(ctx.guild.id)
             old_mode = profile.ignore_mode if profile.ignore_mode is not None else 0
             gui.dprint(old_mode)
 
@@ -845,7 +836,7 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
                     return
                 await mes.delete()
 
-            profile.update(ignore_mode=mode)
+            await profile.update_a(ignore_mode=mode)
             self.guild_db_cache[str(ctx.guild.id)] = profile
             await MessageTemplates.server_archive_message(
                 ctx, "Ok then, I've changed the ignore mode.", ephemeral=True
@@ -862,7 +853,7 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
     )
     async def set_active(self, ctx, mode: bool = False):
         if ctx.guild:
-            profile = ServerArchiveProfile.get_or_new(ctx.guild.id)
+            profile = await ServerArchiveProfile.get_or_new_a(ctx.guild.id)
             oldscope = profile.archive_dynamic
             if oldscope == mode:
                 await ctx.send("This is the same as my current setting.")
@@ -880,7 +871,7 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
                     return
                 await mes.delete()
 
-            profile.update(archive_dynamic=mode)
+            await profile.update_a(archive_dynamic=mode)
             self.guild_db_cache[str(ctx.guild.id)] = profile
             if mode == True:
                 self.guild_cache[str(ctx.guild.id)] = 2
@@ -920,7 +911,7 @@ class ServerRPArchive(commands.Cog, TC_Cog_Mixin):
             bot = ctx.bot
             guild = ctx.guild
             task_name = "LAZYARCHIVE"
-            profile = ServerArchiveProfile.get_or_new(guild.id)
+            profile = await ServerArchiveProfile.get_or_new_a(guild.id)
             if profile.history_channel_id == 0:
                 await MessageTemplates.get_server_archive_embed(
                     ctx, "Set a history channel first."
@@ -16,7 +16,7 @@ from utility import (
 )
 from utility.embed_paginator import pages_of_embeds
 
-from database import Users_DoNotTrack
+from database import Users_DoNotTrack, query_profiler
 import gui
 
 """"""
@@ -264,6 +264,45 @@ class Setup(commands.Cog, TC_Cog_Mixin):
         await ctx.bot.all_guild_startup(True)
         await ctx.send("DONE.")
 
+    @commands.command()
+    @commands.is_owner()
+    async def query_profile(
+        self,
+        ctx,
+        action: Literal["dump", "on", "off", "reset"] = "dump",
+        sort: Literal["total_ms", "count", "p99_ms", "max_ms"] = "total_ms",
+        top: int = 25,
+    ):
+        """Dump the database query profile, or turn it on/off.  Owner only."""
+        if action == "on":
+            query_profiler.configure(enabled=True)
+            await ctx.send("Query profiling on.")
+        elif action == "off":
+            query_profiler.configure(enabled=False)
+            await ctx.send("Query profiling off.")
+        elif action == "reset":
+            query_profiler.reset()
+            await ctx.send("Query profile cleared.")
+        else:
+            file_object = io.StringIO(query_profiler.format_report(top, sort))
+            await ctx.send(file=discord.File(file_object, filename="query_profile.txt"))
+
+    @commands.command()
+    @commands.is_owner()
+    async def embed_cache_stats(self, ctx):
+        """Show the embedding cache hit/miss counts.  Owner only."""
+        from gptmod.embedding_cache import cache_stats
+
+        stats = cache_stats()
+        if not stats:
+            await ctx.send("No embedding caches are loaded.")
+            return
+        lines = [
+            f"{name}: {s['hits']} hits, {s['misses']} misses, {s['hit_rate']:.1%} hit rate"
+            for name, s in stats.items()
+        ]
+        await ctx.send("\n".join(lines))
+
     @commands.command()
     @commands.is_owner()
     async def purge_messages(
@@ -1,20 +1,24 @@
 import datetime
 from typing import Union
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from database import DatabaseSingleton
 from cogs.dat_Starboard import (
-    Starboard,
     StarboardEmojis,
     StarboardEntryTable,
     StarboardEntryGivers,
     StarboardIgnoreChannels,
 )
+from cogs.StarboardSub import (
+    KeyedLocks,
+    StarboardConfigCache,
+    StarboardEditScheduler,
+    StarredMessageCache,
+    StarrerWriteBatch,
+)
 from utility import (
     urltomessage,
 )
-import random
-import asyncio
 
 
 class StarboardCog(commands.Cog):
@@ -23,16 +27,21 @@ class StarboardCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.blacklist = ["im lost"]
-        self.to_be_edited = {}
-        self.lock = asyncio.Lock()
+        # One lock per starred message, instead of one for the whole bot.
+        self.locks = KeyedLocks()
         self.emojilist = ["\N{HONEYBEE}", "<:2diverHeart:1221738356950564926>"]
-        self.server_emoji_caches = {}
-        self.ignore_channels_cache = {}
+        self.config = StarboardConfigCache()
+        self.messages = StarredMessageCache(bot)
+        self.edits = StarboardEditScheduler(
+            self.edit_entry, on_error=lambda e: self.bot.send_error(e, "Task Error")
+        )
+        self.starrers = StarrerWriteBatch(self.stars_written)
 
-        self.timerloop.start()  # type: ignore
+        self.edits.start()
 
-    def cog_unload(self):
-        self.timerloop.cancel()  # type: ignore
+    async def cog_unload(self):
+        await self.starrers.flush()
+        self.edits.stop()
 
     async def reaction_action(
         self, fmt: str, payload: discord.RawReactionActionEvent
@@ -40,18 +49,22 @@ class StarboardCog(commands.Cog):
         """Preform a starboard related action for reaction."""
         try:
             self.bot.logs.info(str(payload.emoji))
-            if payload.guild_id not in self.server_emoji_caches:
-                self.server_emoji_caches[
-                    payload.guild_id
-                ] = await StarboardEmojis.get_emojis(payload.guild_id, 100)
-
-            if payload.guild_id not in self.ignore_channels_cache:
-                self.ignore_channels_cache[
-                    payload.guild_id
-                ] = await StarboardIgnoreChannels.get_channels(payload.guild_id, 100)
+            if payload.guild_id is None:
+                return
+            config = await self.config.get(payload.guild_id)
             # ensure emoji is in cache
-            if str(payload.emoji) not in self.server_emoji_caches[payload.guild_id]:
+            if str(payload.emoji) not in config.emojis:
+                return
+            starboard = config.starboard
+            if not starboard or starboard.channel_id == payload.channel_id:
                 return
+            # Skip bot reactions and bot messages before fetching anything.
+            if payload.member is not None and payload.member.bot:
+                return
+            if payload.message_author_id is not None:
+                author = self.bot.get_user(payload.message_author_id)
+                if author is not None and author.bot:
+                    return
 
             guild = self.bot.get_guild(payload.guild_id)  # type: ignore
             if guild is None:
@@ -60,20 +73,7 @@ class StarboardCog(commands.Cog):
             channel = guild.get_channel_or_thread(payload.channel_id)
             if not isinstance(channel, (discord.Thread, discord.TextChannel)):
                 return
-            if isinstance(channel, discord.Thread):
-                if (
-                    int(channel.parent_id)
-                    in self.ignore_channels_cache[payload.guild_id]
-                ):
-                    return
-
-            if int(payload.channel_id) in self.ignore_channels_cache[payload.guild_id]:
-                return
-            starboard = await Starboard.get_starboard(guild.id)
-            if starboard:
-                if starboard.channel_id == channel.id:
-                    return
-            else:
+            if config.ignores(channel):
                 return
             if (
                 discord.utils.utcnow()
@@ -82,67 +82,58 @@ class StarboardCog(commands.Cog):
                 self.bot.logs.info("Too big.")
                 return
 
-            async with self.lock:
-                message = await channel.fetch_message(payload.message_id)
+            message = await self.messages.get(channel, payload.message_id)
 
-                url = message.jump_url
-                starrer = payload.member or (await guild.fetch_member(payload.user_id))
-                if starrer is None or starrer.bot:
-                    return
+            url = message.jump_url
+            starrer = payload.member or (await guild.fetch_member(payload.user_id))
+            if starrer is None or starrer.bot:
+                return
+
+            if message.author.bot:
+                return
 
-                if message.author.bot:
+            if fmt == "star":
+                blacklist_words = self.blacklist
+                if any(word in message.content.lower() for word in blacklist_words):
+                    self.bot.logs.info("blacklist detected")
                     return
+                self.bot.logs.info(
+                    f"adding starrer message {message.id} {guild.id} {starrer.id}"
+                )
+                # Written with any other stars in the next batch, see stars_written.
+                self.starrers.add(message, starrer.id, str(payload.emoji))
+                return
 
-                if fmt == "star":
-                    blacklist_words = self.blacklist
-                    if any(word in message.content.lower() for word in blacklist_words):
-                        self.bot.logs.info("blacklist detected")
-                        return
-                    self.bot.logs.info(
-                        f"adding starrer message {message.id} {guild.id} {starrer.id}"
+            # A star still waiting in the batch has to land before it's removed.
+            await self.starrers.flush()
+            async with self.locks((guild.id, message.id)):
+                async with DatabaseSingleton.get_async_session() as session:
+                    entry = await StarboardEntryTable.get_entry(
+                        guild.id, message.id, session=session
                     )
-                    await StarboardEntryGivers.add_starrer(
-                        message.id,
-                        guild.id,
-                        starrer.id,
-                        str(payload.emoji),
-                        message.jump_url,
-                    )
-                    await StarboardEntryTable.add_or_update_entry(
-                        guild.id,
-                        message.id,
-                        message.channel.id,
-                        message.author.id,
-                        message_url=url,
+                    if not entry:
+                        return
+                    old_entry = await StarboardEntryGivers.get_starrer(
+                        guild.id, message.id, starrer.id
                     )
-                else:
-                    async with DatabaseSingleton.get_async_session() as session:
-                        entry = await StarboardEntryTable.get_entry(
-                            guild.id, message.id, session=session
-                        )
-                        if not entry:
-                            return
-                        old_entry = await StarboardEntryGivers.get_starrer(
-                            guild.id, message.id, starrer.id
-                        )
 
-                        self.bot.logs.info(
-                            f"unstarring message {message.id} {guild.id} {starrer.id}"
-                        )
-                        if old_entry:
-                            if old_entry.emoji == str(payload.emoji):
-                                self.bot.logs.info("Same emoji...")
-                                await session.delete(old_entry)
-                                await session.commit()
-                            else:
-                                self.bot.logs.info("Different emoji...")
-                    await StarboardEntryTable.add_or_update_entry(
-                        guild.id,
-                        message.id,
-                        message.channel.id,
-                        message.author.id,
-                        url,
+                    self.bot.logs.info(
+                        f"unstarring message {message.id} {guild.id} {starrer.id}"
                     )
+                    if old_entry:
+                        if old_entry.emoji == str(payload.emoji):
+                            self.bot.logs.info("Same emoji...")
+                            await session.delete(old_entry)
+                            await session.commit()
+                        else:
+                            self.bot.logs.info("Different emoji...")
+                await StarboardEntryTable.add_or_update_entry(
+                    guild.id,
+                    message.id,
+                    message.channel.id,
+                    message.author.id,
+                    url,
+                )
                 entry = await StarboardEntryTable.get_entry(guild.id, message.id)
                 await self.update_starboard_message(
                     guild, message, entry.bot_message_url
@@ -155,12 +146,20 @@ class StarboardCog(commands.Cog):
         if not isinstance(channel, discord.TextChannel):
             return
 
-        starboard = await Starboard.get_starboard(channel.guild.id)
-        if starboard.channel_id != channel.id:
+        starboard = await self.config.get_starboard(channel.guild.id)
+        if not starboard or starboard.channel_id != channel.id:
             return
 
         # The starboard channel got deleted, so let's clear it from the database.
-        await Starboard.remove_starboard(channel.guild.id)
+        await self.config.remove_starboard(channel.guild.id)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        self.messages.update(payload.message)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        self.messages.drop(payload.message_id)
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(
@@ -189,11 +188,11 @@ class StarboardCog(commands.Cog):
             return
 
         entry = await StarboardEntryTable.get_entry(guild.id, payload.message_id)
-        if entry.bot_message_url is None:
+        if not entry or entry.bot_message_url is None:
             return
 
-        starboard = await Starboard.get_starboard(channel.guild.id)
-        if starboard.channel_id is None:
+        starboard = await self.config.get_starboard(channel.guild.id)
+        if not starboard or starboard.channel_id is None:
             return
         urlv = entry.bot_message_url
 
@@ -202,62 +201,95 @@ class StarboardCog(commands.Cog):
         if msg is not None:
             await msg.delete()
 
-    async def edit_one_random(self):
-        """Edit one random key/value pair in the to be edited dictionary."""
-        (bot_message, message) = random.choice(list(self.to_be_edited.items()))
-        self.bot.logs.info(f"found url {bot_message} for {str(message)}")
-        self.to_be_edited.pop(bot_message)
-        mess = await urltomessage(bot_message, self.bot)
-        if mess:
-            self.bot.logs.info("Editing random Starboard Emoji")
-            entry = await StarboardEntryTable.get_with_url(bot_message)
-            starboard = await Starboard.get_starboard(mess.guild.id)
-            if entry and starboard:
-                if entry.total < starboard.threshold:
-                    self.bot.logs.info(
-                        f"...entry deleted bc {entry.total} is less than {starboard.threshold}"
+    async def stars_written(self, messages: list[discord.Message]):
+        """Update the starboard for every message in a batch of new stars."""
+        for message in messages:
+            try:
+                async with self.locks((message.guild.id, message.id)):
+                    entry = await StarboardEntryTable.get_entry(
+                        message.guild.id, message.id
                     )
+                    if entry:
+                        await self.update_starboard_message(
+                            message.guild, message, entry.bot_message_url
+                        )
+            except Exception as e:
+                await self.bot.send_error(e, "React", True)
+
+    async def edit_entry(self, bot_message: str, message: discord.Message):
+        """Bring the starboard message at bot_message up to date.  Called by
+        the edit scheduler."""
+        self.bot.logs.info(f"found url {bot_message} for {str(message)}")
+        async with self.locks((message.guild.id, message.id)):
+            mess = await urltomessage(bot_message, self.bot)
+            if mess:
+                self.bot.logs.info("Editing Starboard Emoji")
+                entry = await StarboardEntryTable.get_with_url(bot_message)
+                starboard = await self.config.get_starboard(mess.guild.id)
+                if entry and starboard:
+                    if entry.total < starboard.threshold:
+                        self.bot.logs.info(
+                            f"...entry deleted bc {entry.total} is less than {starboard.threshold}"
+                        )
+                        await StarboardEntryTable.delete_entry_by_bot_message_url(
+                            bot_message
+                        )
+                        await mess.delete()
+                    else:
+                        self.bot.logs.info("...entry edited")
+                        content, embed = await self.get_emoji_message(message, entry)
+                        await mess.edit(content=content, embed=embed)
+                else:
+                    self.bot.logs.info("...entry edited")
                     await StarboardEntryTable.delete_entry_by_bot_message_url(
                         bot_message
                     )
-                    await mess.delete()
-                else:
-                    self.bot.logs.info("...entry edited")
-                    content, embed = await self.get_emoji_message(message, entry)
-                    await mess.edit(content=content, embed=embed)
             else:
-                self.bot.logs.info("...entry edited")
-                await StarboardEntryTable.delete_entry_by_bot_message_url(bot_message)
-        else:
-            mess = await urltomessage(bot_message, self.bot, partial=True)
-            starboard = await Starboard.get_starboard(mess.guild.id)
-            starboard_channel = self.bot.get_channel(starboard.channel_id)
-            entry = await StarboardEntryTable.get_entry(message.guild.id, message.id)
-            if entry and starboard and starboard_channel:
-                if entry.total >= starboard.threshold:
-                    self.bot.logs.info("...Resending Message")
-                    content, embed = await self.get_emoji_message(message, entry)
-                    bm = await starboard_channel.send(content, embed=embed)
-                    entry = await StarboardEntryTable.add_or_update_bot_message(
-                        message.guild.id, message.id, bm.id, bm.jump_url
-                    )
+                mess = await urltomessage(bot_message, self.bot, partial=True)
+                starboard = await self.config.get_starboard(mess.guild.id)
+                starboard_channel = self.bot.get_channel(starboard.channel_id)
+                entry = await StarboardEntryTable.get_entry(
+                    message.guild.id, message.id
+                )
+                if entry and starboard and starboard_channel:
+                    if entry.total >= starboard.threshold:
+                        self.bot.logs.info("...Resending Message")
+                        content, embed = await self.get_emoji_message(message, entry)
+                        bm = await starboard_channel.send(content, embed=embed)
+                        entry = await StarboardEntryTable.add_or_update_bot_message(
+                            message.guild.id, message.id, bm.id, bm.jump_url
+                        )
+                    else:
+                        self.bot.logs.info("Purging Message due to lack of stars")
+                        await StarboardEntryTable.delete_entry_by_bot_message_url(
+                            bot_message
+                        )
                 else:
-                    self.bot.logs.info("Purging Message due to lack of stars")
+                    self.bot.logs.info("Purging Message due to lack of starboard")
                     await StarboardEntryTable.delete_entry_by_bot_message_url(
                         bot_message
                     )
-            else:
-                self.bot.logs.info("Purging Message due to lack of starboard")
-                await StarboardEntryTable.delete_entry_by_bot_message_url(bot_message)
 
-    @tasks.loop(seconds=15)
-    async def timerloop(self):
-        try:
-            async with self.lock:
-                if self.to_be_edited:
-                    await self.edit_one_random()
-        except Exception as e:
-            await self.bot.send_error(e, "Task Error")
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def starboard_stats(self, ctx):
+        """Show the starboard cache stats.  Owner only."""
+        c = self.config.stats()
+        m = self.messages.stats()
+        e = self.edits.stats()
+        w = self.starrers.stats()
+        await ctx.send(
+            f"{c['guilds']} cached configs, {c['hits']} hits, {c['loads']} loads, "
+            f"{c['invalidations']} invalidations.\n"
+            f"{m['entries']} cached messages, {m['hits']} hits, "
+            f"{m['client_hits']} from discord.py's cache, {m['fetches']} fetched.\n"
+            f"{len(self.locks)} messages locked.\n"
+            f"{e['pending']} edits pending, {e['running']} running, {e['edits']} made, "
+            f"{e['coalesced']} coalesced, {e['rate_limited']} rate limited, "
+            f"{e['failed']} failed, lag p50 {e['p50_lag']:.1f}s max {e['max_lag']:.1f}s.\n"
+            f"{w['waiting']} stars waiting, {w['written']} written in "
+            f"{w['batches']} batches, {w['failed']} failed batches."
+        )
 
     @commands.group(invoke_without_command=True)
     @commands.has_permissions(manage_guild=True)
@@ -268,12 +300,12 @@ class StarboardCog(commands.Cog):
     @starboard.command()
     async def add(self, ctx, channel: discord.TextChannel, threshold: int):
         """Add a starboard to the server."""
-        existing = await Starboard.get_starboard(ctx.guild.id)
+        existing = await self.config.get_starboard(ctx.guild.id)
         if existing:
             await ctx.send("Starboard already exists for this server.")
             return
 
-        await Starboard.add_starboard(ctx.guild.id, channel.id, threshold)
+        await self.config.add_starboard(ctx.guild.id, channel.id, threshold)
         await ctx.send(
             f"Starboard added to {channel.mention} with a threshold of {threshold} stars."
         )
@@ -281,7 +313,7 @@ class StarboardCog(commands.Cog):
     @starboard.command()
     async def remove(self, ctx):
         """Remove the starboard from the server."""
-        removed = await Starboard.remove_starboard(ctx.guild.id)
+        removed = await self.config.remove_starboard(ctx.guild.id)
         if removed:
             await ctx.send("Starboard removed.")
         else:
@@ -290,7 +322,7 @@ class StarboardCog(commands.Cog):
     @starboard.command()
     async def show(self, ctx):
         """Show the current starboard settings."""
-        existing = await Starboard.get_starboard(ctx.guild.id)
+        existing = await self.config.get_starboard(ctx.guild.id)
         if not existing:
             await ctx.send("No starboard found for this server.")
             return
@@ -303,7 +335,7 @@ class StarboardCog(commands.Cog):
     @starboard.command()
     async def set_threshold(self, ctx, threshold: int):
         """Set the star threshold for the starboard."""
-        updated = await Starboard.set_threshold(ctx.guild.id, threshold)
+        updated = await self.config.set_threshold(ctx.guild.id, threshold)
         if updated:
             await ctx.send(f"Starboard threshold set to {threshold} stars.")
         else:
@@ -314,23 +346,20 @@ class StarboardCog(commands.Cog):
         self, ctx, emoji: Union[str, discord.PartialEmoji, discord.Emoji]
     ):
         """Add an emoji to this server's starboard settings."""
-        existing = await Starboard.get_starboard(ctx.guild.id)
+        existing = await self.config.get_starboard(ctx.guild.id)
         if not existing:
             await ctx.send("No starboard found for this server.")
         get = await StarboardEmojis.get_emoji(ctx.guild.id, emoji)
         if get:
             await ctx.send(f"Valid emoji {emoji} is alrady in starboard config.")
-        updated = await StarboardEmojis.add_emoji(ctx.guild.id, emoji)
+        updated = await self.config.add_emoji(ctx.guild.id, emoji)
         if updated:
-            self.server_emoji_caches[ctx.guild.id] = await StarboardEmojis.get_emojis(
-                ctx.guild.id, 100
-            )
             await ctx.send(f"Valid emoji {emoji} added to starboard config.")
 
     @starboard.command()
     async def add_server_emoji(self, ctx: commands.Context):
         """Add an emoji to this server's starboard settings."""
-        existing = await Starboard.get_starboard(ctx.guild.id)
+        existing = await self.config.get_starboard(ctx.guild.id)
         upd = 0
         if not existing:
             await ctx.send("No starboard found for this server.")
@@ -341,14 +370,11 @@ class StarboardCog(commands.Cog):
                 await ctx.send(f"{emoji} emoji {str(get)}")
                 pass
             else:
-                updated = await StarboardEmojis.add_emoji(ctx.guild.id, str(emoji))
+                updated = await self.config.add_emoji(ctx.guild.id, str(emoji))
                 if updated:
                     upd += 1
 
         if upd:
-            self.server_emoji_caches[ctx.guild.id] = await StarboardEmojis.get_emojis(
-                ctx.guild.id, 100
-            )
             await ctx.send(f"{upd} emoji added to starboard config.")
         else:
             await ctx.send(f"{upd} emoji added to starboard config.")
@@ -356,7 +382,7 @@ class StarboardCog(commands.Cog):
     @starboard.command()
     async def display_emoji_message(self, ctx):
         """Display a message with all joined emoji."""
-        existing = await Starboard.get_starboard(ctx.guild.id)
+        existing = await self.config.get_starboard(ctx.guild.id)
         if not existing:
             await ctx.send("No starboard found for this server.")
         emoji_list = await StarboardEmojis.get_emojis(ctx.guild.id, 100)
@@ -371,14 +397,11 @@ class StarboardCog(commands.Cog):
         self, ctx, emoji: Union[str, discord.PartialEmoji, discord.Emoji]
     ):
         """Remove an emoji to this server's starboard settings."""
-        existing = await Starboard.get_starboard(ctx.guild.id)
+        existing = await self.config.get_starboard(ctx.guild.id)
         if not existing:
             await ctx.send("No starboard found for this server.")
-        updated = await StarboardEmojis.remove_emoji(ctx.guild.id, emoji)
+        updated = await self.config.remove_emoji(ctx.guild.id, emoji)
         if updated:
-            self.server_emoji_caches[ctx.guild.id] = await StarboardEmojis.get_emojis(
-                ctx.guild.id, 100
-            )
             await ctx.send(f"Valid emoji {emoji} removed from starboard config.")
         else:
             await ctx.send(f"Emoji {emoji} is not being tracked.")
@@ -396,16 +419,14 @@ class StarboardCog(commands.Cog):
         if existing:
             await ctx.send(f"{channel.mention} is already ignored.")
         else:
-            await StarboardIgnoreChannels.add_channel(ctx.guild.id, channel.id)
-            self.ignore_channels_cache.setdefault(ctx.guild.id, set()).add(channel.id)
+            await self.config.add_channel(ctx.guild.id, channel.id)
             await ctx.send(f"Added {channel.mention} to ignored channels.")
 
     @ignore_channel.command()
     async def removechannel(self, ctx, channel: discord.TextChannel):
         """Remove a channel from the ignored list."""
-        removed = await StarboardIgnoreChannels.remove_channel(ctx.guild.id, channel.id)
+        removed = await self.config.remove_channel(ctx.guild.id, channel.id)
         if removed:
-            self.ignore_channels_cache.get(ctx.guild.id, set()).discard(channel.id)
             await ctx.send(f"Removed {channel.mention} from ignored channels.")
         else:
             await ctx.send(f"{channel.mention} was not in the ignored list.")
@@ -425,10 +446,11 @@ class StarboardCog(commands.Cog):
     @starboard.command()
     async def migrate(self, ctx):
         """Set the star threshold for the starboard."""
-        existing = await Starboard.get_starboard(ctx.guild.id)
+        existing = await self.config.get_starboard(ctx.guild.id)
         if not existing:
             await ctx.send("Starboard does not exist for this server.")
             return
+        config = await self.config.get(ctx.guild.id)
         async with DatabaseSingleton.get_async_session() as session:
             all_entries = await StarboardEntryTable.get_entries_by_guild(
                 ctx.guild.id, session=session
@@ -441,7 +463,7 @@ class StarboardCog(commands.Cog):
                     await session.delete(e)
                     continue
                 for react in message.reactions:
-                    if str(react.emoji) in self.server_emoji_caches[ctx.guild.id]:
+                    if str(react.emoji) in config.emojis:
                         async for user in react.users():
                             starrers.append(
                                 (
@@ -467,7 +489,7 @@ class StarboardCog(commands.Cog):
     @starboard.command()
     async def dump_stars(self, ctx):
         """Dump a list of all stars to the chat."""
-        existing = await Starboard.get_starboard(ctx.guild.id)
+        existing = await self.config.get_starboard(ctx.guild.id)
         if not existing:
             await ctx.send("Starboard does not exist for this server.")
             return
@@ -494,7 +516,7 @@ class StarboardCog(commands.Cog):
     @starboard.command()
     async def audit_stars(self, ctx):
         """Dump a list of all stars to the chat."""
-        existing = await Starboard.get_starboard(ctx.guild.id)
+        existing = await self.config.get_starboard(ctx.guild.id)
         if not existing:
             await ctx.send("Starboard does not exist for this server.")
             return
@@ -530,7 +552,7 @@ class StarboardCog(commands.Cog):
             message (discord.Message): The original message to be added or checked on starboard.
             bot_message (str): The URL of the bot's starboard message.
         """
-        starboard = await Starboard.get_starboard(guild.id)
+        starboard = await self.config.get_starboard(guild.id)
         if not starboard:
             return
         self.bot.logs.info(bot_message, message)
@@ -544,7 +566,7 @@ class StarboardCog(commands.Cog):
                     guild.id, message.id, bm.id, bm.jump_url
                 )
         else:
-            self.to_be_edited[bot_message] = message
+            self.edits.schedule(bot_message, message)
 
     async def get_emoji_message(
         self, message: discord.Message, stars: StarboardEntryTable
@@ -0,0 +1,379 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import discord
+
+import gui
+from database import DatabaseSingleton
+from cogs.dat_Starboard import StarboardEntryGivers, StarboardEntryTable
+from utility.urltomessage import LinkError, urlto_gcm_ids
+
+"""
+Scheduling for starboard writes and edits.
+
+Starboard edits used to go into a dict that a 15 second loop drained one
+random entry at a time, so busy starboards fell minutes behind while quiet
+entries got edited for nothing.  StarboardEditScheduler replaces that loop:
+
+* Repeated reactions on one entry are coalesced into one edit, made once
+  the reactions settle for `settle` seconds, or `max_delay` seconds after
+  the first one at the latest.
+* Pending edits go oldest first.
+* Each starboard channel gets a ChannelBudget, a token bucket whose rate
+  drops when edits come back slow or rate limited and creeps back up while
+  they don't.
+
+StarrerWriteBatch does the same for the database side: stars that come in
+together are upserted with one add_starrers_bulk call, and each message's
+total is recounted once per batch instead of once per reaction.
+"""
+
+logs = logging.getLogger("TCLogger")
+
+# An edit that took longer than this probably waited on a rate limit.
+SLOW_EDIT = 1.5
+
+
+class ChannelBudget:
+    """Adaptive token bucket for edits in one starboard channel.
+
+    Args:
+        rate: Edits per second to start at.
+        burst: Most edits that can be made back to back.
+        min_rate: Slowest the bucket gets after backing off.
+        max_rate: Fastest the bucket gets after recovering.
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: float = 5.0,
+        min_rate: float = 0.1,
+        max_rate: float = 1.0,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.busy = False
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now: float) -> float:
+        """When the next edit can be made, in monotonic time."""
+        self._refill(now)
+        ready = now
+        if self.tokens < 1:
+            ready = now + (1 - self.tokens) / self.rate
+        return max(ready, self.blocked_until)
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def succeeded(self, elapsed: float):
+        if elapsed > SLOW_EDIT:
+            self.rate = max(self.min_rate, self.rate / 2)
+        else:
+            self.rate = min(self.max_rate, self.rate + 0.1)
+
+    def limited(self, retry_after: float = 5.0):
+        now = time.monotonic()
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+        self.updated = now
+        self.blocked_until = now + retry_after
+
+
+class PendingEdit:
+    __slots__ = ("bot_message", "message", "channel_id", "first", "last", "count")
+
+    def __init__(self, bot_message: str, message: discord.Message, channel_id: int):
+        self.bot_message = bot_message
+        self.message = message
+        self.channel_id = channel_id
+        self.first = self.last = time.monotonic()
+        self.count = 1
+
+
+class StarboardEditScheduler:
+    """Coalesces starboard edits and makes them within each channel's budget.
+
+    Args:
+        editor: Coroutine function called with (bot_message_url, message)
+            to make one edit.
+        settle: Seconds without new reactions before an entry is edited.
+        max_delay: Most seconds an entry waits after its first reaction.
+        concurrency: Most edits in flight at once, over every channel.
+        on_error: Coroutine function called with any error an edit raises,
+            other than a rate limit.
+    """
+
+    def __init__(
+        self,
+        editor: Callable[[str, discord.Message], Awaitable[Any]],
+        settle: float = 2.0,
+        max_delay: float = 10.0,
+        concurrency: int = 4,
+        on_error: Optional[Callable[[Exception], Awaitable[Any]]] = None,
+    ):
+        self.editor = editor
+        self.on_error = on_error
+        self.settle = settle
+        self.max_delay = max_delay
+        self.concurrency = concurrency
+        # Insertion order is age order, a requeue doesn't move an entry.
+        self.pending: OrderedDict[str, PendingEdit] = OrderedDict()
+        self.budgets: Dict[int, ChannelBudget] = {}
+        self.running = set()
+        self.wake: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+        self.queued = 0
+        self.coalesced = 0
+        self.edits = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self.lag: Deque[float] = deque(maxlen=200)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.wake = asyncio.Event()
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+        for task in list(self.running):
+            task.cancel()
+
+    def schedule(self, bot_message: str, message: discord.Message):
+        """Queue an edit of the starboard message at bot_message."""
+        self.queued += 1
+        edit = self.pending.get(bot_message)
+        if edit is not None:
+            edit.message = message
+            edit.last = time.monotonic()
+            edit.count += 1
+            self.coalesced += 1
+        else:
+            try:
+                channel_id = int(urlto_gcm_ids(bot_message)[1])
+            except (LinkError, ValueError):
+                channel_id = 0
+            self.pending[bot_message] = PendingEdit(bot_message, message, channel_id)
+        if self.wake is not None:
+            self.wake.set()
+
+    def budget(self, channel_id: int) -> ChannelBudget:
+        if channel_id not in self.budgets:
+            self.budgets[channel_id] = ChannelBudget()
+        return self.budgets[channel_id]
+
+    def next_edit(self, now: float) -> Tuple[Optional[PendingEdit], Optional[float]]:
+        """The oldest edit that can be made now, or how long until one can."""
+        if len(self.running) >= self.concurrency:
+            return None, None
+        soonest = None
+        for edit in self.pending.values():
+            budget = self.budget(edit.channel_id)
+            if budget.busy:
+                continue
+            due = min(edit.last + self.settle, edit.first + self.max_delay)
+            ready = max(due, budget.ready_at(now))
+            if ready <= now:
+                return edit, None
+            if soonest is None or ready < soonest:
+                soonest = ready
+        return None, None if soonest is None else soonest - now
+
+    async def run(self):
+        while True:
+            edit, wait = self.next_edit(time.monotonic())
+            if edit is None:
+                try:
+                    await asyncio.wait_for(self.wake.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                self.wake.clear()
+                continue
+            self.pending.pop(edit.bot_message)
+            budget = self.budget(edit.channel_id)
+            budget.take(time.monotonic())
+            budget.busy = True
+            task = asyncio.create_task(self.make_edit(edit, budget))
+            self.running.add(task)
+
+    async def make_edit(self, edit: PendingEdit, budget: ChannelBudget):
+        start = time.monotonic()
+        self.lag.append(start - edit.first)
+        try:
+            await self.editor(edit.bot_message, edit.message)
+            self.edits += 1
+            budget.succeeded(time.monotonic() - start)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                self.rate_limited += 1
+                budget.limited(float(getattr(e, "retry_after", 5.0) or 5.0))
+                # Try again once the channel's budget allows it.
+                if edit.bot_message not in self.pending:
+                    self.pending[edit.bot_message] = edit
+                    self.pending.move_to_end(edit.bot_message, last=False)
+            else:
+                await self.failed_edit(e)
+        except Exception as e:
+            await self.failed_edit(e)
+        finally:
+            budget.busy = False
+            self.running.discard(asyncio.current_task())
+            self.wake.set()
+
+    async def failed_edit(self, e: Exception):
+        self.failed += 1
+        logs.error("Starboard edit failed %s", e, exc_info=True)
+        gui.dprint(f"Starboard edit failed: {e}")
+        if self.on_error is not None:
+            try:
+                await self.on_error(e)
+            except Exception as err:
+                gui.dprint(f"Could not report starboard edit error: {err}")
+
+    def stats(self) -> Dict[str, Any]:
+        lag = sorted(self.lag)
+        return {
+            "pending": len(self.pending),
+            "running": len(self.running),
+            "queued": self.queued,
+            "coalesced": self.coalesced,
+            "edits": self.edits,
+            "rate_limited": self.rate_limited,
+            "failed": self.failed,
+            "channels": len(self.budgets),
+            "p50_lag": lag[len(lag) // 2] if lag else 0.0,
+            "max_lag": lag[-1] if lag else 0.0,
+        }
+
+
+class StarrerWriteBatch:
+    """Buffers new stars and writes them together.
+
+    Args:
+        on_written: Coroutine function called with every message whose total
+            was updated in a batch.
+        window: Seconds to collect stars before writing them.
+        max_rows: Write right away once this many stars are waiting.
+    """
+
+    def __init__(
+        self,
+        on_written: Callable[[List[discord.Message]], Awaitable[Any]],
+        window: float = 0.5,
+        max_rows: int = 200,
+    ):
+        self.on_written = on_written
+        self.window = window
+        self.max_rows = max_rows
+        self.rows: Dict[Tuple[int, int, int], Tuple[int, int, int, str, str]] = {}
+        self.messages: Dict[Tuple[int, int], discord.Message] = {}
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.lock: Optional[asyncio.Lock] = None
+        self.background = set()
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _spawn_flush(self):
+        task = asyncio.create_task(self._flush_logged())
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+
+    async def _flush_logged(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            self.failed += 1
+            logs.error("Starboard star write failed %s", e, exc_info=True)
+            gui.dprint(f"Starboard star write failed: {e}")
+
+    def add(
+        self,
+        message: discord.Message,
+        star_giver_id: int,
+        emoji: str,
+    ):
+        """Queue a star from star_giver_id on message."""
+        guild_id = message.guild.id
+        self.rows[(message.id, guild_id, star_giver_id)] = (
+            message.id,
+            guild_id,
+            star_giver_id,
+            emoji,
+            message.jump_url,
+        )
+        self.messages[(guild_id, message.id)] = message
+        if len(self.rows) >= self.max_rows:
+            self._spawn_flush()
+        elif self.timer is None:
+            loop = asyncio.get_running_loop()
+            self.timer = loop.call_later(self.window, self._spawn_flush)
+
+    async def flush(self):
+        """Write every buffered star now."""
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.rows:
+                return
+            pending_rows, self.rows = self.rows, {}
+            pending_messages, self.messages = self.messages, {}
+            rows = list(pending_rows.values())
+            messages = list(pending_messages.values())
+            try:
+                async with DatabaseSingleton.get_async_session() as session:
+                    await StarboardEntryGivers.add_starrers_bulk(rows, session=session)
+                    for message in messages:
+                        await StarboardEntryTable.add_or_update_entry(
+                            message.guild.id,
+                            message.id,
+                            message.channel.id,
+                            message.author.id,
+                            message_url=message.jump_url,
+                            do_commit=False,
+                            session=session,
+                        )
+                    await session.commit()
+            except BaseException:
+                # Put them back for the next batch, stars added meanwhile win.
+                self.rows = {**pending_rows, **self.rows}
+                self.messages = {**pending_messages, **self.messages}
+                if self.timer is None:
+                    loop = asyncio.get_running_loop()
+                    self.timer = loop.call_later(self.window, self._spawn_flush)
+                raise
+            self.batches += 1
+            self.written += len(rows)
+        await self.on_written(messages)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "waiting": len(self.rows),
+            "batches": self.batches,
+            "written": self.written,
+            "failed": self.failed,
+        }
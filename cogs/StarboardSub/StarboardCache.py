@@ -0,0 +1,268 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Union
+
+import discord
+
+from cogs.dat_Starboard import Starboard, StarboardEmojis, StarboardIgnoreChannels
+
+"""
+Caches for StarboardCog.
+
+Every reaction used to wait on one cog wide lock, then look up the guild's
+starboard, emojis, and ignored channels and fetch the reacted message, before
+it could even tell if the reaction mattered.  Now:
+
+* StarboardConfigCache keeps each guild's starboard settings in memory.  The
+  config commands write through it, so it never has to expire.
+* StarredMessageCache keeps recently starred messages, so a message that's
+  getting a lot of reactions is only fetched once.
+* KeyedLocks gives each starred message its own lock, so a busy message
+  doesn't hold up every other guild's starboard.
+"""
+
+# Same as the old emoji cache.
+EMOJI_LIMIT = 100
+IGNORE_LIMIT = 100
+
+
+class GuildStarboardConfig:
+    """The starboard, emojis, and ignored channels of one guild."""
+
+    __slots__ = ("starboard", "emojis", "ignored")
+
+    def __init__(
+        self, starboard: Optional[Starboard], emojis: Set[str], ignored: Set[int]
+    ):
+        self.starboard = starboard
+        self.emojis = emojis
+        self.ignored = ignored
+
+    def ignores(self, channel: Union[discord.TextChannel, discord.Thread]) -> bool:
+        if channel.id in self.ignored:
+            return True
+        if isinstance(channel, discord.Thread):
+            return int(channel.parent_id) in self.ignored
+        return False
+
+
+class StarboardConfigCache:
+    """Write through cache of Starboard, StarboardEmojis, and StarboardIgnoreChannels.
+
+    Use the methods here instead of the table classmethods when changing a
+    guild's settings, or call invalidate after."""
+
+    def __init__(self):
+        self.guilds: Dict[int, GuildStarboardConfig] = {}
+        # Bumped on every change, so a load that raced a change isn't kept.
+        self.generation: Dict[int, int] = {}
+        self.hits = 0
+        self.loads = 0
+        self.invalidations = 0
+
+    async def get(self, guild_id: int) -> GuildStarboardConfig:
+        config = self.guilds.get(guild_id)
+        if config is not None:
+            self.hits += 1
+            return config
+        self.loads += 1
+        generation = self.generation.get(guild_id, 0)
+        starboard = await Starboard.get_starboard(guild_id)
+        emojis = await StarboardEmojis.get_emojis(guild_id, EMOJI_LIMIT)
+        ignored = await StarboardIgnoreChannels.get_channels(guild_id, IGNORE_LIMIT)
+        config = GuildStarboardConfig(
+            starboard, set(emojis), {int(c.channel_id) for c in ignored}
+        )
+        if self.generation.get(guild_id, 0) == generation:
+            self.guilds[guild_id] = config
+        return config
+
+    async def get_starboard(self, guild_id: int) -> Optional[Starboard]:
+        return (await self.get(guild_id)).starboard
+
+    def invalidate(self, guild_id: Optional[int] = None):
+        """Forget one guild's settings, or every guild's."""
+        self.invalidations += 1
+        if guild_id is None:
+            for gid in self.guilds:
+                self.generation[gid] = self.generation.get(gid, 0) + 1
+            self.guilds.clear()
+            return
+        self.generation[guild_id] = self.generation.get(guild_id, 0) + 1
+        self.guilds.pop(guild_id, None)
+
+    def _cached(self, guild_id: int) -> Optional[GuildStarboardConfig]:
+        self.generation[guild_id] = self.generation.get(guild_id, 0) + 1
+        return self.guilds.get(guild_id)
+
+    async def add_starboard(self, guild_id: int, channel_id: int, threshold: int):
+        starboard = await Starboard.add_starboard(guild_id, channel_id, threshold)
+        config = self._cached(guild_id)
+        if config is not None:
+            config.starboard = starboard
+        return starboard
+
+    async def remove_starboard(self, guild_id: int) -> bool:
+        removed = await Starboard.remove_starboard(guild_id)
+        config = self._cached(guild_id)
+        if config is not None:
+            config.starboard = None
+        return removed
+
+    async def set_threshold(self, guild_id: int, threshold: int):
+        starboard = await Starboard.set_threshold(guild_id, threshold)
+        config = self._cached(guild_id)
+        if config is not None and starboard is not None:
+            config.starboard = starboard
+        return starboard
+
+    async def add_emoji(self, guild_id: int, emoji: str):
+        added = await StarboardEmojis.add_emoji(guild_id, emoji)
+        config = self._cached(guild_id)
+        if config is not None and added:
+            config.emojis.add(str(emoji))
+        return added
+
+    async def remove_emoji(self, guild_id: int, emoji: str) -> bool:
+        removed = await StarboardEmojis.remove_emoji(guild_id, emoji)
+        config = self._cached(guild_id)
+        if config is not None and removed:
+            config.emojis.discard(str(emoji))
+        return removed
+
+    async def add_channel(self, guild_id: int, channel_id: int):
+        added = await StarboardIgnoreChannels.add_channel(guild_id, channel_id)
+        config = self._cached(guild_id)
+        if config is not None and added:
+            config.ignored.add(int(channel_id))
+        return added
+
+    async def remove_channel(self, guild_id: int, channel_id: int) -> bool:
+        removed = await StarboardIgnoreChannels.remove_channel(guild_id, channel_id)
+        config = self._cached(guild_id)
+        if config is not None and removed:
+            config.ignored.discard(int(channel_id))
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "guilds": len(self.guilds),
+            "hits": self.hits,
+            "loads": self.loads,
+            "invalidations": self.invalidations,
+        }
+
+
+class StarredMessageCache:
+    """Messages that were recently reacted to, by id.
+
+    Kept up to date by the cog's raw edit and delete listeners; anything
+    older than ttl seconds is fetched again anyway.
+
+    Args:
+        bot: Used to check discord.py's own message cache first.
+        max_entries: How many messages to keep.
+        ttl: Seconds a message is trusted for.
+    """
+
+    def __init__(self, bot, max_entries: int = 512, ttl: float = 900.0):
+        self.bot = bot
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.messages: OrderedDict[int, tuple] = OrderedDict()
+        self.hits = 0
+        self.client_hits = 0
+        self.fetches = 0
+
+    def put(self, message: discord.Message):
+        self.messages[message.id] = (message, time.monotonic())
+        self.messages.move_to_end(message.id)
+        while len(self.messages) > self.max_entries:
+            self.messages.popitem(last=False)
+
+    def drop(self, message_id: int):
+        self.messages.pop(message_id, None)
+
+    def update(self, message: discord.Message):
+        """Replace a message, if it's cached."""
+        if message.id in self.messages:
+            self.put(message)
+
+    def peek(self, message_id: int) -> Optional[discord.Message]:
+        entry = self.messages.get(message_id)
+        if entry is None:
+            return None
+        message, stored = entry
+        if time.monotonic() - stored > self.ttl:
+            self.messages.pop(message_id)
+            return None
+        self.messages.move_to_end(message_id)
+        return message
+
+    async def get(
+        self, channel: Union[discord.TextChannel, discord.Thread], message_id: int
+    ) -> discord.Message:
+        """Get a message from the cache, discord.py's cache, or the api."""
+        message = self.peek(message_id)
+        if message is not None:
+            self.hits += 1
+            return message
+        message = self.bot._connection._get_message(message_id)
+        if message is not None:
+            self.client_hits += 1
+        else:
+            self.fetches += 1
+            message = await channel.fetch_message(message_id)
+        self.put(message)
+        return message
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.messages),
+            "hits": self.hits,
+            "client_hits": self.client_hits,
+            "fetches": self.fetches,
+        }
+
+
+class KeyedLocks:
+    """One asyncio.Lock per key, dropped once nobody's using it."""
+
+    def __init__(self):
+        self.locks: Dict[Hashable, asyncio.Lock] = {}
+        self.users: Dict[Hashable, int] = {}
+
+    def __call__(self, key: Hashable) -> "_KeyedLock":
+        return _KeyedLock(self, key)
+
+    def __len__(self):
+        return len(self.locks)
+
+
+class _KeyedLock:
+    def __init__(self, owner: KeyedLocks, key: Hashable):
+        self.owner = owner
+        self.key = key
+
+    async def __aenter__(self):
+        owner, key = self.owner, self.key
+        lock = owner.locks.setdefault(key, asyncio.Lock())
+        owner.users[key] = owner.users.get(key, 0) + 1
+        try:
+            await lock.acquire()
+        except BaseException:
+            self._release_user()
+            raise
+        return lock
+
+    async def __aexit__(self, *exc):
+        self.owner.locks[self.key].release()
+        self._release_user()
+
+    def _release_user(self):
+        owner, key = self.owner, self.key
+        owner.users[key] -= 1
+        if owner.users[key] == 0:
+            del owner.users[key]
+            del owner.locks[key]
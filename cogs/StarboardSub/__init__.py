@@ -0,0 +1,7 @@
+from .StarboardCache import (
+    GuildStarboardConfig,
+    KeyedLocks,
+    StarboardConfigCache,
+    StarredMessageCache,
+)
+from .EditScheduler import ChannelBudget, StarboardEditScheduler, StarrerWriteBatch
@@ -3,6 +3,8 @@ expressions with it's own calculation code."""
 
 from .c_util import *
 from .calc import evaluate_expression, OutContainer
+from .dice_engine import CalcError, compile_expression, evaluate_compiled
+from .calc_worker import CalcTimeout, CalcWorkerPool
 
 
 async def setup(bot):
@@ -0,0 +1,236 @@
+import asyncio
+import math
+import multiprocessing
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import gui
+from .dice_engine import MAX_EXPRESSION, CalcError, evaluate_compiled
+
+try:
+    import resource
+except ImportError:
+    # Not on windows, there's only the wall clock timeout there.
+    resource = None
+
+"""
+Worker processes for the calculator.
+
+calc used to run on the event loop, so a big enough roll froze the whole
+bot.  CalcWorkerPool runs evaluate_compiled in a few worker processes
+instead, handed out one expression at a time like the sandbox page pool.
+
+Each expression gets a cpu time limit, through RLIMIT_CPU where the
+platform has it, which raises CalcTimeout in the worker.  If a worker stops
+answering anyway, it's killed after `timeout` seconds and replaced.
+"""
+
+
+class CalcTimeout(CalcError):
+    """An expression went over its cpu time."""
+
+
+def _cpu_exceeded(signum, frame):
+    raise CalcTimeout("That took too long to calculate.")
+
+
+def _init_worker():
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _cpu_exceeded)
+
+
+def _set_cpu_limit(seconds: Optional[float]):
+    """Let this process use `seconds` more cpu time, or any with None."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    limit = hard
+    if seconds is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        limit = math.ceil(usage.ru_utime + usage.ru_stime + seconds)
+        if hard != resource.RLIM_INFINITY:
+            limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+
+def _evaluate_limited(
+    expr: str, args: Tuple, verb: int, cpu_seconds: float
+) -> Tuple[List[Tuple[int, str]], str]:
+    """Runs in a worker process."""
+    if resource is not None:
+        _set_cpu_limit(cpu_seconds)
+    try:
+        return evaluate_compiled(expr, args, verb)
+    except (RecursionError, MemoryError):
+        raise CalcError("That expression is too big to calculate.")
+    finally:
+        if resource is not None:
+            _set_cpu_limit(None)
+
+
+def _warm():
+    """Gets a new worker's imports out of the way."""
+    return True
+
+
+class CalcWorker:
+    """One worker process."""
+
+    def __init__(self, wid: int, context):
+        self.wid = wid
+        self.executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=context, initializer=_init_worker
+        )
+        self.uses = 0
+        self.broken = False
+        self.executor.submit(_warm)
+
+    def evaluate(self, *args) -> asyncio.Future:
+        return asyncio.wrap_future(self.executor.submit(_evaluate_limited, *args))
+
+    def stop(self):
+        terminate = getattr(self.executor, "terminate_workers", None)
+        if terminate is not None:
+            terminate()
+        else:
+            processes = getattr(self.executor, "_processes", None) or {}
+            for process in list(processes.values()):
+                process.kill()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class CalcWorkerPool:
+    """Hands out CalcWorkers, one expression at a time per worker.
+
+    Args:
+        size: How many worker processes to keep.
+        cpu_seconds: Cpu time one expression may take.
+        timeout: Seconds to wait on a worker before killing it.
+        max_uses: Replace a worker after this many expressions.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        cpu_seconds: float = 2.0,
+        timeout: float = 5.0,
+        max_uses: int = 1000,
+    ):
+        self.size = size
+        self.cpu_seconds = cpu_seconds
+        self.timeout = timeout
+        self.max_uses = max_uses
+        # Spawn, forking the bot's process with its threads isn't safe.
+        self.context = multiprocessing.get_context("spawn")
+        self.idle: Optional[asyncio.Queue] = None
+        self.workers: List[CalcWorker] = []
+        self.next_id = 0
+        self.waiting = 0
+        self.busy = 0
+        self.uses = 0
+        self.errors = 0
+        self.cpu_limited = 0
+        self.killed = 0
+        self.recycled = 0
+        self.waits: Deque[float] = deque(maxlen=200)
+        self.closed = False
+
+    def _new_worker(self) -> CalcWorker:
+        worker = CalcWorker(self.next_id, self.context)
+        self.next_id += 1
+        self.workers.append(worker)
+        return worker
+
+    def start(self):
+        """Start every worker.  Safe to call more than once."""
+        if self.idle is not None:
+            return
+        self.idle = asyncio.Queue()
+        for _ in range(self.size):
+            self.idle.put_nowait(self._new_worker())
+        gui.gprint(f"Started {self.size} calculator workers.")
+
+    def _recycle(self, worker: CalcWorker, reason: str):
+        gui.dprint(f"Recycling calculator worker {worker.wid} ({reason}).")
+        worker.stop()
+        if worker in self.workers:
+            self.workers.remove(worker)
+        self.recycled += 1
+        if not self.closed:
+            self.idle.put_nowait(self._new_worker())
+
+    def _release(self, worker: CalcWorker):
+        if self.closed:
+            worker.stop()
+        elif worker.broken:
+            self._recycle(worker, "stopped answering")
+        elif worker.uses >= self.max_uses:
+            self._recycle(worker, f"{worker.uses} uses")
+        else:
+            self.idle.put_nowait(worker)
+
+    async def evaluate(
+        self, expr: str, args: Tuple = (), verb: int = 2
+    ) -> Tuple[List[Tuple[int, str]], str]:
+        """evaluate_compiled(expr, args, verb) in a worker process.  Raises
+        CalcError for anything wrong with the expression, or if it took
+        too long."""
+        if self.closed:
+            raise RuntimeError("The calculator workers are closed.")
+        if len(expr) > MAX_EXPRESSION:
+            raise CalcError(
+                f"Expressions can't be longer than {MAX_EXPRESSION} characters."
+            )
+        self.start()
+        self.waiting += 1
+        queued_at = time.monotonic()
+        try:
+            worker: CalcWorker = await self.idle.get()
+        finally:
+            self.waiting -= 1
+        self.waits.append(time.monotonic() - queued_at)
+        self.busy += 1
+        self.uses += 1
+        worker.uses += 1
+        try:
+            return await asyncio.wait_for(
+                worker.evaluate(expr, tuple(args), verb, self.cpu_seconds),
+                self.timeout,
+            )
+        except CalcTimeout:
+            self.cpu_limited += 1
+            raise
+        except CalcError:
+            self.errors += 1
+            raise
+        except (asyncio.TimeoutError, BrokenProcessPool):
+            self.killed += 1
+            worker.broken = True
+            raise CalcTimeout("That took too long to calculate.")
+        finally:
+            self.busy -= 1
+            self._release(worker)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self.waits)
+        return {
+            "workers": len(self.workers),
+            "busy": self.busy,
+            "queue_depth": self.waiting,
+            "uses": self.uses,
+            "errors": self.errors,
+            "cpu_limited": self.cpu_limited,
+            "killed": self.killed,
+            "recycled": self.recycled,
+            "p50_wait": waits[len(waits) // 2] if waits else 0.0,
+            "max_wait": waits[-1] if waits else 0.0,
+        }
+
+    def close(self):
+        self.closed = True
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+        self.idle = None
@@ -0,0 +1,702 @@
+import math
+import re
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from .calc import expressDictionary
+
+"""
+The compiled dice evaluator.
+
+parse_and_calculate_string went over the expression once per operator class,
+rebuilding a list of DataBits every pass, and dice_roll_op rolled each die
+with randint in a python loop.  Here an expression is parsed once, with
+precedence climbing, into a tree of nodes that evaluate themselves, and the
+dice are rolled with numpy.  Exploding, compounding, and rerolling dice roll
+every die that needs another roll at once, a round at a time.
+
+Everything a user can ask for is capped: the expression's length and
+nesting, the dice rolled (explosions and rerolls count), the length of a
+sequence, and the size of the step log.  CalcWorkerPool adds a cpu time
+limit on top of that.
+
+Operators, tightest first:
+    d, then keep/drop and factorial, then sum/avg, then ^, then unary -,
+    then * and /, then :+, then + and -, then the comparisons.
+"""
+
+MAX_EXPRESSION = 2000
+MAX_DEPTH = 100
+# Dice rolled by one expression, explosions and rerolls included.
+MAX_DICE = 10000
+MAX_SIDES = 10**9
+MAX_ITEMS = 10000
+MAX_FACTORIAL = 170
+# Characters of step log and result sent back.
+MAX_LOG = 4000
+MAX_RESULT = 1000
+# Items of a sequence written out in the step log.
+LOG_ITEMS = 50
+
+rng = np.random.default_rng()
+
+
+class CalcError(Exception):
+    """Something wrong with an expression.  The message is shown to the user."""
+
+
+TOKEN_PATTERN = re.compile(
+    r"\s*(?:(\d+\.?\d*|\.\d+)|(reroll|keep|drop|sum|avg|!!|\*\*|:\+|>=|<=|==|"
+    r"[-+*/^!<>()\[\],d]))",
+    re.IGNORECASE,
+)
+WORD_SYMBOLS = {"**": "^"}
+
+# Binary operators: precedence, and if they group to the right.
+BINARY = {
+    ">": (1, False),
+    "<": (1, False),
+    ">=": (1, False),
+    "<=": (1, False),
+    "==": (1, False),
+    "+": (2, False),
+    "-": (2, False),
+    ":+": (3, False),
+    "*": (4, False),
+    "/": (4, False),
+    "^": (6, True),
+}
+UNARY_MINUS = 5
+COMPARISONS = (">", "<", ">=", "<=", "==")
+DICE_MODES = {"!": "explode", "!!": "compound", "reroll": "reroll"}
+SYMBOLS = {"*": "✱", "<=": "≤", ">=": "≥", "==": "="}
+# 5>[...] counts the items under 5, like [...]<5.
+FLIPPED = {">": "<", "<": ">", ">=": "<=", "<=": ">="}
+
+
+def tokenize(expression: str) -> List[Tuple[str, str, int]]:
+    """Split expression into (kind, text, position) tokens, adding the *
+    the old parser implied between 2(...), (...)(...), and (...)2."""
+    tokens = []
+    pos = 0
+    expression = expression.rstrip()
+    while pos < len(expression):
+        match = TOKEN_PATTERN.match(expression, pos)
+        if match is None:
+            bad = expression[pos:].lstrip()[:1]
+            raise CalcError(f"I don't know what {bad!r} means.")
+        if match.group(1) is not None:
+            kind, text = "num", match.group(1)
+        else:
+            kind, text = "op", match.group(2).lower()
+            text = WORD_SYMBOLS.get(text, text)
+        start = match.start(1) if kind == "num" else match.start(2)
+        if tokens:
+            last_kind, last = tokens[-1][0], tokens[-1][1]
+            closed = last_kind == "op" and last in (")", "]")
+            if (last_kind == "num" or closed) and text in ("(", "["):
+                tokens.append(("op", "*", start))
+            elif closed and kind == "num":
+                tokens.append(("op", "*", start))
+        tokens.append((kind, text, start))
+        pos = match.end()
+    return tokens
+
+
+class Value:
+    """A number, a sequence (a float64 array), or a boolean."""
+
+    __slots__ = ("kind", "data", "dice")
+
+    def __init__(self, kind: str, data, dice: bool = False):
+        self.kind = kind
+        self.data = data
+        self.dice = dice
+
+    @classmethod
+    def number(cls, x: float, dice: bool = False) -> "Value":
+        if not math.isfinite(x):
+            raise CalcError("That number is too big.")
+        return cls("number", float(x), dice)
+
+    @classmethod
+    def sequence(cls, data, dice: bool = False) -> "Value":
+        data = np.asarray(data, dtype=np.float64)
+        if data.size > MAX_ITEMS:
+            raise CalcError(f"Sequences can't be longer than {MAX_ITEMS}.")
+        if not np.isfinite(data).all():
+            raise CalcError("That's too big, or not a real number.")
+        return cls("sequence", data, dice)
+
+    @classmethod
+    def boolean(cls, b: bool) -> "Value":
+        return cls("boolean", 1.0 if b else 0.0)
+
+    @property
+    def is_seq(self) -> bool:
+        return self.kind == "sequence"
+
+    def items(self) -> np.ndarray:
+        if self.is_seq:
+            return self.data
+        return np.array([self.data])
+
+    def as_number(self, what: str) -> float:
+        if self.is_seq:
+            raise CalcError(f"{what} has to be a number, not a sequence.")
+        return self.data
+
+    def as_whole(self, what: str) -> int:
+        x = self.as_number(what)
+        if x % 1:
+            raise CalcError(f"{what} has to be a whole number.")
+        return int(x)
+
+    def format(self, dice: bool = True, limit: Optional[int] = LOG_ITEMS) -> str:
+        mark = "🎲" if dice and self.dice else ""
+        if self.kind == "boolean":
+            return str(bool(self.data))
+        if not self.is_seq:
+            return mark + format_number(self.data)
+        shown = self.data if limit is None else self.data[:limit]
+        out = ", ".join(mark + format_number(x) for x in shown.tolist())
+        if len(shown) < len(self.data):
+            out += f", ... ({len(self.data) - len(shown)} more)"
+        return f"[{out}]"
+
+    def __str__(self):
+        return self.format()
+
+
+def format_number(x: float) -> str:
+    if x % 1 == 0:
+        return str(int(x))
+    return str(x)
+
+
+class EvalContext:
+    """Dice budget and step log for one evaluation."""
+
+    def __init__(self, verb: int):
+        self.verb = verb
+        self.dice = 0
+        self.lines: List[Tuple[int, str]] = []
+        self.size = 0
+        self.full = False
+
+    def wants(self, verb: int) -> bool:
+        return verb <= self.verb and not self.full
+
+    def log(self, text: str, verb: int):
+        if not self.wants(verb):
+            return
+        if self.size + len(text) > MAX_LOG:
+            self.full = True
+            self.lines.append((0, "...and more steps that didn't fit."))
+            return
+        self.lines.append((verb, text))
+        self.size += len(text) + 1
+
+    def take_dice(self, count: int):
+        self.dice += count
+        if self.dice > MAX_DICE:
+            raise CalcError(f"That's more than {MAX_DICE} dice.")
+
+
+class Node:
+    __slots__ = ()
+
+    def run(self, ctx: EvalContext) -> Value:
+        raise NotImplementedError
+
+
+class Number(Node):
+    __slots__ = ("value",)
+
+    def __init__(self, value: float):
+        self.value = value
+
+    def run(self, ctx):
+        return Value.number(self.value)
+
+
+class SequenceLiteral(Node):
+    """[a, b, c].  Sequences inside are flattened into it."""
+
+    __slots__ = ("items",)
+
+    def __init__(self, items: List[Node]):
+        self.items = items
+
+    def run(self, ctx):
+        values = [item.run(ctx) for item in self.items]
+        if not values:
+            return Value.sequence([])
+        return Value.sequence(np.concatenate([v.items() for v in values]))
+
+
+def comparison(op: str, target: float) -> Callable[[np.ndarray], np.ndarray]:
+    if op == ">":
+        return lambda rolls: rolls > target
+    if op == "<":
+        return lambda rolls: rolls < target
+    if op == ">=":
+        return lambda rolls: rolls >= target
+    if op == "<=":
+        return lambda rolls: rolls <= target
+    return lambda rolls: rolls == target
+
+
+class Dice(Node):
+    """[amount]d[sides], optionally followed by !, !!, or reroll, and a comparator."""
+
+    __slots__ = ("amount", "sides", "mode", "compare", "target")
+
+    def __init__(
+        self,
+        amount: Optional[Node],
+        sides: Node,
+        mode: Optional[str] = None,
+        compare: Optional[str] = None,
+        target: Optional[Node] = None,
+    ):
+        self.amount = amount
+        self.sides = sides
+        self.mode = mode
+        self.compare = compare
+        self.target = target
+
+    def run(self, ctx):
+        amount = 1
+        if self.amount is not None:
+            amount = self.amount.run(ctx).as_whole("The number of dice")
+        sides = self.sides.run(ctx).as_whole("The number of sides")
+        if amount < 0:
+            raise CalcError("You can't roll a negative number of dice!")
+        if sides <= 0:
+            raise CalcError(f"...You can't roll a {sides} sided dice!")
+        if sides > MAX_SIDES:
+            raise CalcError(f"Dice can't have more than {MAX_SIDES} sides.")
+        ctx.take_dice(amount)
+
+        rolls = rng.integers(1, sides + 1, size=amount)
+        condition = ""
+        if self.mode is not None:
+            compare, target = self.compare or "==", sides
+            if self.target is not None:
+                target = self.target.run(ctx).as_number("The target value")
+            hits = comparison(compare, target)
+            if hits(np.array([1, sides])).all():
+                raise CalcError(
+                    f"Every roll would {self.mode}, so it would never stop."
+                )
+            rolls = getattr(self, self.mode)(rolls, sides, hits, ctx)
+            condition = f" ({self.mode} if roll{SYMBOLS.get(compare, compare)}"
+            condition += f"{format_number(target)})"
+
+        if len(rolls) == 1:
+            value = Value.number(rolls[0], dice=True)
+        else:
+            value = Value.sequence(rolls, dice=True)
+        if ctx.wants(1):
+            ctx.log(f"🎲Roll {amount}d{sides}{condition}: {value}.", 1)
+        return value
+
+    def explode(self, rolls, sides, hits, ctx) -> np.ndarray:
+        # Every round rolls one more die for each die whose last roll hit,
+        # then the extra rolls are put back after the die they came from.
+        rounds = [rolls]
+        owners = [np.arange(len(rolls))]
+        live = np.flatnonzero(hits(rolls))
+        while live.size:
+            ctx.take_dice(live.size)
+            extra = rng.integers(1, sides + 1, size=live.size)
+            rounds.append(extra)
+            owners.append(live)
+            live = live[hits(extra)]
+        if len(rounds) == 1:
+            return rolls
+        order = np.argsort(np.concatenate(owners), kind="stable")
+        return np.concatenate(rounds)[order]
+
+    def compound(self, rolls, sides, hits, ctx) -> np.ndarray:
+        totals = rolls.copy()
+        live = np.flatnonzero(hits(rolls))
+        while live.size:
+            ctx.take_dice(live.size)
+            extra = rng.integers(1, sides + 1, size=live.size)
+            totals[live] += extra
+            live = live[hits(extra)]
+        return totals
+
+    def reroll(self, rolls, sides, hits, ctx) -> np.ndarray:
+        rolls = rolls.copy()
+        live = np.flatnonzero(hits(rolls))
+        while live.size:
+            ctx.take_dice(live.size)
+            extra = rng.integers(1, sides + 1, size=live.size)
+            rolls[live] = extra
+            live = live[hits(extra)]
+        return rolls
+
+
+class KeepDrop(Node):
+    """[sequence]keep[n] or [sequence]drop[n]."""
+
+    __slots__ = ("op", "operand", "count")
+
+    def __init__(self, op: str, operand: Node, count: Node):
+        self.op = op
+        self.operand = operand
+        self.count = count
+
+    def run(self, ctx):
+        value = self.operand.run(ctx)
+        count = self.count.run(ctx).as_whole(f"The number to {self.op}")
+        if count < 0:
+            raise CalcError(f"You can't {self.op} a negative number of values.")
+        items = value.items()
+        if self.op == "keep":
+            ctx.log(f"Keeping {count} high values from {value}.", 1)
+            kept = np.sort(items)[::-1][:count]
+        else:
+            ctx.log(f"Dropping {count} low values from {value}.", 1)
+            kept = np.delete(items, np.argsort(items, kind="stable")[:count])
+        return Value.sequence(kept, dice=value.dice)
+
+
+class Factorial(Node):
+    __slots__ = ("operand",)
+
+    def __init__(self, operand: Node):
+        self.operand = operand
+
+    def run(self, ctx):
+        value = self.operand.run(ctx)
+        items = value.items()
+        if ((items < 0) | (items % 1 != 0)).any():
+            raise CalcError("Factorials only work on whole numbers 0 or more.")
+        if (items > MAX_FACTORIAL).any():
+            raise CalcError(f"Factorials only go up to {MAX_FACTORIAL}!")
+        results = [float(math.factorial(int(x))) for x in items.tolist()]
+        if value.is_seq:
+            result = Value.sequence(results)
+        else:
+            result = Value.number(results[0])
+        ctx.log(f"{value}!=**{result}**", 2)
+        return result
+
+
+class Prefix(Node):
+    """sum, avg, and negation."""
+
+    __slots__ = ("op", "operand")
+
+    def __init__(self, op: str, operand: Node):
+        self.op = op
+        self.operand = operand
+
+    def run(self, ctx):
+        value = self.operand.run(ctx)
+        if self.op == "-":
+            if value.is_seq:
+                return Value.sequence(-value.data, dice=value.dice)
+            return Value.number(-value.data)
+        items = value.items()
+        if self.op == "sum":
+            result = Value.number(items.sum())
+            ctx.log(f"Sum of {value}: **{result}** ", 2)
+        else:
+            if not items.size:
+                raise CalcError("Can't average an empty sequence.")
+            result = Value.number(items.mean())
+            ctx.log(f"Average of {value}: **{result}** ", 2)
+        return result
+
+
+def power(a: float, b: float) -> float:
+    try:
+        return math.pow(a, b)
+    except OverflowError:
+        raise CalcError("That number is too big.")
+    except ValueError:
+        raise CalcError(f"{format_number(a)}^{format_number(b)} isn't a real number.")
+
+
+def elementwise(fn, a: Value, b: Value) -> Value:
+    """fn on a number and a number, or every item of a sequence and a number."""
+    if not a.is_seq and not b.is_seq:
+        return Value.number(fn(a.data, b.data))
+    with np.errstate(all="ignore"):
+        data = fn(a.items() if a.is_seq else a.data, b.items() if b.is_seq else b.data)
+    return Value.sequence(data)
+
+
+def binary(op: str, a: Value, b: Value, ctx: EvalContext) -> Value:
+    """The old DataBit operator rules, on Values."""
+    if op in COMPARISONS:
+        return compare(op, a, b, ctx)
+    both_seq = a.is_seq and b.is_seq
+    if op == "+":
+        if not a.is_seq and not b.is_seq:
+            return Value.number(a.data + b.data)
+        if a.is_seq and not b.is_seq and b.data == 0:
+            return a
+        # Sequence plus anything appends it.
+        first, second = (a, b) if a.is_seq else (b, a)
+        return Value.sequence(np.concatenate([first.items(), second.items()]))
+    if op == "-":
+        if not a.is_seq and not b.is_seq:
+            return Value.number(a.data - b.data)
+        if a.is_seq and not b.is_seq and b.data == 0:
+            return a
+        return Value.sequence(np.concatenate([a.items(), -b.items()]))
+    if op in ("*", "/", "^") and both_seq:
+        return Value.sequence(np.concatenate([a.data, b.data]))
+    if op == "*":
+        return elementwise(lambda x, y: x * y, a, b)
+    if op == "/":
+        if (b.items() == 0).any():
+            raise CalcError("You can't divide by zero!")
+        return elementwise(lambda x, y: x / y, a, b)
+    if op == "^":
+        if not a.is_seq and not b.is_seq:
+            return Value.number(power(a.data, b.data))
+        return elementwise(np.power, a, b)
+    if op == ":+":
+        if both_seq:
+            if a.data.size * b.data.size > MAX_ITEMS:
+                raise CalcError(f"Sequences can't be longer than {MAX_ITEMS}.")
+            return Value.sequence(np.add.outer(a.data, b.data).ravel())
+        return elementwise(lambda x, y: x + y, a, b)
+    raise CalcError(f"I don't know how to {op}.")
+
+
+def compare(op: str, a: Value, b: Value, ctx: EvalContext) -> Value:
+    """Number against number, or sequence against sequence (by averages), is
+    a boolean.  A sequence against a number counts the items that pass."""
+    if a.is_seq != b.is_seq:
+        if a.is_seq:
+            passed = comparison(op, b.data)(a.data)
+        else:
+            passed = comparison(FLIPPED.get(op, op), a.data)(b.data)
+        count = int(np.count_nonzero(passed))
+        ctx.log(f"Was successful:{count > 0}", 1)
+        ctx.log(f"Number of successes: {count}", 1)
+        return Value.number(count)
+    if a.is_seq:
+        if not a.data.size or not b.data.size:
+            raise CalcError("Can't compare an empty sequence.")
+        result = bool(comparison(op, b.data.mean())(a.data.mean()))
+    else:
+        result = bool(comparison(op, b.data)(a.data))
+    ctx.log("Success." if result else "Failure.", 1)
+    return Value.boolean(result)
+
+
+class Chain(Node):
+    """a op b op c ... for operators that group to the left, evaluated in a
+    loop so long expressions don't make a deep tree."""
+
+    __slots__ = ("first", "rest")
+
+    def __init__(self, first: Node, rest: List[Tuple[str, Node]]):
+        self.first = first
+        self.rest = rest
+
+    def run(self, ctx):
+        value = self.first.run(ctx)
+        for op, node in self.rest:
+            other = node.run(ctx)
+            result = binary(op, value, other, ctx)
+            if op not in COMPARISONS:
+                verb = 2 if op == "^" else 3
+                if ctx.wants(verb):
+                    ctx.log(f"{value}{SYMBOLS.get(op, op)}{other}=**{result}**", verb)
+            value = result
+        return value
+
+
+class Parser:
+    """Precedence climbing parser over the output of tokenize."""
+
+    def __init__(self, tokens: List[Tuple[str, str, int]]):
+        self.tokens = tokens
+        self.pos = 0
+        self.depth = 0
+
+    def peek(self) -> Optional[str]:
+        if self.pos < len(self.tokens):
+            kind, text, _ = self.tokens[self.pos]
+            return "num" if kind == "num" else text
+        return None
+
+    def take(self) -> Tuple[str, str, int]:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect(self, text: str):
+        if self.peek() != text:
+            raise CalcError(f"Expected a '{text}' {self.where()}.")
+        self.take()
+
+    def where(self) -> str:
+        if self.pos < len(self.tokens):
+            return f"at position {self.tokens[self.pos][2] + 1}"
+        return "at the end"
+
+    def enter(self):
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise CalcError("That expression is nested too deeply.")
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            raise CalcError("There's nothing to calculate.")
+        node = self.expression(0)
+        if self.pos < len(self.tokens):
+            raise CalcError(f"Unexpected '{self.tokens[self.pos][1]}' {self.where()}.")
+        return node
+
+    def expression(self, min_prec: int) -> Node:
+        self.enter()
+        left = self.unary()
+        rest: List[Tuple[str, Node]] = []
+        while True:
+            op = self.peek()
+            if op not in BINARY or BINARY[op][0] < min_prec:
+                break
+            prec, right_assoc = BINARY[op]
+            self.take()
+            right = self.expression(prec if right_assoc else prec + 1)
+            if right_assoc:
+                left = Chain(left, [(op, right)])
+            elif rest and BINARY[rest[-1][0]][0] == prec:
+                rest.append((op, right))
+            else:
+                if rest:
+                    left = Chain(left, rest)
+                rest = [(op, right)]
+        if rest:
+            left = Chain(left, rest)
+        self.depth -= 1
+        return left
+
+    def unary(self) -> Node:
+        op = self.peek()
+        if op == "-":
+            self.take()
+            self.enter()
+            node = Prefix("-", self.expression(UNARY_MINUS))
+            self.depth -= 1
+            return node
+        if op == "+":
+            self.take()
+            return self.unary()
+        if op in ("sum", "avg"):
+            self.take()
+            self.enter()
+            node = Prefix(op, self.unary())
+            self.depth -= 1
+            return node
+        return self.postfix(self.primary())
+
+    def postfix(self, node: Node) -> Node:
+        while True:
+            op = self.peek()
+            if op == "d":
+                self.take()
+                node = self.dice(node)
+            elif op in ("keep", "drop"):
+                self.take()
+                node = KeepDrop(op, node, self.operand())
+            elif op == "!":
+                self.take()
+                node = Factorial(node)
+            else:
+                return node
+
+    def operand(self) -> Node:
+        """A number, a negative number, or anything in brackets."""
+        if self.peek() == "-":
+            self.take()
+            return Prefix("-", self.primary())
+        return self.primary()
+
+    def dice(self, amount: Optional[Node]) -> Dice:
+        sides = self.primary()
+        mode = DICE_MODES.get(self.peek())
+        if mode is None:
+            return Dice(amount, sides)
+        self.take()
+        if self.peek() in (">", "<", ">=", "<="):
+            compare = self.take()[1]
+            return Dice(amount, sides, mode, compare, self.operand())
+        return Dice(amount, sides, mode)
+
+    def primary(self) -> Node:
+        token = self.peek()
+        if token == "num":
+            return Number(float(self.take()[1]))
+        if token == "d":
+            self.take()
+            return self.dice(None)
+        if token == "(":
+            self.take()
+            node = self.expression(0)
+            self.expect(")")
+            return node
+        if token == "[":
+            self.take()
+            items = []
+            while self.peek() != "]":
+                items.append(self.expression(0))
+                if self.peek() != ",":
+                    break
+                self.take()
+            self.expect("]")
+            return SequenceLiteral(items)
+        raise CalcError(f"Expected a number {self.where()}.")
+
+
+@lru_cache(maxsize=256)
+def compile_expression(expression: str) -> Node:
+    """Parse expression into a tree of Nodes.  Cached, since the same rolls
+    get asked for a lot."""
+    if len(expression) > MAX_EXPRESSION:
+        raise CalcError(
+            f"Expressions can't be longer than {MAX_EXPRESSION} characters."
+        )
+    return Parser(tokenize(expression)).parse()
+
+
+def evaluate_compiled(
+    expr: str, args: Tuple = (), verb: int = 2
+) -> Tuple[List[Tuple[int, str]], str]:
+    """Evaluate expr, like evaluate_expression.
+
+    Returns the step log as (verb, line) pairs, only with lines at verb or
+    lower, and the result as a string."""
+    ctx = EvalContext(verb)
+    stri = expr
+    replaces = False
+    for name, value in expressDictionary.items():
+        if name in stri:
+            replaces = True
+            stri = stri.replace(name, value)
+    for count, value in enumerate(args, start=1):
+        if f"num{count}" in stri:
+            replaces = True
+            stri = stri.replace(f"num{count}", str(value))
+    if replaces:
+        ctx.log(stri, -1)
+    result = compile_expression(stri).run(ctx)
+    text = result.format(dice=False, limit=MAX_RESULT // 2)
+    if len(text) > MAX_RESULT:
+        text = text[: MAX_RESULT - 4] + "...]"
+    ctx.full = False
+    ctx.lines.append((0, text))
+    return ctx.lines, text
@@ -67,22 +67,32 @@ async def process_text(extracted_text, page):
     return result
 
 
-async def execute_javascript(tagtext, browser):
+async def execute_javascript(tagtext, pool):
     # I don't need to use the javascript library for this.
     # Tag javascript runs with playwright instead as a security precaution.
+    # Every <js:{...}> in one tag runs on the same sandbox page from the pool.
 
-    result: str = tagtext
-
-    page = await browser.new_page()
     start, end = "<js:{", "}>"
     pattern = r"<js\:\{(.*?)\}>"
-    matches = re.finditer(pattern, tagtext)
-    for match in reversed(list(matches)):
-        extracted_text = match.group(1)
-        processed_text = await process_text(extracted_text, page)
-        result = result.replace(f"{start}{extracted_text}{end}", processed_text, 1)
-    await page.close()
-    return result
+
+    async def run_scripts(page):
+        result: str = tagtext
+        matches = re.finditer(pattern, tagtext)
+        timed_out = False
+        for match in reversed(list(matches)):
+            extracted_text = match.group(1)
+            # The page may still be busy with a timed out script, so don't
+            # make the rest of the tag wait on it too.
+            processed_text = "(javascript timed out)"
+            if not timed_out:
+                try:
+                    processed_text = await process_text(extracted_text, page)
+                except asyncio.TimeoutError:
+                    timed_out = True
+            result = result.replace(f"{start}{extracted_text}{end}", processed_text, 1)
+        return result
+
+    return await pool.run(run_scripts)
 
 
 async def dynamic_tag_get(dictionary, text, maxsize=2000):
@@ -283,9 +293,9 @@ class Tags2(commands.Cog):
                     mes = await mes.edit(content="Activating advanced utility...")
                     await self.bot.open_browser()
                     mes = await mes.edit(content="Javascript running")
-                browser = await self.bot.get_browser()
+                pool = await self.bot.get_page_pool()
 
-                to_send = await execute_javascript(to_send, browser)
+                to_send = await execute_javascript(to_send, pool)
                 if len(to_send) > 2000:
                     to_send = to_send[:1950] + "tag size limit."
 
@@ -1,3 +1,4 @@
+import asyncio
 from io import BytesIO
 from typing import Optional
 import discord
@@ -12,70 +13,19 @@ from utility import MessageTemplates
 from utility.views import BaseView
 
 from cogs.dat_Starboard import Tag
+from cogs.TagsSub import tag_compiler
 
 
-async def is_cyclic_i(start_key):
-    visited = set()
-    stack = set()
-
-    async def visit(key):
-        if key in stack:
-            return True
-        if key in visited:
-            return False
-        visited.add(key)
-        stack.add(key)
-
-        tag = await Tag.get(key)
-        if not tag:
-            return False
-        text = tag.text
-        for word in re.findall(r"\{(.*?)\}", text):
-            if await visit(word):
-                return True
-        stack.remove(key)
-        return False
-
-    return await visit(start_key)
+async def is_cyclic_i(start_key, guildid=None):
+    """Check if the tag start_key refers back to itself."""
+    cycle_check, _ = await tag_compiler.find_cycle(guildid, start_key)
+    return cycle_check
 
 
 async def is_cyclic_mod(start_key, valuestartmain, guildid):
-    visited = set()
-    stack = set()
-    steps = []
-    valuestart = valuestartmain
-    if not valuestart:
-        valuestart = ""
-
-    async def visit(key, steps):
-        if key in stack:
-            print("Key in stack.")
-            steps.append(key)
-            return True, steps
-        if key in visited:
-            return False, steps
-        visited.add(key)
-        stack.add(key)
-
-        tag = await Tag.get(key, guildid)
-        if not tag or key != start_key:
-            return False, steps
-        elif key == start_key:
-            text = valuestart
-        else:
-            text = tag.text
-        for word in re.findall(r"\{(.*?)\}", text):
-            steps.append(word)
-            print(key, word, stack, visited, steps)
-            visite, st = await visit(word, steps)
-            if visite:
-                print(key in stack, key in visited)
-                return True, steps
-            steps.pop()
-        stack.remove(key)
-        return False, steps
-
-    return await visit(start_key, steps)
+    """Check if the tag start_key would refer back to itself if its text
+    was valuestartmain.  Returns the cycle check and the keys in the cycle."""
+    return await tag_compiler.find_cycle(guildid, start_key, valuestartmain or "")
 
 
 async def process_text(extracted_text, page):
@@ -83,49 +33,37 @@ async def process_text(extracted_text, page):
     return result
 
 
-async def execute_javascript(tagtext, browser):
+async def execute_javascript(tagtext, pool):
     # I don't need to use the javascript library for this.
     # Tag javascript runs with playwright instead as a security precaution.
+    # Every <js:{...}> in one tag runs on the same sandbox page from the pool.
 
-    result: str = tagtext
-
-    page = await browser.new_page()
     start, end = "<js:{", "}>"
     pattern = r"<js\:\{(.*?)\}>"
-    matches = re.finditer(pattern, tagtext)
-    for match in reversed(list(matches)):
-        print(match)
-        extracted_text = match.group(1)
-        processed_text = await process_text(extracted_text, page)
-        print(processed_text)
-        result = result.replace(f"{start}{extracted_text}{end}", processed_text, 1)
-    await page.close()
-    return result
+
+    async def run_scripts(page):
+        result: str = tagtext
+        matches = re.finditer(pattern, tagtext)
+        timed_out = False
+        for match in reversed(list(matches)):
+            extracted_text = match.group(1)
+            # The page may still be busy with a timed out script, so don't
+            # make the rest of the tag wait on it too.
+            processed_text = "(javascript timed out)"
+            if not timed_out:
+                try:
+                    processed_text = await process_text(extracted_text, page)
+                except asyncio.TimeoutError:
+                    timed_out = True
+            result = result.replace(f"{start}{extracted_text}{end}", processed_text, 1)
+        return result
+
+    return await pool.run(run_scripts)
 
 
 async def dynamic_tag_get(text, guildid, maxsize=2000):
-    result = text
-    pattern = re.compile(r"\{(.*?)\}")
-    ignorethese = []
-    for i in range(0, 10):
-        matches = pattern.findall(result)
-        if not matches:
-            break
-        ignorev = False
-        for match in matches:
-            if match not in ignorethese:
-                ignorev = True
-            tag = await Tag.get(match, guildid)
-            if tag:
-                result = result.replace(f"{{{match}}}", tag.text)
-            else:
-                ignorethese.append(match)
-            if len(result) > maxsize:
-                result = result[: maxsize - 4] + "..."
-                return result
-        if not ignorev:
-            break
-    return result
+    """Expand every {tag} in text, in one pass over the compiled tags."""
+    return await tag_compiler.expand(guildid, text, maxsize)
 
 
 class TagContentModal(discord.ui.Modal, title="Enter Tag Contents"):
@@ -321,6 +259,28 @@ class Tags(commands.Cog):
             results.append(app_commands.Choice(name=v.tagname, value=v.tagname))
         return results
 
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def tag_stats(self, ctx):
+        """Show the tag compiler and sandbox page pool stats.  Owner only."""
+        c = tag_compiler.stats()
+        lines = [
+            f"{c['guilds']} cached guilds, {c['tags']} tags, {c['compiled']} compiled "
+            f"texts, {c['hits']} hits, {c['loads']} loads, {c['expansions']} "
+            f"expansions, {c['truncated']} truncated."
+        ]
+        if self.bot.page_pool is not None:
+            p = self.bot.page_pool.stats()
+            lines.append(
+                f"{p['pages']} sandbox pages, {p['busy']} busy, queue depth "
+                f"{p['queue_depth']}, {p['uses']} uses, {p['timeouts']} timeouts, "
+                f"{p['recycled']} recycled.\n"
+                f"Wait: p50 {p['p50_wait']:.2f}s, max {p['max_wait']:.2f}s"
+            )
+        else:
+            lines.append("The sandbox page pool is not open.")
+        await ctx.send("\n".join(lines))
+
     tag_maintenance = app_commands.Group(
         name="tag_maintenance",
         description="For tag moderation",
@@ -341,6 +301,7 @@ class Tags(commands.Cog):
         if not tag:
             await ctx.send("This tag doesn't exist.", ephemeral=True)
             return
+        tag_compiler.remove(tagname)
         await ctx.send(f"Tag {tagname} was removed successfully.", ephemeral=True)
 
     tags = app_commands.Group(name="tags", description="Tag commands", guild_only=True)
@@ -424,7 +385,7 @@ class Tags(commands.Cog):
                 return
 
             # Add the new tag to the database
-            await Tag.add(
+            added = await Tag.add(
                 tagname,
                 interaction.user.id,
                 c,
@@ -435,6 +396,8 @@ class Tags(commands.Cog):
                 imb=bytesv,
                 imname=fname,
             )
+            if added:
+                tag_compiler.put(tagname, added.text, added.guildid, added.guild_only)
 
             # Confirm tag creation
             new_tag = await Tag.get(tagname, ctx.guild.id)
@@ -467,6 +430,7 @@ class Tags(commands.Cog):
         ctx: commands.Context = await self.bot.get_context(interaction)
         deleted_tag = await Tag.delete(tagname, interaction.user.id)
         if deleted_tag:
+            tag_compiler.remove(tagname)
             await MessageTemplates.tag_message(
                 ctx,
                 f"Tag {tagname} deleted  successfully.",
@@ -541,6 +505,9 @@ class Tags(commands.Cog):
 
             edited_tag = await Tag.edit(tagname, interaction.user.id, newtext=c)
             if edited_tag:
+                tag_compiler.put(
+                    tagname, edited_tag.text, edited_tag.guildid, edited_tag.guild_only
+                )
                 new_tag = await Tag.get(tagname, ctx.guild.id)
                 await MessageTemplates.tag_message(
                     ctx,
@@ -618,9 +585,9 @@ class Tags(commands.Cog):
                     mes = await mes.edit(content="Activating advanced utility...")
                     await self.bot.open_browser()
                     mes = await mes.edit(content="Javascript running")
-                browser = await self.bot.get_browser()
+                pool = await self.bot.get_page_pool()
 
-                to_send = await execute_javascript(to_send, browser)
+                to_send = await execute_javascript(to_send, pool)
                 if len(to_send) > 2000:
                     to_send = to_send[:1996] + "..."
 
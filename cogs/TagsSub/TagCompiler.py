@@ -0,0 +1,236 @@
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from cogs.dat_Starboard import Tag
+
+"""
+Compiled tags.
+
+A tag's text can pull in other tags with {tagname}.  That used to be done
+with up to 10 rounds of regex substitution over the whole text, with a
+Tag.get per match per round, and the cycle checks did a query per tag too.
+
+Now each text is parsed once into a Template: a tuple of literal strings
+and TagRefs.  TagCompiler keeps the templates of every tag a guild can see,
+which doubles as the guild's dependency graph, since a template knows which
+tags it refers to.  With that in memory:
+
+* cycles are found with one walk of the graph, when a tag is created or
+  edited.
+* expanding a tag is one walk of its templates, which stops as soon as the
+  output is over the size limit.
+
+The cog writes tag changes through the compiler, so the cached graphs never
+have to expire.
+"""
+
+TAG_PATTERN = re.compile(r"\{(.*?)\}")
+# The old expansion made 10 rounds of substitution.
+MAX_DEPTH = 10
+# Most tag references expanded for one tag.
+MAX_REFS = 5000
+
+
+class TagRef:
+    """A {name} in a tag's text."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @property
+    def raw(self) -> str:
+        return f"{{{self.name}}}"
+
+    def __repr__(self):
+        return f"TagRef({self.name!r})"
+
+
+class Template:
+    """A tag's text, split into literal strings and TagRefs."""
+
+    __slots__ = ("parts", "refs")
+
+    def __init__(self, parts: Tuple[Union[str, TagRef], ...]):
+        self.parts = parts
+        self.refs = frozenset(p.name for p in parts if isinstance(p, TagRef))
+
+    def __repr__(self):
+        return f"Template({self.parts!r})"
+
+
+@lru_cache(maxsize=4096)
+def compile_template(text: str) -> Template:
+    """Parse text into a Template.  Cached, since many guilds see the same tags."""
+    parts: List[Union[str, TagRef]] = []
+    last = 0
+    for match in TAG_PATTERN.finditer(text or ""):
+        if match.start() > last:
+            parts.append(text[last : match.start()])
+        parts.append(TagRef(match.group(1)))
+        last = match.end()
+    if last < len(text or ""):
+        parts.append(text[last:])
+    return Template(tuple(parts))
+
+
+class GuildTags:
+    """Every tag one guild can see, by name."""
+
+    __slots__ = ("templates",)
+
+    def __init__(self, texts: Dict[str, str]):
+        self.templates: Dict[str, Template] = {
+            name: compile_template(text) for name, text in texts.items()
+        }
+
+    def edges(self, name: str) -> List[str]:
+        """The tags name refers to that exist."""
+        template = self.templates.get(name)
+        if template is None:
+            return []
+        return [ref for ref in template.refs if ref in self.templates]
+
+
+class TagCompiler:
+    """Per guild cache of compiled tags, with cycle checks and expansion."""
+
+    def __init__(self):
+        self.guilds: Dict[Optional[int], GuildTags] = {}
+        self.generation = 0
+        self.loads = 0
+        self.hits = 0
+        self.expansions = 0
+        self.truncated = 0
+
+    async def get_guild(self, guild_id: Optional[int]) -> GuildTags:
+        """The compiled tags guild_id can see.  None means every tag."""
+        tags = self.guilds.get(guild_id)
+        if tags is not None:
+            self.hits += 1
+            return tags
+        self.loads += 1
+        generation = self.generation
+        tags = GuildTags(await Tag.get_texts(guild_id))
+        if generation == self.generation:
+            self.guilds[guild_id] = tags
+        return tags
+
+    def put(self, tagname: str, text: str, guild_id: int, guild_only: bool):
+        """Write a created or edited tag through to every cached guild."""
+        self.generation += 1
+        template = compile_template(text)
+        for gid, tags in self.guilds.items():
+            if gid is None or not guild_only or gid == guild_id:
+                tags.templates[tagname] = template
+
+    def remove(self, tagname: str):
+        """Drop a deleted tag from every cached guild."""
+        self.generation += 1
+        for tags in self.guilds.values():
+            tags.templates.pop(tagname, None)
+
+    def invalidate(self, guild_id: Optional[int] = None):
+        """Forget one guild's tags, or every guild's."""
+        self.generation += 1
+        if guild_id is None:
+            self.guilds.clear()
+        else:
+            self.guilds.pop(guild_id, None)
+
+    async def find_cycle(
+        self, guild_id: Optional[int], tagname: str, text: Optional[str] = None
+    ) -> Tuple[bool, List[str]]:
+        """Check if tagname would refer back to itself if its text was text.
+        Returns (True, the path of the cycle) or (False, [])."""
+        tags = await self.get_guild(guild_id)
+        if text is not None:
+            refs = compile_template(text).refs
+        else:
+            refs = tags.templates[tagname].refs if tagname in tags.templates else ()
+        # The tag refers to itself, whether it exists yet or not.
+        if tagname in refs:
+            return True, [tagname, tagname]
+        # Iterative dfs from every tag tagname refers to.  Reaching tagname
+        # again means a cycle, so its old text never matters.
+        done = set()
+        for first in sorted(r for r in refs if r in tags.templates):
+            if first in done:
+                continue
+            path = [tagname, first]
+            on_path = {tagname, first}
+            stack = [iter(tags.edges(first))]
+            while stack:
+                nxt = next(stack[-1], None)
+                if nxt is None:
+                    stack.pop()
+                    finished = path.pop()
+                    on_path.discard(finished)
+                    done.add(finished)
+                    continue
+                if nxt in on_path:
+                    return True, path + [nxt]
+                if nxt in done:
+                    continue
+                path.append(nxt)
+                on_path.add(nxt)
+                stack.append(iter(tags.edges(nxt)))
+        return False, []
+
+    async def expand(
+        self, guild_id: Optional[int], text: str, maxsize: int = 2000
+    ) -> str:
+        """Replace every {tagname} in text that guild_id can see with that
+        tag's text, recursively, stopping once the result is over maxsize."""
+        self.expansions += 1
+        tags = await self.get_guild(guild_id)
+        out: List[str] = []
+        size = 0
+        refs = 0
+        # Each frame is (parts, next index, tag name or None for the root).
+        stack: List[Tuple[Tuple[Any, ...], int, Optional[str]]] = [
+            (compile_template(text).parts, 0, None)
+        ]
+        expanding = set()
+        while stack:
+            parts, i, name = stack.pop()
+            if i >= len(parts):
+                expanding.discard(name)
+                continue
+            stack.append((parts, i + 1, name))
+            part = parts[i]
+            if isinstance(part, TagRef):
+                template = tags.templates.get(part.name)
+                refs += 1
+                if (
+                    template is not None
+                    and part.name not in expanding
+                    and len(stack) <= MAX_DEPTH
+                    and refs <= MAX_REFS
+                ):
+                    expanding.add(part.name)
+                    stack.append((template.parts, 0, part.name))
+                    continue
+                part = part.raw
+            out.append(part)
+            size += len(part)
+            if size > maxsize:
+                self.truncated += 1
+                return "".join(out)[: maxsize - 4] + "..."
+        return "".join(out)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "guilds": len(self.guilds),
+            "tags": sum(len(t.templates) for t in self.guilds.values()),
+            "hits": self.hits,
+            "loads": self.loads,
+            "expansions": self.expansions,
+            "truncated": self.truncated,
+            "compiled": compile_template.cache_info().currsize,
+        }
+
+
+tag_compiler = TagCompiler()
@@ -0,0 +1,7 @@
+from .TagCompiler import (
+    TagCompiler,
+    TagRef,
+    Template,
+    compile_template,
+    tag_compiler,
+)
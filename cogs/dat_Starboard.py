@@ -1,4 +1,4 @@
-from typing import Optional, ByteString
+from typing import Dict, Optional, ByteString
 from sqlalchemy import Column, Integer, Boolean, BigInteger, String
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete, func, and_, or_
@@ -203,6 +203,7 @@ class StarboardEntryTable(Base):
         author_id: int,
         message_url: str,
         op: int = 1,
+        do_commit: bool = True,
         session: OptionalSession = None,
     ):
         query = select(cls).where(
@@ -230,7 +231,8 @@ class StarboardEntryTable(Base):
                 ),
             )
             session.add(entry)
-        await session.commit()
+        if do_commit:
+            await session.commit()
         return entry
 
     @classmethod
@@ -602,6 +604,20 @@ class Tag(Base):
             )
             return tags.scalars().all()
 
+    @classmethod
+    @ensure_session
+    async def get_texts(
+        cls, gid: Optional[int] = None, session: OptionalSession = None
+    ) -> Dict[str, str]:
+        """Get the text of every tag visible in gid, or of every tag if gid is None."""
+        statement = select(cls.tagname, cls.text)
+        if gid is not None:
+            statement = statement.where(
+                or_(cls.guild_only == False, cls.guildid == gid)
+            )
+        result = await session.execute(statement)
+        return {tagname: text for tagname, text in result}
+
     @staticmethod
     async def list_all_cat(gid: int):
         async with DatabaseSingleton.get_async_session() as session:
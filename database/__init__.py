@@ -4,7 +4,9 @@
 """Database Main stores some common tables."""
 print("importing database main")
 from .database_singleton import DatabaseSingleton, DSCTX
-from .database_utils import add_or_update_all, upsert_a
+from .database_profiles import ENGINE_PROFILES, DEFAULT_PROFILE
+from .query_profiler import query_profiler
+from .database_utils import add_or_update_all, upsert_a, purge_rows_in
 from .database_main import (
     AwareDateTime,
     ServerData,
@@ -13,4 +15,4 @@ from .database_main import (
     IgnoredUser,
     Users_DoNotTrack,
 )
-from .database_session_decorators import ensure_session
+from .database_session_decorators import ensure_session, ensure_task_session
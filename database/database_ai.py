@@ -8,9 +8,13 @@ from sqlalchemy import (
     ForeignKey,
     DateTime,
 )
+from sqlalchemy import select, delete, update, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.ext.asyncio import AsyncSession
 from .database_singleton import DatabaseSingleton
+from .database_session_decorators import ensure_task_session
 
 """Tables related to the AI stuff."""
 
@@ -19,7 +23,7 @@ from .database_main import AwareDateTime
 
 from dateutil import rrule
 
-from datetime import datetime
+from datetime import datetime, timedelta
 import utility.hash as hash
 
 AIBase = declarative_base(name="AI Feature Base")
@@ -117,6 +121,66 @@ class AuditProfile(AIBase):
         session.commit()
         return entry
 
+    @staticmethod
+    async def get_or_new_a(server, user, session: AsyncSession = None):
+        """async variant of get_or_new, uses the current task's session."""
+        return await AuditProfile._get_or_new_a(server.id, user.id, session=session)
+
+    @classmethod
+    @ensure_task_session
+    async def _get_or_new_a(cls, server_id, user_id, session: AsyncSession = None):
+        try:
+            return await cls._fetch_or_add_a(server_id, user_id, session=session)
+        except IntegrityError:
+            # Another task added one of the rows first, use theirs.
+            await session.rollback()
+            return await cls._fetch_or_add_a(server_id, user_id, session=session)
+
+    @classmethod
+    async def _fetch_or_add_a(cls, server_id, user_id, session: AsyncSession):
+        sa = await cls.get_server_a(server_id, session=session)
+        ua = await cls.get_user_a(user_id, session=session)
+        if sa == None:
+            sa = await cls.add_a(server_id, "server", session=session)
+        if ua == None:
+            ua = await cls.add_a(user_id, "user", True, session=session)
+        return sa, ua
+
+    @classmethod
+    @ensure_task_session
+    async def get_server_a(cls, server_id, session: AsyncSession = None):
+        targetid, num = hash.hash_string(
+            str(server_id), hashlen=16, hashset=hash.Hashsets.base64
+        )
+        result = await session.execute(
+            select(cls).filter(cls.type == "server", cls.id == targetid)
+        )
+        return result.scalars().first()
+
+    @classmethod
+    @ensure_task_session
+    async def get_user_a(cls, user_id, session: AsyncSession = None):
+        targetid, num = hash.hash_string(
+            str(user_id), hashlen=16, hashset=hash.Hashsets.base64
+        )
+        result = await session.execute(
+            select(cls).filter(cls.type == "user", cls.id == targetid)
+        )
+        return result.scalars().first()
+
+    @classmethod
+    @ensure_task_session
+    async def add_a(cls, id, type, disabled=False, session: AsyncSession = None):
+        targetid, num = hash.hash_string(
+            str(id), hashlen=16, hashset=hash.Hashsets.base64
+        )
+        entry = cls(id=targetid, type=type, disabled=disabled)
+        if type == "server":
+            entry.DailyLimit = 50
+        session.add(entry)
+        await session.commit()
+        return entry
+
     def check_if_ok(self):
         if self.current > self.DailyLimit:
             return False, "messagelimit"
@@ -133,6 +197,31 @@ class AuditProfile(AIBase):
         self.current += 1
         self.last_call = datetime.now()
 
+    @classmethod
+    @ensure_task_session
+    async def modify_status_a(
+        cls, profile, limited: bool = True, session: AsyncSession = None
+    ) -> bool:
+        """modify_status as one UPDATE, so concurrent calls can't lose a count.
+        If limited, it only counts while the limit and cooldown still allow it,
+        and returns False if they didn't."""
+        now = datetime.now()
+        stmt = update(cls).where(cls.id == profile.id, cls.type == profile.type)
+        if limited:
+            stmt = stmt.where(
+                cls.current <= cls.DailyLimit,
+                or_(
+                    cls.last_call == None,
+                    cls.last_call <= now - timedelta(seconds=15),
+                ),
+            )
+        result = await session.execute(
+            stmt.values(current=cls.current + 1, last_call=now),
+            execution_options={"synchronize_session": False},
+        )
+        await session.refresh(profile)
+        return result.rowcount > 0
+
     def ban(self):
         self.banned = True
         self.banned_since = datetime.now()
@@ -338,6 +427,77 @@ class MessageChain(AIBase):
 
     server_ai_config = relationship("ServerAIConfig", back_populates="message_chains")
 
+    @classmethod
+    @ensure_task_session
+    async def add_to_chain(
+        cls,
+        server_id,
+        message_id,
+        created_at,
+        thread_id=None,
+        role=None,
+        content=None,
+        name=None,
+        function=None,
+        session: AsyncSession = None,
+    ):
+        """async variant of ServerAIConfig.add_message_to_chain."""
+        session.add(
+            cls(
+                server_id=server_id,
+                message_id=message_id,
+                thread_id=thread_id,
+                created_at=created_at,
+                role=role,
+                content=content,
+                name=name,
+                function=json.dumps(function),
+            )
+        )
+        await session.commit()
+
+    @classmethod
+    @ensure_task_session
+    async def list_chain(cls, server_id, thread_id=None, session: AsyncSession = None):
+        """async variant of ServerAIConfig.list_message_chains."""
+        result = await session.execute(
+            select(cls)
+            .filter_by(server_id=server_id, thread_id=thread_id)
+            .order_by(cls.created_at)
+            .limit(10)
+        )
+        return result.scalars().all()
+
+    @classmethod
+    @ensure_task_session
+    async def prune_chain(
+        cls, server_id, limit=15, thread_id=None, session: AsyncSession = None
+    ):
+        """async variant of ServerAIConfig.prune_message_chains,
+        removes everything but the newest `limit` messages in one statement."""
+        keep = (
+            select(cls.id)
+            .filter_by(server_id=server_id, thread_id=thread_id)
+            .order_by(cls.created_at.desc())
+            .limit(limit)
+        )
+        await session.execute(
+            delete(cls)
+            .where(cls.server_id == server_id, cls.thread_id == thread_id)
+            .where(cls.id.not_in(keep.scalar_subquery()))
+        )
+        await session.commit()
+
+    @classmethod
+    @ensure_task_session
+    async def clear_chain(cls, server_id, thread_id=None, session: AsyncSession = None):
+        """async variant of ServerAIConfig.clear_message_chains."""
+        result = await session.execute(
+            delete(cls).where(cls.server_id == server_id, cls.thread_id == thread_id)
+        )
+        await session.commit()
+        return result.rowcount
+
     def to_dict(self):
         return {
             "role": self.role,
@@ -10,8 +10,11 @@ from sqlalchemy import (
 from sqlalchemy.orm import relationship
 from sqlalchemy.orm import Session
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from .database_singleton import DatabaseSingleton
-from sqlalchemy import not_, func
+from .database_session_decorators import ensure_task_session
+from sqlalchemy import not_, func, select
 import datetime
 
 """This defines a few universal tables."""
@@ -180,6 +183,42 @@ class ServerArchiveProfile(Main_DB_Base):
             session.commit()
         return new
 
+    @classmethod
+    @ensure_task_session
+    async def get_a(cls, server_id, session: AsyncSession = None):
+        """
+        async variant of get, uses the current task's session.
+        """
+        result = await session.execute(select(cls).filter_by(server_id=server_id))
+        return result.scalars().first()
+
+    @classmethod
+    @ensure_task_session
+    async def get_or_new_a(cls, server_id, session: AsyncSession = None):
+        """
+        async variant of get_or_new, uses the current task's session.
+        """
+        new = await cls.get_a(server_id, session=session)
+        if not new:
+            new = cls(server_id=server_id)
+            session.add(new)
+            try:
+                await session.commit()
+            except IntegrityError:
+                # Another task added this server first, use theirs.
+                await session.rollback()
+                return await cls.get_a(server_id, session=session)
+            await session.refresh(new)
+        return new
+
+    @ensure_task_session
+    async def update_a(self, session: AsyncSession = None, **kwargs):
+        """async variant of update, uses the current task's session."""
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+        session.add(self)
+        await session.commit()
+
     @staticmethod
     def get_entry(server_id: int):
         session = DatabaseSingleton.get_session()
@@ -249,6 +288,66 @@ class ServerArchiveProfile(Main_DB_Base):
             return True
         return False
 
+    async def _get_channel_a(self, channel_id, session: AsyncSession):
+        result = await session.execute(
+            select(IgnoredChannel).filter_by(
+                server_profile_id=self.server_id, channel_id=channel_id
+            )
+        )
+        return result.scalars().first()
+
+    @ensure_task_session
+    async def add_channel_a(self, channel_id, session: AsyncSession = None):
+        """async variant of add_channel, uses the current task's session."""
+        if await self._get_channel_a(channel_id, session):
+            return False
+        session.add(
+            IgnoredChannel(server_profile_id=self.server_id, channel_id=channel_id)
+        )
+        await session.commit()
+        return True
+
+    @ensure_task_session
+    async def remove_channel_a(self, channel_id, session: AsyncSession = None):
+        """async variant of remove_channel, uses the current task's session."""
+        channel = await self._get_channel_a(channel_id, session)
+        if not channel:
+            return False
+        await session.delete(channel)
+        await session.commit()
+        return True
+
+    @ensure_task_session
+    async def has_channel_a(self, channel_id, session: AsyncSession = None):
+        """async variant of has_channel, uses the current task's session."""
+        if self.history_channel_id == channel_id:
+            return True
+        return await self._get_channel_a(channel_id, session) is not None
+
+    @ensure_task_session
+    async def list_channels_a(self, session: AsyncSession = None):
+        """async variant of list_channels, uses the current task's session."""
+        result = await session.execute(
+            select(IgnoredChannel.channel_id).filter_by(
+                server_profile_id=self.server_id
+            )
+        )
+        return list(result.scalars().all())
+
+    @ensure_task_session
+    async def add_user_a(self, user_id, session: AsyncSession = None):
+        """async variant of add_user, uses the current task's session."""
+        result = await session.execute(
+            select(IgnoredUser).filter_by(
+                server_profile_id=self.server_id, user_id=user_id
+            )
+        )
+        if result.scalars().first():
+            return False
+        session.add(IgnoredUser(server_profile_id=self.server_id, user_id=user_id))
+        await session.commit()
+        return True
+
     def get_ignore_mode(self):
         if self.ignore_mode != None:
             return self.ignore_mode
@@ -0,0 +1,96 @@
+from typing import Any, Dict, Union
+from sqlalchemy import Engine, event
+
+"""
+SQLite engine profiles.
+
+Each profile is a dictionary of PRAGMA settings that are applied to every new
+DBAPI connection through a "connect" event listener, so they hold for every
+pooled connection, both sync and aiosqlite.
+
+"legacy" applies nothing, which is SQLite's default rollback journal behavior.
+"""
+
+ENGINE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "legacy": {},
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,  # negative values are in KiB, so ~16MB.
+        "mmap_size": 67108864,  # 64MB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,  # milliseconds
+    },
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -64000,
+        "mmap_size": 268435456,  # 256MB
+        "temp_store": "MEMORY",
+        "busy_timeout": 10000,
+    },
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -8000,
+        "mmap_size": 0,
+        "temp_store": "DEFAULT",
+        "busy_timeout": 15000,
+    },
+}
+
+DEFAULT_PROFILE = "balanced"
+
+# The order PRAGMAs are applied in, journal_mode goes first.
+PRAGMA_ORDER = [
+    "journal_mode",
+    "synchronous",
+    "cache_size",
+    "mmap_size",
+    "temp_store",
+    "busy_timeout",
+]
+
+
+def get_profile(profile: Union[str, Dict[str, Any], None]) -> Dict[str, Any]:
+    """
+    Resolve a profile name or a dictionary of pragmas into a dictionary of pragmas.
+    Dictionaries may include a "base" key to extend a named profile.
+    """
+    if profile is None:
+        return dict(ENGINE_PROFILES[DEFAULT_PROFILE])
+    if isinstance(profile, str):
+        if profile not in ENGINE_PROFILES:
+            raise KeyError(f"There is no engine profile named {profile}")
+        return dict(ENGINE_PROFILES[profile])
+    base = get_profile(profile.get("base", "legacy"))
+    base.update({k: v for k, v in profile.items() if k != "base"})
+    return base
+
+
+def profile_pragmas(pragmas: Dict[str, Any]) -> list:
+    """Get the list of PRAGMA statements for a dictionary of pragmas."""
+    statements = []
+    for name in PRAGMA_ORDER:
+        if name in pragmas and pragmas[name] is not None:
+            statements.append(f"PRAGMA {name}={pragmas[name]}")
+    return statements
+
+
+def apply_profile(engine: Engine, profile: Union[str, Dict[str, Any], None]):
+    """
+    Attach a connect listener to a sync engine (or an AsyncEngine's sync_engine)
+    that applies the profile's PRAGMAs to each new connection.
+    """
+    statements = profile_pragmas(get_profile(profile))
+    if not statements:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
@@ -15,3 +15,17 @@ def ensure_session(fn):
             return await fn(cls, *args, session=session, **kwargs)
 
     return wrapper
+
+
+def ensure_task_session(fn):
+    """Ensure that a particular function gets the current task's AsyncSession
+    on the main database, if no session was passed in."""
+
+    async def wrapper(cls, *args, session: Optional[AsyncSession] = None, **kwargs):
+        if session is None:
+            async with DatabaseSingleton.task_session() as session:
+                return await fn(cls, *args, session=session, **kwargs)
+        else:
+            return await fn(cls, *args, session=session, **kwargs)
+
+    return wrapper
@@ -1,14 +1,20 @@
-from typing import Dict
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Callable, Dict, TypeVar, Union
 import gui
 from sqlalchemy import Engine, create_engine, MetaData
 from sqlalchemy.orm import sessionmaker, Session
 
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncEngine
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session
 from sqlalchemy.ext.asyncio import create_async_engine
 
 import logging
 from .db_compare_utils import compare_db, async_compare_db
+from .database_profiles import apply_profile, DEFAULT_PROFILE
+from .query_profiler import query_profiler
 
 """
 The database engine is stored within a DatabaseSingleton, that ensures only one engine is connected to
@@ -18,9 +24,17 @@ This way, it can be accessed from anywhere, and not just through the Bot object.
 
 It also can add new columns to the engine if they're missing,
 but that's the extent of database alterations.
+
+Sync engines also get an aiosqlite engine bound to the same file, so tables on the
+main database can be used from coroutines without blocking the event loop.
+Use `DatabaseSingleton.task_session()` to get an AsyncSession scoped to the current task,
+or `DatabaseSingleton.run_sync(fn)` to run legacy sync code in the database executor.
 """
 
-# TO DO LATER: ADD AN ASYNC SESSION MODE.
+T = TypeVar("T")
+
+# How many task_session blocks deep the current task is.
+_task_session_depth: ContextVar[int] = ContextVar("task_session_depth", default=0)
 
 
 def generate_column_definition(column, engine):
@@ -40,9 +54,10 @@ ASYNCENGINE = "sqlite+aiosqlite:///"
 class EngineContainer:
     """This class contains the database urls and the active engines."""
 
-    def __init__(self, db_name, asyncmode=False):
+    def __init__(self, db_name, asyncmode=False, profile=DEFAULT_PROFILE):
         self.database_name = db_name
         self.connected = False
+        self.profile: Union[str, Dict[str, Any]] = profile
         self.async_mode = asyncmode
         self.engine: Engine = None
         self.aengine: AsyncEngine = None
@@ -50,11 +65,24 @@ class EngineContainer:
         self.SessionLocal: sessionmaker = None
         self.sync_sessions: Dict[str, Session] = {}
         self.SessionAsyncLocal: async_sessionmaker = None
+        self.ScopedAsyncSession: async_scoped_session = None
+        self.executor: ThreadPoolExecutor = None
+
+    def make_async_sessions(self):
+        """Create the async session factory and the per task scoped session registry."""
+        self.SessionAsyncLocal = async_sessionmaker(
+            bind=self.aengine, autocommit=False, autoflush=True, expire_on_commit=False
+        )
+        self.ScopedAsyncSession = async_scoped_session(
+            self.SessionAsyncLocal, scopefunc=asyncio.current_task
+        )
 
     def connect_to_engine(self):
         if not self.connected:
             db_name = self.database_name
             self.engine = create_engine(f"{ENGINEPREFIX}{db_name}", echo=False)
+            apply_profile(self.engine, self.profile)
+            query_profiler.attach(self.engine, db_name)
             for base in self.bases:
                 base.metadata.create_all(self.engine)
             self.connected = True
@@ -64,6 +92,15 @@ class EngineContainer:
 
             self.SessionLocal: sessionmaker = SessionLocal
 
+            # aiosqlite engine on the same file, for the async session mode.
+            self.aengine = create_async_engine(f"{ASYNCENGINE}{db_name}", echo=False)
+            apply_profile(self.aengine.sync_engine, self.profile)
+            query_profiler.attach(self.aengine.sync_engine, f"{db_name} (aio)")
+            self.make_async_sessions()
+            self.executor = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix="db_bridge"
+            )
+
             result = self.compare_db()
             gui.gprint(result)
 
@@ -73,9 +110,9 @@ class EngineContainer:
             gui.gprint("Connecting to ASYNCIO compatible engine variant.")
             db_name = self.database_name
             self.aengine = create_async_engine(f"{ASYNCENGINE}{db_name}", echo=False)
-            self.SessionAsyncLocal = async_sessionmaker(
-                bind=self.aengine, autocommit=False, autoflush=True
-            )
+            apply_profile(self.aengine.sync_engine, self.profile)
+            query_profiler.attach(self.aengine.sync_engine, db_name)
+            self.make_async_sessions()
             for base in self.bases:
                 async with self.aengine.begin() as conn:
                     await conn.run_sync(base.metadata.create_all)
@@ -90,6 +127,12 @@ class EngineContainer:
             for base in self.bases:
                 base.metadata.create_all(self.engine)
 
+    def set_profile(self, profile: Union[str, Dict[str, Any]]):
+        """Set the engine profile, this only takes effect before connecting."""
+        if self.connected:
+            gui.gprint("Engine already connected, profile will apply on reconnect.")
+        self.profile = profile
+
     def load_in_base(self, Base):
         gui.dprint("loading in: ", Base.__name__, Base)
         if Base not in self.bases:
@@ -99,6 +142,9 @@ class EngineContainer:
     def close(self):
         for i, v in self.sync_sessions.items():
             v.close()
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
         self.engine.dispose()
         self.connected = False
 
@@ -107,6 +153,10 @@ class EngineContainer:
             await self.aengine.dispose()
             gui.dprint("disposed")
             self.connected = False
+        elif self.connected:
+            if self.aengine:
+                await self.aengine.dispose()
+            self.close()
 
     def get_session(self, session_name: str = "any") -> Session:
         if session_name not in self.sync_sessions:
@@ -122,6 +172,34 @@ class EngineContainer:
         mysession = self.SessionAsyncLocal()
         return mysession
 
+    @asynccontextmanager
+    async def task_session(self) -> AsyncIterator[AsyncSession]:
+        """Get the AsyncSession for the current task.
+        Nested task_session blocks in the same task share one session,
+        which is closed when the outermost block exits."""
+        session = self.ScopedAsyncSession()
+        depth = _task_session_depth.get()
+        token = _task_session_depth.set(depth + 1)
+        try:
+            yield session
+        finally:
+            _task_session_depth.reset(token)
+            if depth == 0:
+                await self.ScopedAsyncSession.remove()
+
+    async def run_sync(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Run fn(session, *args, **kwargs) in the database executor with a fresh
+        sync session, committing if it returns without error."""
+
+        def bridge():
+            with self.SessionLocal() as session:
+                result = fn(session, *args, **kwargs)
+                session.commit()
+                return result
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, bridge)
+
     def compare_db(self):
         """compare current metadata with sqlalchemy metadata"""
 
@@ -166,6 +244,14 @@ class DatabaseSingleton:
                 engine = EngineContainer(db_name, mode)
                 self.engines[ename] = engine
 
+        def set_profile(self, profile: Union[str, Dict[str, Any]], ename=None):
+            if ename:
+                if ename in self.engines:
+                    self.engines[ename].set_profile(profile)
+            else:
+                for en in self.engines.keys():
+                    self.engines[en].set_profile(profile)
+
         def load_in_base(self, Base, ename=None):
             gui.dprint("loading in: ", Base.__name__, Base)
             if ename:
@@ -202,10 +288,7 @@ class DatabaseSingleton:
 
         async def close_async(self):
             for en, val in self.engines.items():
-                if val.async_mode:
-                    await val.close_async()
-                else:
-                    val.close()
+                await val.close_async()
 
         def get_session(self, mode: str = "any") -> Session:
             for en, val in self.engines.items():
@@ -222,6 +305,11 @@ class DatabaseSingleton:
                 if val.async_mode:
                     return val.get_async_session()
 
+        def get_main_engine(self) -> EngineContainer:
+            for en, val in self.engines.items():
+                if not val.async_mode:
+                    return val
+
     _instance: _DatabaseSingleton = None
 
     def __init__(self, arg, **kwargs):
@@ -253,6 +341,11 @@ class DatabaseSingleton:
         """load a declarative base to a specific engine."""
         self._instance.load_in_base(Base, ename)
 
+    def set_profile(self, profile: Union[str, Dict[str, Any]], ename: str = None):
+        """Set the sqlite engine profile for all engines, or a specific engine.
+        Must be called before startup_all."""
+        self._instance.set_profile(profile, ename)
+
     # Use a static method to get the singleton instance.
 
     @staticmethod
@@ -289,6 +382,27 @@ class DatabaseSingleton:
         session = inst.get_async_session()
         return session
 
+    @staticmethod
+    def get_main_async_session() -> AsyncSession:
+        """Get a new AsyncSession bound to the main database."""
+        inst = DatabaseSingleton.get_instance()
+        return inst.get_main_engine().get_async_session()
+
+    @staticmethod
+    def task_session():
+        """Async context manager for the current task's AsyncSession on the main database.
+        Usage: `async with DatabaseSingleton.task_session() as session:`"""
+        inst = DatabaseSingleton.get_instance()
+        return inst.get_main_engine().task_session()
+
+    @staticmethod
+    async def run_sync(fn: Callable[..., T], *args, **kwargs) -> T:
+        """Executor bridge for legacy sync database code.
+        fn gets a fresh sync Session as it's first argument, and runs off the event loop.
+        """
+        inst = DatabaseSingleton.get_instance()
+        return await inst.get_main_engine().run_sync(fn, *args, **kwargs)
+
 
 class DSCTX:
     def __init__(self):
@@ -1,9 +1,9 @@
-from sqlalchemy import MetaData, select
+from sqlalchemy import MetaData, Table, delete, func, select
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from sqlalchemy.dialects.sqlite import insert
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from sqlalchemy.sql.expression import Insert
 
 
@@ -83,3 +83,38 @@ async def get_entries_in_batches(session, model_class, filter_condition, batch_s
         yield entries_batch
         offset += batch_size
         entries_batch = query.offset(offset).limit(batch_size).all()
+
+
+# Stay well under SQLite's bound parameter limit for IN lists.
+IN_CHUNK = 500
+
+
+def purge_rows_in(
+    session: Session,
+    targets: List[Tuple[Table, str]],
+    ids: List[int],
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """
+    For each (table, column) in targets, count and delete every row where column
+    is in ids, using one DELETE ... WHERE column IN (...) per table
+    (split into chunks of IN_CHUNK ids).
+    Nothing is committed, so the caller controls the transaction.
+    Returns a dictionary of table names to the number of matching rows.
+    """
+    report = {}
+    for table, column_name in targets:
+        column = table.columns[column_name]
+        count = 0
+        for i in range(0, len(ids), IN_CHUNK):
+            chunk = ids[i : i + IN_CHUNK]
+            if dry_run:
+                count += session.execute(
+                    select(func.count()).select_from(table).where(column.in_(chunk))
+                ).scalar()
+            else:
+                count += session.execute(
+                    delete(table).where(column.in_(chunk))
+                ).rowcount
+        report[table.name] = count
+    return report
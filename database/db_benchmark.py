@@ -0,0 +1,142 @@
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Integer,
+    String,
+    create_engine,
+    insert,
+    select,
+)
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from .database_profiles import ENGINE_PROFILES, apply_profile
+
+"""
+Benchmark for the sqlite engine profiles.
+
+Run with `python -m database.db_benchmark`.
+
+Uses throwaway copies of the ArchivedRPMessage and StarboardEntryTable
+layouts in a temporary directory, so it never touches saveData.
+Reports archive insert throughput (batched inserts, one commit per batch)
+and starboard write latency (a read, an update, and a commit per reaction).
+"""
+
+BenchBase = declarative_base(name="Engine Profile Benchmark")
+
+
+class BenchArchivedMessage(BenchBase):
+    __tablename__ = "bench_archived_rp_message"
+    message_id = Column(Integer, primary_key=True)
+    server_id = Column(Integer, primary_key=True)
+    author = Column(String)
+    avatar = Column(String)
+    content = Column(String)
+    channel = Column(String)
+    category = Column(String)
+    posted_url = Column(String)
+    channel_sep_id = Column(Integer, nullable=True)
+    is_active = Column(Boolean, default=False)
+
+
+class BenchStarboardEntry(BenchBase):
+    __tablename__ = "bench_starboard_entry"
+    message_id = Column(BigInteger, primary_key=True)
+    guild_id = Column(BigInteger, nullable=False)
+    channel_id = Column(BigInteger, nullable=True)
+    total = Column(Integer, nullable=False, default=0)
+
+
+def bench_archive_inserts(engine, rows: int, batch: int) -> float:
+    """Insert `rows` archive messages in batches, return rows per second."""
+    data = [
+        {
+            "message_id": i,
+            "server_id": 1,
+            "author": f"user{i % 50}",
+            "avatar": "https://cdn.discordapp.com/avatar.png",
+            "content": "lorem ipsum dolor sit amet " * 8,
+            "channel": "roleplay",
+            "category": "rp",
+            "posted_url": None,
+            "channel_sep_id": None,
+            "is_active": False,
+        }
+        for i in range(rows)
+    ]
+    start = time.perf_counter()
+    for offset in range(0, rows, batch):
+        with engine.begin() as conn:
+            conn.execute(insert(BenchArchivedMessage), data[offset : offset + batch])
+    elapsed = time.perf_counter() - start
+    return rows / elapsed
+
+
+def bench_starboard_writes(engine, writes: int) -> Dict[str, float]:
+    """Simulate one reaction per write on a small set of entries.
+    Each write gets its own session and commit, like StarboardCog."""
+    SessionLocal = sessionmaker(bind=engine)
+    with SessionLocal() as session:
+        session.add_all(
+            [BenchStarboardEntry(message_id=i, guild_id=1, total=0) for i in range(50)]
+        )
+        session.commit()
+    latencies: List[float] = []
+    for i in range(writes):
+        start = time.perf_counter()
+        with SessionLocal() as session:
+            entry = session.execute(
+                select(BenchStarboardEntry).filter_by(message_id=i % 50)
+            ).scalar_one()
+            entry.total += 1
+            session.commit()
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    latencies.sort()
+    return {
+        "mean_ms": statistics.fmean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    }
+
+
+def run_profile(profile: str, rows: int, batch: int, writes: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        apply_profile(engine, profile)
+        BenchBase.metadata.create_all(engine)
+        result = {"profile": profile}
+        result["archive_rows_per_s"] = bench_archive_inserts(engine, rows, batch)
+        result.update(bench_starboard_writes(engine, writes))
+        engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sqlite engine profiles.")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--profiles", nargs="*", default=list(ENGINE_PROFILES.keys()))
+    args = parser.parse_args()
+    print(
+        f"{'profile':<12}{'archive rows/s':>16}{'star mean ms':>14}"
+        f"{'star p50 ms':>13}{'star p99 ms':>13}"
+    )
+    for profile in args.profiles:
+        r = run_profile(profile, args.rows, args.batch, args.writes)
+        print(
+            f"{r['profile']:<12}{r['archive_rows_per_s']:>16.0f}"
+            f"{r['mean_ms']:>14.3f}{r['p50_ms']:>13.3f}{r['p99_ms']:>13.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
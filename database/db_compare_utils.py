@@ -49,6 +49,18 @@ def _get_tables_meta(db_meta: MetaData, merged: MetaData):
     return db_meta.tables, merged.tables
 
 
+def _table_names(tables1, tables2, metadatas):
+    """Every table name in either side, minus tables made outside sqlalchemy.
+    A base can list their name prefixes in metadata.info["unmapped_tables"],
+    like an FTS5 index and its shadow tables."""
+    skip = tuple(
+        prefix
+        for metadata in metadatas
+        for prefix in metadata.info.get("unmapped_tables", ())
+    )
+    return [name for name in set(tables1) | set(tables2) if not name.startswith(skip)]
+
+
 async def _async_handle_missing_columns(
     table_name, missing_columns_table1, missing_columns_table2, session, table2, engine
 ):
@@ -170,7 +182,7 @@ def compare_db(self):
     result = ""
     session = self.get_session()
 
-    for table_name in set(tables1) | set(tables2):
+    for table_name in _table_names(tables1, tables2, mt):
         result += _compare_tables(
             table_name, tables1, tables2, insp, session, self.engine
         )
@@ -191,7 +203,7 @@ async def async_compare_db(self):
 
     result = ""
     async with self.get_async_session() as session:
-        for table_name in set(tables1) | set(tables2):
+        for table_name in _table_names(tables1, tables2, mt):
             result += await _async_compare_tables(
                 table_name, tables1, tables2, session, self.aengine
             )
@@ -0,0 +1,202 @@
+import logging
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, List
+
+import greenlet
+from sqlalchemy import Engine, event
+
+"""
+Query profiler for the database engines.
+
+Every statement run through an engine the profiler is attached to is normalized
+into a fingerprint (literals and IN lists collapsed), and the count, total time,
+p99 time, and the code locations that ran it are recorded.
+
+Statements slower than the slow query threshold are logged to TCLogger.
+The profiler is off by default, so the event hooks only cost a flag check.
+"""
+
+logger = logging.getLogger("TCLogger")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_POSTCOMPILE = re.compile(r"\(__\[POSTCOMPILE_\w+\]\)")
+_WHITESPACE = re.compile(r"\s+")
+
+_SKIP_PATHS = (
+    sysconfig.get_paths()["stdlib"],
+    sysconfig.get_paths()["purelib"],
+    sysconfig.get_paths()["platlib"],
+    os.path.dirname(__file__) + os.sep + "query_profiler.py",
+    os.path.dirname(__file__) + os.sep + "database_session_decorators.py",
+)
+
+
+def fingerprint(statement: str) -> str:
+    """Normalize a SQL statement so the same query with different values matches."""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _POSTCOMPILE.sub("(?)", statement)
+    statement = _IN_LIST.sub("IN (...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def _is_app_frame(frame) -> bool:
+    filename = frame.f_code.co_filename
+    return not filename.startswith(_SKIP_PATHS) and not filename.startswith("<")
+
+
+def _format_frame(frame) -> str:
+    filename = os.path.relpath(frame.f_code.co_filename)
+    return f"{filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+
+def _app_frames(frame, depth: int, limit: int):
+    """Yield frames outside the standard library and site-packages."""
+    while frame is not None and depth < limit:
+        if _is_app_frame(frame):
+            yield frame
+        frame = frame.f_back
+        depth += 1
+
+
+def call_site(limit: int = 40, frames: int = 2) -> str:
+    """Get the first frames outside of the standard library,
+    site-packages, and this module, innermost first.
+    Two frames is usually enough to see which loop is causing an N+1 pattern."""
+    found = list(_app_frames(sys._getframe(2), 0, limit))[:frames]
+    # aiosqlite statements run in a child greenlet that doesn't link back to the
+    # caller, so walk the suspended parent greenlet's frames instead.
+    current = greenlet.getcurrent()
+    while len(found) < frames and current.parent is not None:
+        found.extend(_app_frames(current.parent.gr_frame, 0, limit))
+        current = current.parent
+    if not found:
+        return "unknown"
+    return " <- ".join(_format_frame(frame) for frame in found[:frames])
+
+
+class QueryStats:
+    """Timing statistics for one statement fingerprint."""
+
+    def __init__(self, fingerprint: str, sample_size: int = 1000):
+        self.fingerprint = fingerprint
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=sample_size)
+        self.callers: Counter = Counter()
+
+    def add(self, elapsed: float, caller: str):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.samples.append(elapsed)
+        self.callers[caller] += 1
+
+    def p99(self) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "total_ms": self.total * 1000.0,
+            "mean_ms": (self.total / self.count) * 1000.0 if self.count else 0.0,
+            "p99_ms": self.p99() * 1000.0,
+            "max_ms": self.max * 1000.0,
+            "callers": self.callers.most_common(5),
+        }
+
+
+class QueryProfiler:
+    """Collects QueryStats for every engine it's attached to."""
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_ms = 100.0
+        self.stats: Dict[str, QueryStats] = {}
+        self.lock = threading.Lock()
+        self.attached: List[str] = []
+
+    def configure(self, enabled: bool = None, slow_query_ms: float = None):
+        if enabled is not None:
+            self.enabled = enabled
+        if slow_query_ms is not None:
+            self.slow_query_ms = float(slow_query_ms)
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+    def attach(self, engine: Engine, label: str):
+        """Attach the timing hooks to a sync engine, or an AsyncEngine's sync_engine."""
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(
+            conn, cursor, statement, parameters, context, executemany
+        ):
+            if self.enabled:
+                conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(
+            conn, cursor, statement, parameters, context, executemany
+        ):
+            starts = conn.info.get("query_start_time")
+            if not starts:
+                return
+            elapsed = time.perf_counter() - starts.pop()
+            self.record(label, statement, elapsed)
+
+        self.attached.append(label)
+
+    def record(self, label: str, statement: str, elapsed: float):
+        key = f"[{label}] {fingerprint(statement)}"
+        caller = call_site()
+        with self.lock:
+            if key not in self.stats:
+                self.stats[key] = QueryStats(key)
+            self.stats[key].add(elapsed, caller)
+        if elapsed * 1000.0 >= self.slow_query_ms:
+            logger.warning(
+                "Slow query (%.1f ms) at %s: %s", elapsed * 1000.0, caller, key
+            )
+
+    def report(self, top: int = 20, sort: str = "total_ms") -> List[Dict[str, Any]]:
+        """Get the top fingerprints, sorted by total_ms, count, p99_ms, or max_ms."""
+        with self.lock:
+            entries = [stat.to_dict() for stat in self.stats.values()]
+        entries.sort(key=lambda e: e[sort], reverse=True)
+        return entries[:top]
+
+    def format_report(self, top: int = 20, sort: str = "total_ms") -> str:
+        lines = [
+            f"Query profile, {len(self.stats)} fingerprints, sorted by {sort}.",
+            f"Profiling is {'on' if self.enabled else 'off'}, slow query threshold {self.slow_query_ms} ms.",
+            "",
+        ]
+        for entry in self.report(top, sort):
+            lines.append(
+                f"{entry['count']} calls, total {entry['total_ms']:.1f} ms, "
+                f"mean {entry['mean_ms']:.2f} ms, p99 {entry['p99_ms']:.2f} ms, "
+                f"max {entry['max_ms']:.2f} ms"
+            )
+            lines.append(f"    {entry['fingerprint']}")
+            for caller, count in entry["callers"]:
+                lines.append(f"    {count}x {caller}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+query_profiler = QueryProfiler()
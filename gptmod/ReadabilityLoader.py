@@ -44,46 +44,58 @@ async def check_readability(jsenv, html, url):
     return rsult
 
 
-async def read_article_direct(jsenv, html, url):
-    myfile = await assetloader.JavascriptLookup.get_full_pathas(
-        "readwebpage.js", "WEBJS", jsenv
-    )
-    timeout = 30
-
-    htmls: str = str(html)
-
-    pythonObject = {"var": htmls, "url": url}
-
-    rsult = await myfile.read_webpage_html_direct(htmls, url, timeout=45)
-    output = await rsult.get_a("mark")
-    header = await rsult.get_a("orig")
-    serial = await header.get_dict_a()
-
+def simplify_markdown(output: str) -> str:
     simplified_text = output.strip()
     simplified_text = re.sub(r"(\n){4,}", "\n\n\n", simplified_text)
     simplified_text = re.sub(r"\n\n", "\n", simplified_text)
     simplified_text = re.sub(r" {3,}", "  ", simplified_text)
     simplified_text = simplified_text.replace("\t", "")
     simplified_text = re.sub(r"\n+(\s*\n)*", "\n", simplified_text)
-    return [simplified_text, serial]
+    return simplified_text
+
+
+async def _read_result(rsult):
+    output = await rsult.get_a("mark")
+    header = await rsult.get_a("orig")
+    serial = await header.get_dict_a()
+    return [simplify_markdown(output), serial]
+
+
+async def read_article_direct(jsenv, html, url):
+    """Run readability on already downloaded html.
+    jsenv may be a JSContext or a JSWorkerPool."""
+    htmls: str = str(html)
+
+    async def read(worker):
+        rsult = await worker.modules["WEBJS"].read_webpage_html_direct(
+            htmls, url, timeout=45
+        )
+        return await _read_result(rsult)
+
+    if isinstance(jsenv, assetloader.JSWorkerPool):
+        return await jsenv.run(read)
+    myfile = await assetloader.JavascriptLookup.get_full_pathas(
+        "readwebpage.js", "WEBJS", jsenv
+    )
+    rsult = await myfile.read_webpage_html_direct(htmls, url, timeout=45)
+    return await _read_result(rsult)
 
 
 async def read_article_async(jsenv, url, clearout=True):
+    """Have readability fetch and read url.
+    jsenv may be a JSContext or a JSWorkerPool."""
+
+    async def read(worker):
+        rsult = await worker.modules["WEBJS"].read_webpage_plain(url, timeout=45)
+        return await _read_result(rsult)
+
+    if isinstance(jsenv, assetloader.JSWorkerPool):
+        return await jsenv.run(read)
     myfile = await assetloader.JavascriptLookup.get_full_pathas(
         "readwebpage.js", "WEBJS", jsenv
     )
     rsult = await myfile.read_webpage_plain(url, timeout=45)
-    output = await rsult.get_a("mark")
-    header = await rsult.get_a("orig")
-    serial = await header.get_dict_a()
-
-    simplified_text = output.strip()
-    simplified_text = re.sub(r"(\n){4,}", "\n\n\n", simplified_text)
-    simplified_text = re.sub(r"\n\n", "\n", simplified_text)
-    simplified_text = re.sub(r" {3,}", "  ", simplified_text)
-    simplified_text = simplified_text.replace("\t", "")
-    simplified_text = re.sub(r"\n+(\s*\n)*", "\n", simplified_text)
-    return [simplified_text, serial]
+    return await _read_result(rsult)
 
 
 async def read_article_aw(jsenv, html, url):
@@ -128,16 +140,44 @@ def _build_metadata(soup: Any, url: str) -> dict:
     return metadata
 
 
-ScrapeResult = Tuple[str, BeautifulSoup, Dict[str, Any]]
+ScrapeResult = Tuple[str, Dict[str, Any], Union[Dict[str, Any], None]]
+
+
+def _parse_page(html: str, url: str, parser: str) -> Tuple[BeautifulSoup, dict]:
+    """Parse html and build its metadata.  This is slow, so it runs in a thread."""
+    souped = BeautifulSoup(html, parser)
+    return souped, _build_metadata(souped, url)
 
 
 class ReadableLoader(dl.WebBaseLoader):
+    """WebBaseLoader that downloads each page once, and hands the html
+    to readability instead of letting the JS bridge fetch it again.
+
+    Up to requests_per_second pages are fetched at once overall,
+    and at most per_domain_limit at once from any one domain."""
+
+    per_domain_limit = 2
+    # How many pages readability may work on at once in the JS bridge.
+    readability_limit = 4
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("requests_per_second", 8)
+        super().__init__(*args, **kwargs)
+        self.domain_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.filtered_domains = set()
+
+    def _domain_semaphore(self, url: str) -> asyncio.Semaphore:
+        domain = urlparse(url).netloc.lower()
+        if domain not in self.domain_semaphores:
+            self.domain_semaphores[domain] = asyncio.Semaphore(self.per_domain_limit)
+        return self.domain_semaphores[domain]
+
     async def _fetch_with_rate_limit(
         self, url: str, semaphore: asyncio.Semaphore
     ) -> str:
         # Extended from WebBaseLoader so that it will log the errors
         # using this app's logging system.
-        async with semaphore:
+        async with semaphore, self._domain_semaphore(url):
             try:
                 return await self._fetch(url)
             except Exception as e:
@@ -155,70 +195,67 @@ class ReadableLoader(dl.WebBaseLoader):
                 )
                 raise e
 
+    async def scrape_one(
+        self,
+        i: int,
+        e: int,
+        url: str,
+        fetch_semaphore: asyncio.Semaphore,
+        read_semaphore: asyncio.Semaphore,
+        parser: Union[str, None] = None,
+    ) -> Tuple[int, int, Union[ScrapeResult, Exception]]:
+        """Download url once, parse it in a thread, then run readability on the html."""
+        with Timer() as timer:
+            result = await self._fetch_with_rate_limit(url, fetch_semaphore)
+        if isinstance(result, Exception):
+            return i, e, result
+        gui.gprint(f"READ: Took {timer.get_time():.4f} seconds to fetch {e}.")
+
+        if parser is None:
+            parser = "xml" if url.endswith(".xml") else self.default_parser
+            self._check_parser(parser)
+        souped, metadata = await asyncio.to_thread(_parse_page, result, url, parser)
+        gui.gprint("attempting read of ", e, "length is", len(result))
+        try:
+            with Timer() as timer:
+                async with read_semaphore:
+                    if self.check_url_filter(url):
+                        # Filtered domains have custom fetching on the JS side.
+                        text, header = await read_article_normal(self.jsenv, url)
+                    else:
+                        text, header = await read_article_aw(self.jsenv, result, url)
+            gui.gprint(
+                f"READABILITY LOADER: Took {timer.get_time():.4f} seconds to convert {e} to readable."
+            )
+            return i, e, (remove_links(text), metadata, header)
+        except Exception as err:
+            gui.dprint(f"Error reading url{i}, str({str(err)})", err)
+            self.bot.logs.exception(err)
+            text = await asyncio.to_thread(souped.get_text, **self.bs_get_text_kwargs)
+            return i, e, (remove_links(text), metadata, None)
+
     async def scrape_all(
         self, urls: List[Tuple[int, str]], parser: Union[str, None] = None
     ) -> AsyncGenerator[Tuple[int, int, Union[ScrapeResult, Exception]], None]:
-        """Fetch all urls, then return soups for all results.
+        """Fetch, parse, and read all urls concurrently,
+        yielding each result as soon as it's ready.
         This function is an asyncronous generator."""
-
-        regular_urls = []
-
-        for e, url in urls:
-            regular_urls.append(url)
-
-        with Timer() as timer:
-            # call fetch with rate limit.
-            results = await self.fetch_all(regular_urls)
-        elapsed_time = timer.get_time()
-        gui.gprint(f"READ: Took {elapsed_time:.4f} seconds to gather {len(urls)}.")
-
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                yield i, urls[i][0], result
-                continue
-            url = regular_urls[i]
-            if parser is None:
-                if url.endswith(".xml"):
-                    parser = "xml"
-                else:
-                    parser = self.default_parser
-
-                self._check_parser(parser)
-
-            souped = BeautifulSoup(result, parser)
-            clean_html = re.sub(
-                r"<script\b[^<]*(?:(?!<\/script>)<[^<]*)*<\/script>", "", result
-            )
-            gui.gprint(
-                "attempting read of ",
-                urls[i][0],
-                "length is",
-                len(clean_html),
-                "and snippit",
-                clean_html.strip()[:100],
+        fetch_semaphore = asyncio.Semaphore(self.requests_per_second)
+        read_semaphore = asyncio.Semaphore(self.readability_limit)
+        tasks = [
+            asyncio.ensure_future(
+                self.scrape_one(i, e, url, fetch_semaphore, read_semaphore, parser)
             )
-            # readable = await check_readability(self.jsenv, clean_html, url)
-            # if not readable:  gui.dprint("Not readable link.")
+            for i, (e, url) in enumerate(urls)
+        ]
+        with Timer() as timer:
             try:
-                with Timer() as timer:
-                    text, header = await read_article_normal(self.jsenv, url)
-                    # if self.check_url_filter(url):text, header = await read_article_normal(self.jsenv, url)
-                    # else: text, header = await read_article_aw(  self.jsenv, clean_html, url)
-                elapsed_time = timer.get_time()
-                gui.gprint(
-                    f"READABILITY LOADER: Took {elapsed_time:.4f} seconds to convert {urls[i][0]} to readable."
-                )
-                # YIELD THIS:
-                out = (remove_links(text), souped, header)
-                yield i, urls[i][0], out
-
-            except Exception as e:
-                gui.dprint(f"Error reading url{i}, str({str(e)})", e)
-                self.bot.logs.exception(e)
-                text = souped.get_text(**self.bs_get_text_kwargs)
-                # YIELD THIS:
-                out = (remove_links(text), souped, None)
-                yield i, urls[i][0], out
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
+        gui.gprint(f"READ: Took {timer.get_time():.4f} seconds to read {len(urls)}.")
 
     def check_url_filter(self, url):
         parsed = urlparse(url)
@@ -290,7 +327,7 @@ class ReadableLoader(dl.WebBaseLoader):
         self, bot
     ) -> AsyncGenerator[Tuple[Union[List[Document], Exception], int, int], None]:
         """Load text from the urls in web_path async into Documents."""
-        self.jsenv = bot.jsenv
+        self.jsenv = getattr(bot, "jspool", None) or bot.jsenv
         self.bot = bot
         self.continue_on_failure = True
         self.load_filtered_domains()
@@ -305,11 +342,7 @@ class ReadableLoader(dl.WebBaseLoader):
                 yield result, e, -5
             else:
                 try:
-                    text, soup, header = result
-                    if soup:
-                        metadata = _build_metadata(soup, self.web_paths[i][1])
-                    else:
-                        metadata = {}
+                    text, metadata, header = result
                     typev = MetadataDocType.htmltext
 
                     if "title" not in metadata:
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables.config import run_in_executor
+
+import gui
+
+"""
+A persistent embedding cache that sits in front of any langchain Embeddings object.
+
+Vectors are stored in a local sqlite file, keyed by a sha256 of the
+model namespace, the embedding kind (document or query), and the text.
+Changing the model or its dimensions changes the namespace,
+so stale vectors are never returned for a different model.
+"""
+
+DEFAULT_CACHE_PATH = "saveData/embedding_cache.db"
+
+# Lookups are chunked to stay under SQLite's bound parameter limit.
+LOOKUP_CHUNK = 500
+
+
+def embedding_namespace(embed: Embeddings) -> str:
+    """Build a model-versioned namespace for an Embeddings object."""
+    model = getattr(embed, "model", None) or getattr(embed, "model_name", None)
+    dims = getattr(embed, "dimensions", None) or getattr(embed, "size", None)
+    name = f"{type(embed).__name__}:{model or 'unknown'}"
+    if dims:
+        name += f":{dims}"
+    return name
+
+
+def text_key(namespace: str, kind: str, text: str) -> str:
+    return hashlib.sha256(f"{namespace}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """sqlite storage for cached embedding vectors, safe to share between threads."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            "key TEXT PRIMARY KEY, namespace TEXT, vector BLOB, created REAL)"
+        )
+        self.conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self.lock:
+            for i in range(0, len(keys), LOOKUP_CHUNK):
+                chunk = keys[i : i + LOOKUP_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embedding_cache WHERE key IN ({marks})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, namespace: str, items: Dict[str, List[float]]):
+        now = time.time()
+        rows = [
+            (key, namespace, np.asarray(vec, dtype=np.float32).tobytes(), now)
+            for key, vec in items.items()
+        ]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache VALUES (?, ?, ?, ?)", rows
+            )
+            self.conn.commit()
+
+    def clear(self, namespace: Optional[str] = None):
+        with self.lock:
+            if namespace:
+                self.conn.execute(
+                    "DELETE FROM embedding_cache WHERE namespace = ?", (namespace,)
+                )
+            else:
+                self.conn.execute("DELETE FROM embedding_cache")
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+_instances: "weakref.WeakSet[CachedEmbeddings]" = weakref.WeakSet()
+
+
+def get_store(path: str = DEFAULT_CACHE_PATH) -> EmbeddingStore:
+    """Get the shared EmbeddingStore for path."""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = EmbeddingStore(path)
+        return _stores[path]
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only calls the underlying model for uncached texts.
+
+    Args:
+        underlying: The Embeddings object to wrap, such as OpenAIEmbeddings,
+            HuggingFaceEmbeddings, or a fake embedder for offline testing.
+        namespace: The model-versioned cache namespace.
+            Defaults to embedding_namespace(underlying).
+        store: The EmbeddingStore to use. Defaults to the shared store.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        namespace: Optional[str] = None,
+        store: Optional[EmbeddingStore] = None,
+    ):
+        self.underlying = underlying
+        self.namespace = namespace or embedding_namespace(underlying)
+        self.store = store or get_store()
+        self.hits = 0
+        self.misses = 0
+        _instances.add(self)
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _lookup(self, texts: List[str], kind: str):
+        keys = [text_key(self.namespace, kind, t) for t in texts]
+        found = self.store.get_many(list(set(keys)))
+        # Only embed each missing text once, even if it's repeated.
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in found:
+                self.hits += 1
+            else:
+                self.misses += 1
+                missing.setdefault(key, text)
+        return keys, found, missing
+
+    def _finish(self, keys, found, missing, vectors) -> List[List[float]]:
+        # Round to float32 like the store does, so a miss returns what a hit would.
+        new = {
+            key: np.asarray(vec, dtype=np.float32).tolist()
+            for key, vec in zip(missing.keys(), vectors)
+        }
+        if new:
+            self.store.put_many(self.namespace, new)
+            found.update(new)
+        return [found[k] for k in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._lookup(texts, "doc")
+        vectors = []
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+        return self._finish(keys, found, missing, vectors)
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, found, missing = self._lookup([text], "query")
+        vectors = []
+        if missing:
+            vectors = [self.underlying.embed_query(text)]
+        return self._finish(keys, found, missing, vectors)[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = await run_in_executor(None, self._lookup, texts, "doc")
+        vectors = []
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+        return await run_in_executor(None, self._finish, keys, found, missing, vectors)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, found, missing = await run_in_executor(
+            None, self._lookup, [text], "query"
+        )
+        vectors = []
+        if missing:
+            vectors = [await self.underlying.aembed_query(text)]
+        result = await run_in_executor(
+            None, self._finish, keys, found, missing, vectors
+        )
+        return result[0]
+
+    def log_stats(self):
+        gui.dprint(f"Embedding cache {self.namespace}: {self.stats()}")
+
+
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    """Get the hit/miss stats of every live CachedEmbeddings, by namespace."""
+    return {embed.namespace: embed.stats() for embed in list(_instances)}
@@ -0,0 +1,118 @@
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import lancedb
+import numpy as np
+
+from gptmod.lance_index import VECTOR_COLUMN, VectorIndexManager
+
+"""
+Recall and latency benchmark for the LanceDB vector indexes.
+
+Run with `python -m gptmod.lance_index_benchmark`.
+
+Builds a synthetic clustered corpus in a temporary directory, so it never
+touches saveData, then compares brute force search against the index the
+VectorIndexManager builds.  Recall@k is measured against the brute force
+results for the same queries.  By default the index is searched with the
+nprobes and refine_factor production uses, through VectorIndexManager.tune.
+"""
+
+
+def make_corpus(rows: int, dims: int, clusters: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dims)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    vectors = centers[labels] + 0.35 * rng.normal(size=(rows, dims)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def search_ids(table, query, k: int, manager: VectorIndexManager = None):
+    """Brute force search if manager is None, else an index search tuned by it."""
+    q = table.search(query, vector_column_name=VECTOR_COLUMN).limit(k)
+    if manager is None:
+        q = q.bypass_vector_index()
+    else:
+        q = manager.tune(q)
+    return [r["id"] for r in q.select(["id", "_distance"]).to_list()]
+
+
+def run_queries(table, queries, k, manager=None):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search_ids(table, query, k, manager))
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    latencies.sort()
+    return results, latencies
+
+
+def summarize(latencies):
+    return (
+        statistics.fmean(latencies),
+        latencies[len(latencies) // 2],
+        latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    )
+
+
+def main():
+    production = VectorIndexManager()
+    parser = argparse.ArgumentParser(description="Benchmark lance vector indexes.")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--dims", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-type", default="IVF_PQ")
+    parser.add_argument("--nprobes", type=int, nargs="*", default=[production.nprobes])
+    parser.add_argument("--refine", type=int, default=production.refine_factor)
+    args = parser.parse_args()
+
+    vectors = make_corpus(args.rows, args.dims, args.clusters)
+    queries = make_corpus(args.queries, args.dims, args.clusters, seed=1)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = lancedb.connect(os.path.join(tmp, "lance-db"))
+        table = db.create_table(
+            "bench",
+            data=[
+                {VECTOR_COLUMN: vectors[i], "id": str(i), "text": ""}
+                for i in range(args.rows)
+            ],
+        )
+        truth, brute_lat = run_queries(table, queries, args.k)
+
+        manager = VectorIndexManager()
+        manager.configure(min_rows=0, index_type=args.index_type)
+        start = time.perf_counter()
+        manager.check(table)
+        build_time = time.perf_counter() - start
+
+        print(f"{args.rows} rows, {args.dims} dims, {args.queries} queries, k={args.k}")
+        print(
+            f"{args.index_type} build: {build_time:.1f}s, refine_factor={args.refine}"
+        )
+        print(
+            f"production: nprobes={production.nprobes}, "
+            f"refine_factor={production.refine_factor}, "
+            f"index from {production.min_rows} rows"
+        )
+        print(f"{'search':<22}{'recall':>8}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        mean, p50, p99 = summarize(brute_lat)
+        print(f"{'brute force':<22}{1.0:>8.3f}{mean:>10.2f}{p50:>10.2f}{p99:>10.2f}")
+        for nprobes in args.nprobes:
+            manager.configure(nprobes=nprobes, refine_factor=args.refine)
+            found, lat = run_queries(table, queries, args.k, manager)
+            recall = statistics.fmean(
+                len(set(f) & set(t)) / args.k for f, t in zip(found, truth)
+            )
+            mean, p50, p99 = summarize(lat)
+            label = f"index nprobes={nprobes}"
+            print(f"{label:<22}{recall:>8.3f}{mean:>10.2f}{p50:>10.2f}{p99:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
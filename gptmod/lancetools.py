@@ -8,6 +8,7 @@ from typing import (
     Sequence,
     Tuple,
 )
+import threading
 import uuid
 import warnings
 
@@ -22,8 +23,11 @@ import numpy as np
 import lancedb
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import LanceDB
+from langchain_community.vectorstores.lancedb import to_lance_filter
 
 import gui
+from .embedding_cache import CachedEmbeddings, embedding_namespace
+from .lance_index import index_manager
 
 """
 Class extensions that assist with the LanceBD vector store.
@@ -34,6 +38,22 @@ Class extensions that assist with the LanceBD vector store.
 
 DocumentScoreVector = Tuple[Document, float]
 
+# Process wide registries, so each message doesn't pay for connection setup.
+# Connections are keyed by uri, embedding clients by model name,
+# stores by (uri, collection, embedding model) and table handles by (uri, table name).
+_registry_lock = threading.RLock()
+_connections: Dict[str, lancedb.DBConnection] = {}
+_embeddings: Dict[str, CachedEmbeddings] = {}
+_stores: Dict[Tuple[str, str, str], "LanceBetter"] = {}
+_tables: Dict[Tuple[str, str], Any] = {}
+
+
+def _embed_key(embed: Any) -> str:
+    """Registry key for an embedding client, from its model rather than its id(),
+    so fresh clients for the same model share a store."""
+    namespace = getattr(embed, "namespace", None) or embedding_namespace(embed)
+    return f"{type(embed).__name__}/{namespace}"
+
 
 def _results_to_docs_scores_emb(results: Any) -> List[DocumentScoreVector]:
     return [
@@ -55,10 +75,63 @@ class LanceTools:
     """Class full of static methods for simple Lance DB ops."""
 
     @staticmethod
-    def get_lance_client() -> lancedb.DBConnection:
-        """Create a new Lance client."""
-        client = lancedb.connect(uri="saveData/lance-db")
-        return client
+    def get_lance_client(path: str = "saveData") -> lancedb.DBConnection:
+        """Get the shared Lance client for path, connecting if needed."""
+        uri = f"{path}/lance-db"
+        with _registry_lock:
+            if uri not in _connections:
+                _connections[uri] = lancedb.connect(uri=uri)
+            return _connections[uri]
+
+    @staticmethod
+    def get_embedding(model: str = "text-embedding-3-small") -> CachedEmbeddings:
+        """Get the shared OpenAIEmbeddings client for model,
+        behind the persistent embedding cache."""
+        with _registry_lock:
+            if model not in _embeddings:
+                _embeddings[model] = CachedEmbeddings(OpenAIEmbeddings(model=model))
+            return _embeddings[model]
+
+    @staticmethod
+    def get_cached_table(client: lancedb.DBConnection, name: str) -> Any:
+        """Get a table handle from the shared cache, opening it if needed.
+        Returns None if the table does not exist."""
+        key = (client.uri, name)
+        with _registry_lock:
+            if key not in _tables:
+                try:
+                    _tables[key] = client.open_table(name)
+                except Exception as e:
+                    gui.dprint(e)
+                    return None
+            return _tables[key]
+
+    @staticmethod
+    def invalidate(collection: Optional[str] = None, path: Optional[str] = None):
+        """Drop cached table handles after a schema change, table creation or drop.
+        With no arguments, every cached table handle is dropped."""
+        uri = f"{path}/lance-db" if path else None
+        with _registry_lock:
+            for key in list(_tables.keys()):
+                if (collection is None or key[1] == collection) and (
+                    uri is None or key[0] == uri
+                ):
+                    del _tables[key]
+
+    @staticmethod
+    def maintain_indexes(path: str = "saveData") -> List[Dict[str, Any]]:
+        """Compact every table under path and build or update its vector index."""
+        client = LanceTools.get_lance_client(path)
+        results = []
+        for name in client.table_names():
+            table = LanceTools.get_cached_table(client, name)
+            if table is None:
+                continue
+            try:
+                results.append(index_manager.maintain(table))
+            except Exception as e:
+                gui.dprint(f"Could not maintain {name}: {e}")
+        return results
 
     @staticmethod
     async def get_async_client() -> lancedb.AsyncConnection:
@@ -84,19 +157,8 @@ class LanceTools:
         Returns:
             An instance of LanceBetter.
         """
-        if embed is None:
-            embed = OpenAIEmbeddings(model="text-embedding-3-small")
-        client = lancedb.connect(uri=f"{path}/lance-db")
-        vs = LanceBetter(
-            connection=client,
-            embedding=embed,
-            table_name=collection,
-            id_key="id",
-            vector_key="vector",
-            text_key="text",
-            mode="overwrite",
-        )
-        return vs
+        client = LanceTools.get_lance_client(path)
+        return LanceTools.configure_lance_client(client, collection, embed)
 
     @staticmethod
     def configure_lance_client(
@@ -119,23 +181,25 @@ class LanceTools:
             An instance of LanceBetter configured for the specified collection.
         """
         if embed is None:
-            embed = OpenAIEmbeddings(model="text-embedding-3-small")
-
-        vs = LanceBetter(
-            connection=client,
-            embedding=embed,
-            table_name=collection,
-            id_key="id",
-            vector_key="vector",
-            text_key="text",
-            mode="overwrite",
-        )
-        return vs
+            embed = LanceTools.get_embedding()
+        key = (client.uri, collection, _embed_key(embed))
+        with _registry_lock:
+            if key not in _stores:
+                _stores[key] = LanceBetter(
+                    connection=client,
+                    embedding=embed,
+                    table_name=collection,
+                    id_key="id",
+                    vector_key="vector",
+                    text_key="text",
+                    mode="overwrite",
+                )
+            return _stores[key]
 
 
 class LanceClient:
     def __init__(self, path):
-        client = lancedb.connect(uri="saveData/lance-db")
+        client = LanceTools.get_lance_client(path)
         self._data = {}
 
 
@@ -143,7 +207,35 @@ class LanceBetter(LanceDB):
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
         self.upsert_mode = True
-        self._data = {}
+
+    def _query(
+        self,
+        query: Any,
+        k: Optional[int] = None,
+        filter: Optional[Any] = None,
+        name: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """LanceDB._query, with the index manager's nprobes and refine_factor
+        on vector searches."""
+        if kwargs.get("query_type", "vector") != "vector":
+            return super()._query(query, k, filter=filter, name=name, **kwargs)
+        if k is None:
+            k = self.limit
+        tbl = self.get_table(name)
+        if isinstance(filter, dict):
+            filter = to_lance_filter(filter)
+        lance_query = tbl.search(query=query, vector_column_name=self._vector_key)
+        lance_query = index_manager.tune(lance_query.limit(k))
+        if metrics := kwargs.get("metrics"):
+            lance_query = lance_query.metric(metrics)
+        lance_query = lance_query.where(
+            filter, prefilter=kwargs.get("prefilter", False)
+        )
+        docs = lance_query.to_arrow()
+        if len(docs) == 0:
+            warnings.warn("No results found for the query.")
+        return docs
 
     def optimize_table(self, name: Optional[str] = None) -> None:
         table = self.get_table(name)
@@ -188,6 +280,7 @@ class LanceBetter(LanceDB):
 
         if tbl is None:
             tbl = self._connection.create_table(self._table_name, data=docs)
+            LanceTools.invalidate(self._table_name)
             self._table = tbl
         else:
             if self.api_key is None:
@@ -204,6 +297,7 @@ class LanceBetter(LanceDB):
                 tbl.add(docs)
 
         self._fts_index = None
+        index_manager.after_insert(tbl, len(docs))
 
         return ids
 
@@ -260,15 +354,7 @@ class LanceBetter(LanceDB):
                 _name = name
         else:
             _name = self._table_name
-        try:
-            if _name in self._data:
-                return self._data[_name]
-            tab = self._connection.open_table(_name)
-            self._data[_name] = tab
-            return tab
-        except Exception as e:
-            print(e)
-            return None
+        return LanceTools.get_cached_table(self._connection, _name)
 
     def get_metadata(self, results, inc: List[str] = []) -> List[Dict[str, Any]]:
         """
@@ -287,15 +373,12 @@ class LanceBetter(LanceDB):
         exclude = {self._vector_key, self._id_key, self._text_key}
         exclude.update(inc)
 
-        metadata_rows = []
-        for idx in range(len(results)):
-            metadata = {
-                key: results[key][idx].as_py()
-                for key in results.schema.names
-                if key not in exclude
-            }
-            metadata_rows.append(metadata)
-        return metadata_rows
+        # Convert whole columns at once, then zip them into rows.
+        keys = [key for key in results.schema.names if key not in exclude]
+        if not keys:
+            return [{} for _ in range(len(results))]
+        columns = [results.column(key).to_pylist() for key in keys]
+        return [dict(zip(keys, row)) for row in zip(*columns)]
 
     def results_to_docs(self, results: Any, score: bool = False) -> Any:
         columns = results.schema.names
@@ -311,33 +394,33 @@ class LanceBetter(LanceDB):
         # aren't wrapped in a struct.
 
         metadata_list = self.get_metadata(results)
+        texts = results.column(self._text_key).to_pylist()
+        docs = [
+            Document(page_content=text, metadata=metadata)
+            for text, metadata in zip(texts, metadata_list)
+        ]
 
         if score_col is None or not score:
-            return [
-                Document(
-                    page_content=results[self._text_key][idx].as_py(),
-                    metadata=metadata_list[idx],
-                )
-                for idx in range(len(results))
-            ]
-        else:
-            return [
-                (
-                    Document(
-                        page_content=results[self._text_key][idx].as_py(),
-                        metadata=metadata_list[idx],
-                    ),
-                    results[score_col][idx].as_py(),
-                )
-                for idx in range(len(results))
-            ]
+            return docs
+        return list(zip(docs, results.column(score_col).to_pylist()))
 
-    async def aget_by_ids(self, tablestr: str, ids: Sequence[str]) -> List[Document]:
+    def get_by_ids_in(self, tablestr: str, ids: Sequence[str]) -> List[Document]:
+        """Get every document in tablestr whose id is in ids, with one IN filter."""
         table = self.get_table(tablestr)
-        ids_filter = " OR ".join(f"id = '{id_}'" for id_ in ids)
-        outputs = table.search().where(ids_filter).limit(20).to_arrow()
-        docs = self.results_to_docs(outputs, score=False)
-        return docs
+        ids = list(dict.fromkeys(ids))
+        if table is None or not ids:
+            return []
+        quoted = ", ".join("'" + str(id_).replace("'", "''") + "'" for id_ in ids)
+        outputs = (
+            table.search()
+            .where(f"{self._id_key} IN ({quoted})")
+            .limit(len(ids))
+            .to_arrow()
+        )
+        return self.results_to_docs(outputs, score=False)
+
+    async def aget_by_ids_in(self, tablestr: str, ids: Sequence[str]) -> List[Document]:
+        return await run_in_executor(None, self.get_by_ids_in, tablestr, ids)
 
     def get(
         self, filter: Optional[Any] = None, limit: Optional[int] = None
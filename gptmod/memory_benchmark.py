@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import random
+import time
+
+from langchain_core.documents import Document
+
+import gptmod.util as util
+from gptmod.sentence_mem import budget_documents, group_documents
+
+"""
+Benchmark for grouping recalled memories into a token budget.
+
+Run with `python -m gptmod.memory_benchmark`.
+
+Compares the old approach, which re-tokenized the whole accumulated context
+after every document, with budget_documents, which counts each document once.
+"""
+
+WORDS = (
+    "the quick brown fox jumped over lazy frog memory recall sentence guild "
+    "user channel message reply context token budget split source"
+).split()
+
+
+def make_memories(count: int, sources: int, seed: int = 0):
+    rng = random.Random(seed)
+    docs = []
+    for i in range(count):
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+        docs.append(
+            Document(
+                page_content=f"{sentence} ({i}).",
+                metadata={"source": f"https://discord.com/{i % sources}", "split": i},
+            )
+        )
+    return docs
+
+
+def legacy_budget(docs, max_tokens: int):
+    """The old quadratic loop, kept here for comparison."""
+    sources = {}
+    context = ""
+    for doc in docs:
+        source, split = doc.metadata["source"], doc.metadata["split"]
+        sources.setdefault(source, {})[split] = doc
+        if doc.page_content not in context:
+            context += doc.page_content + "  "
+        tokens = util.num_tokens_from_messages(
+            [{"role": "system", "content": context}], "gpt-5-mini"
+        )
+        if tokens >= max_tokens:
+            break
+    return sources
+
+
+def timed(fn, *args, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory grouping.")
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--sources", type=int, default=40)
+    parser.add_argument("--max-tokens", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    docs = make_memories(args.docs, args.sources)
+    old = legacy_budget(docs, args.max_tokens)
+    new = budget_documents(docs, args.max_tokens)
+    same = {s: sorted(d) for s, d in old.items()} == {
+        s: sorted(d) for s, d in new.items()
+    }
+
+    util._count_tokens.cache_clear()
+    cold = timed(budget_documents, docs, args.max_tokens, repeat=1)
+    warm = timed(budget_documents, docs, args.max_tokens, repeat=args.repeat)
+    legacy = timed(legacy_budget, docs, args.max_tokens, repeat=1)
+    start = time.perf_counter()
+    asyncio.run(group_documents(docs, args.max_tokens))
+    grouped = (time.perf_counter() - start) * 1000.0
+
+    print(f"{args.docs} memories across {args.sources} sources")
+    print(f"same grouping as legacy: {same}")
+    print(f"legacy budget:        {legacy:10.2f} ms")
+    print(f"budget_documents cold:{cold:10.2f} ms")
+    print(f"budget_documents warm:{warm:10.2f} ms")
+    print(f"group_documents:      {grouped:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
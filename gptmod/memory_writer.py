@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+import gui
+
+"""
+Background writer for the long term memory collections.
+
+Embedding and inserting documents is slow, so instead of calling
+add_documents on the event loop, callers queue documents here.
+A single worker task drains the queue, coalesces documents from many
+messages into one batch per collection, and runs the embed-and-insert
+in a thread.
+"""
+
+
+class MemoryWriter:
+    """Queue that batches add_documents calls off the event loop.
+
+    Args:
+        max_batch: The most documents to write in one add_documents call.
+        linger: Seconds to wait for more documents before writing a batch.
+    """
+
+    def __init__(self, max_batch: int = 256, linger: float = 0.5):
+        self.max_batch = max_batch
+        self.linger = linger
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.closing = False
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.lags: Deque[float] = deque(maxlen=200)
+
+    def _ensure_worker(self):
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run())
+
+    def enqueue(self, coll: Any, docs: List[Document]):
+        """Queue docs to be added to the collection coll."""
+        if not docs:
+            return
+        if self.closing:
+            raise RuntimeError("The memory writer is shutting down.")
+        self._ensure_worker()
+        self.queue.put_nowait((coll, list(docs), time.monotonic()))
+
+    def pending(self) -> int:
+        return self.queue.qsize() if self.queue else 0
+
+    async def _collect(self) -> List[Tuple[Any, List[Document], float]]:
+        """Wait for one item, then gather more until max_batch or linger runs out."""
+        items = [await self.queue.get()]
+        count = len(items[0][1])
+        deadline = time.monotonic() + self.linger
+        while count < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout <= 0 or self.closing:
+                    item = self.queue.get_nowait()
+                else:
+                    item = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            items.append(item)
+            count += len(item[1])
+        return items
+
+    async def _run(self):
+        while True:
+            items = await self._collect()
+            # Group by collection, and let later writes of the same id win.
+            by_coll: Dict[int, Tuple[Any, Dict[str, Document]]] = {}
+            for coll, docs, _ in items:
+                _, merged = by_coll.setdefault(id(coll), (coll, {}))
+                for doc in docs:
+                    merged[doc.id or str(id(doc))] = doc
+            for coll, merged in by_coll.values():
+                try:
+                    await asyncio.to_thread(coll.add_documents, list(merged.values()))
+                    self.written += len(merged)
+                    self.batches += 1
+                except Exception as e:
+                    self.failed += len(merged)
+                    gui.dprint(f"Memory write failed: {e}")
+            now = time.monotonic()
+            for _, _, queued_at in items:
+                lag = now - queued_at
+                self.lags.append(lag)
+                self.last_lag = lag
+                self.max_lag = max(self.max_lag, lag)
+            for _ in items:
+                self.queue.task_done()
+
+    async def flush(self):
+        """Wait until everything queued so far has been written."""
+        if self.queue is not None:
+            await self.queue.join()
+
+    async def close(self, timeout: float = 30.0):
+        """Flush the queue, then stop the worker."""
+        self.closing = True
+        try:
+            await asyncio.wait_for(self.flush(), timeout=timeout)
+        except asyncio.TimeoutError:
+            gui.dprint(f"Memory writer closed with {self.pending()} batches unwritten.")
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+    def stats(self) -> Dict[str, float]:
+        lags = sorted(self.lags)
+        return {
+            "pending": self.pending(),
+            "written": self.written,
+            "batches": self.batches,
+            "failed": self.failed,
+            "last_lag": self.last_lag,
+            "p50_lag": lags[len(lags) // 2] if lags else 0.0,
+            "max_lag": self.max_lag,
+        }
+
+
+memory_writer = MemoryWriter()
@@ -4,7 +4,7 @@ Functions for a lancedb based memory for the gptfunctions.
 
 import copy
 import uuid
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List
 
 import discord
 from discord.ext import commands
@@ -15,6 +15,7 @@ from langchain_core.documents import Document
 import threading
 import gptmod.util as util
 import gui
+from .memory_writer import memory_writer
 
 from utility.debug import Timer
 
@@ -74,8 +75,11 @@ def warmup():
     gui.gprint("Starting embedding model.")
     with Timer() as timer:
         from langchain_huggingface import HuggingFaceEmbeddings
+        from .embedding_cache import CachedEmbeddings
 
-        hug_embed = HuggingFaceEmbeddings(model_name="thenlper/gte-small")
+        hug_embed = CachedEmbeddings(
+            HuggingFaceEmbeddings(model_name="thenlper/gte-small")
+        )
         hug_embed.embed_query("The quick brown fox jumped over the lazy frog.")
     gui.gprint("embedding model loaded in", timer.get_time())
     return hug_embed
@@ -172,24 +176,35 @@ def split_document(doc: Document, present_mem=""):
     return newdata
 
 
-async def group_documents(docs: List[Document], max_tokens=3000):
-    sources: Dict[str : Dict[int, Any]] = {}
-    context = ""
-    for e, tup in enumerate(docs):
-        doc = tup
+# Tokens added by num_tokens_from_messages around a single system message.
+MESSAGE_OVERHEAD_TOKENS = 3 + 1 + 3
+
+
+def budget_documents(
+    docs: Iterable[Document], max_tokens: int = 3000, model: str = "gpt-5-mini"
+) -> Dict[str, Dict[int, Document]]:
+    """Sort docs into a dictionary of source -> split -> doc until max_tokens is hit.
+
+    Each distinct page_content is counted once through util.count_tokens,
+    and the budget is a running total, so this is linear in len(docs).
+    The doc that crosses the budget is still included."""
+    sources: Dict[str, Dict[int, Document]] = {}
+    seen = set()
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    for doc in docs:
         source, split = doc.metadata["source"], doc.metadata["split"]
-        if source not in sources:
-            sources[source] = {}
-        sources[source][split] = doc
-        if doc.page_content not in context:
-            gui.gprint(doc.page_content)
-            context += doc.page_content + "  "
-        tokens = util.num_tokens_from_messages(
-            [{"role": "system", "content": context}], "gpt-5-mini"
-        )
+        sources.setdefault(source, {})[split] = doc
+        if doc.page_content not in seen:
+            seen.add(doc.page_content)
+            tokens += util.count_tokens(doc.page_content + "  ", model)
         if tokens >= max_tokens:
             gui.gprint("token break")
             break
+    return sources
+
+
+async def group_documents(docs: List[Document], max_tokens=3000):
+    sources = budget_documents(docs, max_tokens)
 
     out_list = []
     for source, d in sources.items():
@@ -268,7 +283,7 @@ class SentenceMemory:
                 f"url:[{str(uuid.uuid5(uuid.NAMESPACE_DNS, source))}],sid:[{split + 1}]"
             )
 
-        doc1 = await self.coll.aget_by_ids("sentence_mem", list(ids))
+        doc1 = await self.coll.aget_by_ids_in("sentence_mem", list(ids))
         return doc1
         gui.gprint(zip(doc1["documents"], doc1["metadatas"]))
         if doc1:
@@ -304,8 +319,7 @@ class SentenceMemory:
             doc.id = f"url:[{str(uuid.uuid5(uuid.NAMESPACE_DNS, doc.metadata['source']))}],sid:[{doc.metadata['split']}]"
             newdocs.append(doc)
         if docs:
-            outs = self.coll.add_documents(newdocs)
-            gui.gprint(outs)
+            memory_writer.enqueue(self.coll, newdocs)
 
     async def add_list_to_mem(
         self,
@@ -334,7 +348,7 @@ class SentenceMemory:
             docs.append(doc)
 
         if docs:
-            self.coll.add_documents(docs)
+            memory_writer.enqueue(self.coll, docs)
 
     async def search_sim(self, message: discord.Message) -> List[DocumentScoreVector]:
         persist = "saveData"
@@ -1,3 +1,4 @@
+import functools
 import tiktoken
 import json
 
@@ -51,6 +52,27 @@ def num_tokens_from_messages(messages, model="gpt-3.5-turbo-0125"):
     return num_tokens
 
 
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str) -> tiktoken.Encoding:
+    """Get the tiktoken encoding for model, falling back to cl100k_base."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@functools.lru_cache(maxsize=20000)
+def _count_tokens(text: str, encoding_name: str) -> int:
+    return len(tiktoken.get_encoding(encoding_name).encode(text))
+
+
+def count_tokens(text: str, model: str = "gpt-5-mini") -> int:
+    """Count the tokens in text.
+    Counts are cached per text and encoding, so recounting the same
+    memory on every recall is a dictionary lookup."""
+    return _count_tokens(text, get_encoding(model).name)
+
+
 from json.decoder import JSONDecodeError
 
 
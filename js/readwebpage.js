@@ -160,7 +160,11 @@ async function read_webpage_html_direct(htmldoc, targeturl) {
     return { 'mark': 'bad link', 'orig': article };
   }
   if (c.t == 'all') {
-    return c['o'];
+    return { 'mark': c.o.mark, 'orig': c.o.article };
+  }
+  if (c.t == 'html') {
+    //The filter replaced the html.
+    html2 = c['o'];
   }
 
   function isValidLink(url) {
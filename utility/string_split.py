@@ -0,0 +1,176 @@
+import functools
+import re
+from typing import Callable, Union
+
+"""
+The string splitter behind prioritized_string_split.
+
+Each piece is measured once when it's split off, and clusters keep a running
+total instead of re-measuring the whole cluster every time something is added.
+This keeps splitting linear even when length is a tokenizer.
+
+Length functions with a fixed overhead, such as a token counter that wraps the
+text in a prompt, are handled by measuring the empty string once and treating
+that as the overhead of every measurement.
+"""
+
+
+class StringSplitter:
+    """Splits and clusters strings against a character or token budget.
+
+    Args:
+        length: The function used to measure strings.  Defaults to len.
+    """
+
+    def __init__(self, length: Callable[[str], int] = len):
+        self.length = length
+        self.overhead = 0 if length is len else length("")
+
+    def measure(self, text: str) -> int:
+        """Length of text without the fixed overhead."""
+        return self.length(text) - self.overhead
+
+    def cluster(
+        self,
+        input_string: str,
+        max_cluster_size: int,
+        split_substring: Union[str, re.Pattern],
+    ) -> list[str]:
+        # There's no reason to split if input is already less than max_cluster_size
+        if self.length(input_string) < max_cluster_size:
+            return [input_string]
+
+        split_by = split_substring
+        is_regex = isinstance(split_substring, re.Pattern)
+        if is_regex:
+            substrings = [r for r in split_substring.split(input_string) if r]
+        else:
+            if "%s" not in split_substring:
+                split_by = "%s" + split_by
+            substrings = input_string.split(split_by.replace("%s", ""))
+
+        # Nothing to split on.
+        if len(substrings) < 2:
+            return [input_string]
+
+        clusters = []
+        overhead = self.overhead
+        current = [substrings[0]]
+        current_size = self.measure(substrings[0])
+        for substring in substrings[1:]:
+            if not is_regex:
+                new_string = split_by.replace("%s", substring, 1)
+            else:
+                new_string = substring
+            piece = self.measure(new_string)
+            # Same test as length(cluster) + length(new_string) <= max_cluster_size
+            if overhead + current_size + overhead + piece <= max_cluster_size:
+                current.append(new_string)
+                current_size += piece
+            else:
+                joined = "".join(current)
+                if joined:
+                    clusters.append(joined)
+                current, current_size = [], 0
+                if substring:
+                    current, current_size = [new_string], piece
+        joined = "".join(current)
+        if joined:
+            clusters.append(joined)
+        return clusters
+
+    def split(
+        self,
+        input_string: str,
+        substring_split_order: list,
+        default_max_len: int = 1024,
+        trim: bool = False,
+    ) -> list[str]:
+        current_clusters = [input_string]
+        for arg in substring_split_order:
+            if isinstance(arg, (str, re.Pattern)):
+                s, max_len = arg, None
+            elif len(arg) == 1:
+                s, max_len = arg[0], None
+            else:
+                s, max_len = arg
+            max_len = max_len or default_max_len
+            new_splits = []
+            for cluster in current_clusters:
+                new_splits.extend(self.cluster(cluster, max_len, s))
+            current_clusters = new_splits
+
+        if trim:
+            current_clusters = [cluster.strip() for cluster in current_clusters]
+        return current_clusters
+
+
+def token_length(encoding_name: str = "o200k_base") -> Callable[[str], int]:
+    """Get a cached tiktoken length function, for splitting on a token budget."""
+    import tiktoken
+
+    encoding = tiktoken.get_encoding(encoding_name)
+
+    @functools.lru_cache(maxsize=4096)
+    def length(text: str) -> int:
+        return len(encoding.encode(text))
+
+    return length
+
+
+def split_and_cluster_strings(
+    input_string: str, max_cluster_size: int, split_substring: str, length=len
+) -> list[str]:
+    """
+    Split up the input_string by the split_substring
+    and group the resulting substrings into
+    clusters of about max_cluster_size length.
+    Return the list of clusters.
+
+    Args:
+    input_string (str): The string to be split and clustered.
+    max_cluster_size (int): The preferred maximum length of each cluster.
+    split_substring (str): The substring used to split the input_string.
+    length(Callable):  function to determine string length with.
+
+    Returns:
+    list[str]: A list of clusters.
+    """
+    return StringSplitter(length).cluster(
+        input_string, max_cluster_size, split_substring
+    )
+
+
+def prioritized_string_split(
+    input_string: str,
+    substring_split_order: list[Union[str, tuple[str, int]]],
+    default_max_len: int = 1024,
+    trim=False,
+    length=len,
+) -> list[str]:
+    """
+    Segment the input string based on the delimiters specified in `substring_split_order`.
+    Then, concatenate these segments to form a sequence of grouped strings,
+    ensuring that no cluster surpasses a specified maximum length.
+    The maximum length for each cluster addition
+    can be individually adjusted along with the list of delimiters.
+
+
+    Args:
+        input_string (str): The string to be split.
+        substring_split_order (list[Union[str, tuple[str, int]]]):
+            A list of strings or tuples containing
+            the delimiters to split by and their max lengths.
+            If an argument here is "%s\\n", then the input string will be split by "\\n" and will
+            place the relevant substrings in the position given by %s.
+        default_max_len (int): The maximum length a string in a cluster may be if not given
+            within a specific tuple for that delimiter.
+        trim (bool): If True, trim leading and trailing whitespaces in each cluster. Default is False.
+        length (Callable): Function to measure strings with, such as token_length().
+
+    Returns:
+        list[str]: A list of clusters containing the split substrings.
+    """
+    return StringSplitter(length).split(
+        input_string, substring_split_order, default_max_len, trim
+    )
@@ -0,0 +1,180 @@
+import argparse
+import random
+import re
+import sys
+from typing import Callable, Dict, List
+
+from .string_split import StringSplitter
+
+"""
+Property check for StringSplitter.
+
+Run with `python -m utility.string_split_check`.
+
+Compares StringSplitter against copies of the split_and_cluster_strings and
+prioritized_string_split it replaced, on random strings, split orders and
+budgets.  The output has to be identical for len and for additive length
+functions, including ones with a fixed overhead per measurement.
+
+Known mismatch: real tokenizers aren't additive.  StringSplitter sizes a
+cluster as the sum of its pieces' token counts, while the old code re-encoded
+the joined cluster, and the two can differ by a token or so where pieces meet.
+With --tokens, those cases are counted and reported, but don't fail the check.
+"""
+
+
+def old_split_and_cluster_strings(
+    input_string: str, max_cluster_size: int, split_substring, length=len
+) -> List[str]:
+    """The pre-StringSplitter version, kept as the reference."""
+    clusters = []
+    if length(input_string) < max_cluster_size:
+        return [input_string]
+    split_by = split_substring
+    is_regex = isinstance(split_substring, re.Pattern)
+    if is_regex:
+        substrings = [r for r in split_substring.split(input_string) if r]
+    else:
+        if "%s" not in split_substring:
+            split_by = "%s" + split_by
+        substrings = input_string.split(split_by.replace("%s", ""))
+    if len(substrings) < 2:
+        return [input_string]
+    current_cluster = substrings[0]
+    for substring in substrings[1:]:
+        if not is_regex:
+            new_string = split_by.replace("%s", substring, 1)
+        else:
+            new_string = substring
+        if length(current_cluster) + length(new_string) <= max_cluster_size:
+            current_cluster += new_string
+        else:
+            if current_cluster:
+                clusters.append(current_cluster)
+            current_cluster = ""
+            if substring:
+                current_cluster = new_string
+    if current_cluster:
+        clusters.append(current_cluster)
+    return clusters
+
+
+def old_prioritized_string_split(
+    input_string: str,
+    substring_split_order: list,
+    default_max_len: int = 1024,
+    trim=False,
+    length=len,
+) -> List[str]:
+    """The pre-StringSplitter version, kept as the reference."""
+    current_clusters = [input_string]
+    for arg in substring_split_order:
+        if isinstance(arg, (str, re.Pattern)):
+            s, max_len = arg, None
+        elif len(arg) == 1:
+            s, max_len = arg[0], None
+        else:
+            s, max_len = arg
+        max_len = max_len or default_max_len
+        new_splits = []
+        for cluster in current_clusters:
+            new_splits.extend(
+                old_split_and_cluster_strings(cluster, max_len, s, length=length)
+            )
+        current_clusters = new_splits
+    if trim:
+        current_clusters = [cluster.strip() for cluster in current_clusters]
+    return current_clusters
+
+
+def weighted_length(text: str) -> int:
+    """Additive, but not len: wide characters count double."""
+    return sum(2 if ord(c) > 127 else 1 for c in text)
+
+
+def wrapped_length(text: str) -> int:
+    """Additive with a fixed overhead, like a counter that wraps a prompt."""
+    return len(text) + 7
+
+
+ADDITIVE: Dict[str, Callable[[str], int]] = {
+    "len": len,
+    "weighted": weighted_length,
+    "wrapped": wrapped_length,
+}
+
+ALPHABET = "abc de\n\n.,#-é"
+SEPARATORS = [
+    "\n\n",
+    "\n",
+    ". ",
+    " ",
+    "%s\n",
+    "\n%s",
+    "#",
+    re.compile(r"(?<=\.)\s"),
+    re.compile(r"\n+"),
+]
+
+
+def random_case(rng: random.Random):
+    text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 400)))
+    order = []
+    for sep in rng.sample(SEPARATORS, rng.randint(1, 4)):
+        roll = rng.random()
+        if roll < 0.4:
+            order.append(sep)
+        elif roll < 0.7:
+            order.append((sep, rng.randint(1, 120)))
+        else:
+            order.append((sep,))
+    return text, order, rng.randint(1, 200), rng.random() < 0.3
+
+
+def check(length: Callable[[str], int], cases: int, seed: int) -> int:
+    """How many random cases StringSplitter disagrees with the reference on."""
+    rng = random.Random(seed)
+    splitter = StringSplitter(length)
+    mismatches = 0
+    for _ in range(cases):
+        text, order, default_max, trim = random_case(rng)
+        sep = order[0] if isinstance(order[0], (str, re.Pattern)) else order[0][0]
+        new = splitter.cluster(text, default_max, sep)
+        old = old_split_and_cluster_strings(text, default_max, sep, length)
+        new_split = splitter.split(text, order, default_max, trim)
+        old_split = old_prioritized_string_split(text, order, default_max, trim, length)
+        if new != old or new_split != old_split:
+            mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check StringSplitter against the old split functions."
+    )
+    parser.add_argument("--cases", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--tokens",
+        action="store_true",
+        help="Also report mismatches for a tiktoken length, needs tiktoken.",
+    )
+    args = parser.parse_args()
+    failed = False
+    for name, length in ADDITIVE.items():
+        mismatches = check(length, args.cases, args.seed)
+        failed = failed or mismatches > 0
+        print(f"{name:<10}{mismatches:>6} mismatches in {args.cases} cases")
+    if args.tokens:
+        from .string_split import token_length
+
+        mismatches = check(token_length(), args.cases, args.seed)
+        print(
+            f"{'tokens':<10}{mismatches:>6} mismatches in {args.cases} cases"
+            " (expected, token counts aren't additive)"
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()